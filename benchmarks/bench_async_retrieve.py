@@ -0,0 +1,120 @@
+"""并发检索基准：对比 aretrieve_with_context 与线程池包装的同步 retrieve_with_context。
+
+LLM 以固定延迟模拟网络调用：异步版本 await asyncio.sleep，同步版本 time.sleep；
+同步路径沿用网关 run_in_executor 的做法，吞吐受线程池大小限制。
+
+用法：
+    PYTHONPATH=src python benchmarks/bench_async_retrieve.py [--requests 200] [--latency 0.05] [--pool 8]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from context_retrieval.home_context import HomeContext
+from context_retrieval.local_embedding import HashingVectorSearcher
+from context_retrieval.models import CommandSpec, Device
+from context_retrieval.pipeline import aretrieve_with_context, retrieve_with_context
+from context_retrieval.state import ConversationState
+
+QUERY = "打开卧室的灯"
+OUTPUT = json.dumps(
+    [{"a": "打开", "s": "卧室", "n": "灯", "t": "Light", "q": "one"}],
+    ensure_ascii=False,
+)
+
+
+class LatencyLLM:
+    """固定延迟返回同一命令数组的 LLM。"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_with_prompt(self, text: str, system_prompt: str) -> str:
+        time.sleep(self.latency)
+        return OUTPUT
+
+    async def agenerate_with_prompt(self, text: str, system_prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return OUTPUT
+
+
+def _devices(count: int) -> list[Device]:
+    rooms = ("客厅", "卧室", "书房", "厨房")
+    commands = [CommandSpec(id="main-switch-on", description="打开")]
+    return [
+        Device(
+            id=f"lamp-{i}",
+            name=f"{rooms[i % len(rooms)]}灯{i}",
+            room=rooms[i % len(rooms)],
+            category="Light",
+            commands=commands,
+        )
+        for i in range(count)
+    ]
+
+
+async def _run_async(context: HomeContext, llm: LatencyLLM, requests: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            aretrieve_with_context(QUERY, context, llm, ConversationState())
+            for _ in range(requests)
+        )
+    )
+    return time.perf_counter() - start
+
+
+async def _run_executor(
+    context: HomeContext,
+    llm: LatencyLLM,
+    requests: int,
+    pool: int,
+) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool) as executor:
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor,
+                    retrieve_with_context,
+                    QUERY,
+                    context,
+                    llm,
+                    ConversationState(),
+                )
+                for _ in range(requests)
+            )
+        )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--pool", type=int, default=8)
+    parser.add_argument("--devices", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    context = HomeContext.build(_devices(args.devices), HashingVectorSearcher(dim=256))
+    llm = LatencyLLM(args.latency)
+
+    print(
+        f"requests={args.requests} latency={args.latency * 1000:.0f}ms "
+        f"pool={args.pool} devices={args.devices}"
+    )
+    for name, elapsed in (
+        ("executor", asyncio.run(_run_executor(context, llm, args.requests, args.pool))),
+        ("async", asyncio.run(_run_async(context, llm, args.requests))),
+    ):
+        print(f"{name:<10} {elapsed * 1000:8.1f} ms  {args.requests / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""家庭上下文基准：对比每次构建上下文的 retrieve 与复用 HomeContext 的 retrieve_with_context。
+
+用法：
+    PYTHONPATH=src python benchmarks/bench_home_context.py [--devices 2000]
+"""
+
+import argparse
+import logging
+import timeit
+
+from context_retrieval.doc_enrichment import CapabilityDoc
+from context_retrieval.home_context import HomeContext
+from context_retrieval.ir_compiler import FakeLLM
+from context_retrieval.local_embedding import HashingVectorSearcher
+from context_retrieval.models import CommandSpec, Device
+from context_retrieval.pipeline import retrieve, retrieve_with_context
+from context_retrieval.state import ConversationState
+
+ROOMS = ("客厅", "卧室", "书房", "厨房", "次卧", "阳台")
+CATEGORIES = ("Light", "Fan", "Blind", "SmartPlug")
+SPEC_INDEX = {
+    f"p-{category}": [
+        CapabilityDoc(id="main-switch-on", description="打开"),
+        CapabilityDoc(id="main-switch-off", description="关闭"),
+    ]
+    for category in CATEGORIES
+}
+QUERY = "打开卧室的灯"
+
+
+def _devices(count: int) -> list[Device]:
+    commands = [
+        CommandSpec(id="main-switch-on", description="打开"),
+        CommandSpec(id="main-switch-off", description="关闭"),
+    ]
+    return [
+        Device(
+            id=f"dev-{i}",
+            name=f"{ROOMS[i % len(ROOMS)]}设备{i}",
+            room=ROOMS[i % len(ROOMS)],
+            category=CATEGORIES[i % len(CATEGORIES)],
+            commands=commands,
+            profile_id=f"p-{CATEGORIES[i % len(CATEGORIES)]}",
+        )
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    devices = _devices(args.devices)
+    llm = FakeLLM({QUERY: [{"a": "打开", "s": "卧室", "n": "灯", "t": "Light", "q": "one"}]})
+    searcher = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=256)
+    context = HomeContext.build(devices, searcher)
+
+    def per_request():
+        return retrieve(
+            text=QUERY,
+            devices=devices,
+            llm=llm,
+            state=ConversationState(),
+            vector_searcher=searcher,
+        )
+
+    def with_context():
+        return retrieve_with_context(
+            text=QUERY,
+            context=context,
+            llm=llm,
+            state=ConversationState(),
+        )
+
+    assert per_request()[0].candidates == with_context()[0].candidates
+
+    print(f"devices={len(devices)}")
+    for name, fn in (("retrieve", per_request), ("context", with_context)):
+        best = min(timeit.Timer(fn).repeat(repeat=args.repeat, number=1))
+        print(f"{name:<10} {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""流式检索基准：对比多命令输入下 retrieve_with_context 与 stream_retrieve_with_context 的首条结果时间。
+
+LLM 按固定的逐段延迟流式输出命令数组，向量检索以固定延迟模拟 embedding 请求；
+一次性检索需等待完整输出后才开始检索，流式检索在每个命令对象闭合后立即开始。
+
+用法：
+    PYTHONPATH=src python benchmarks/bench_stream_retrieve.py [--commands 3] [--chunk-latency 0.01]
+"""
+
+import argparse
+import json
+import logging
+import time
+
+from context_retrieval.home_context import HomeContext
+from context_retrieval.local_embedding import HashingVectorSearcher
+from context_retrieval.models import CommandSpec, Device
+from context_retrieval.pipeline import retrieve_with_context, stream_retrieve_with_context
+from context_retrieval.state import ConversationState
+
+ROOMS = ("客厅", "卧室", "书房", "厨房", "次卧", "阳台")
+QUERY = "打开各个房间的灯"
+CHUNK_SIZE = 8
+
+
+class StreamingLLM:
+    """按 CHUNK_SIZE 分段、每段固定延迟输出命令数组的 LLM。"""
+
+    def __init__(self, output: str, chunk_latency: float):
+        self.output = output
+        self.chunk_latency = chunk_latency
+
+    def generate_with_prompt(self, text: str, system_prompt: str) -> str:
+        return "".join(self.stream_with_prompt(text, system_prompt))
+
+    def stream_with_prompt(self, text: str, system_prompt: str):
+        for start in range(0, len(self.output), CHUNK_SIZE):
+            time.sleep(self.chunk_latency)
+            yield self.output[start : start + CHUNK_SIZE]
+
+
+class LatencySearcher(HashingVectorSearcher):
+    """每次检索附加固定延迟的本地向量检索器。"""
+
+    def __init__(self, latency: float, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def search_many(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().search_many(*args, **kwargs)
+
+
+def _devices(count: int) -> list[Device]:
+    commands = [CommandSpec(id="main-switch-on", description="打开")]
+    return [
+        Device(
+            id=f"lamp-{i}",
+            name=f"{ROOMS[i % len(ROOMS)]}灯{i}",
+            room=ROOMS[i % len(ROOMS)],
+            category="Light",
+            commands=commands,
+        )
+        for i in range(count)
+    ]
+
+
+def _measure(run) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in run():
+        count += 1
+        if first is None:
+            first = time.perf_counter() - start
+    return first or 0.0, time.perf_counter() - start, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=3)
+    parser.add_argument("--chunk-latency", type=float, default=0.01)
+    parser.add_argument("--search-latency", type=float, default=0.03)
+    parser.add_argument("--devices", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    output = json.dumps(
+        [
+            {"a": "打开", "s": ROOMS[i % len(ROOMS)], "n": "灯", "t": "Light", "q": "one"}
+            for i in range(args.commands)
+        ],
+        ensure_ascii=False,
+    )
+    llm = StreamingLLM(output, args.chunk_latency)
+    searcher = LatencySearcher(args.search_latency, dim=256)
+    context = HomeContext.build(_devices(args.devices), searcher)
+
+    print(
+        f"commands={args.commands} chunks={-(-len(output) // CHUNK_SIZE)} "
+        f"chunk_latency={args.chunk_latency * 1000:.0f}ms "
+        f"search_latency={args.search_latency * 1000:.0f}ms"
+    )
+    for name, run in (
+        ("batch", lambda: retrieve_with_context(QUERY, context, llm, ConversationState())),
+        ("stream", lambda: stream_retrieve_with_context(QUERY, context, llm, ConversationState())),
+    ):
+        first, total, count = _measure(run)
+        print(f"{name:<10} first {first * 1000:8.1f} ms  all {total * 1000:8.1f} ms  results={count}")
+
+
+if __name__ == "__main__":
+    main()
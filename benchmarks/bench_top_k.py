@@ -0,0 +1,81 @@
+"""Top-k 选择基准：对比全量排序与堆选择。
+
+用法：
+    PYTHONPATH=src python benchmarks/bench_top_k.py [--candidates 10000] [--top-k 5]
+"""
+
+import argparse
+import random
+import timeit
+
+from context_retrieval.gating import select_top
+from context_retrieval.models import Candidate
+from context_retrieval.scoring import merge_and_score, merge_candidates, top_k_candidates
+
+
+def _candidates(count: int, seed: int) -> tuple[list[Candidate], list[Candidate]]:
+    rng = random.Random(seed)
+    keyword = [
+        Candidate(entity_id=f"dev-{i}", keyword_score=rng.random(), reasons=["name_fuzzy"])
+        for i in range(0, count, 2)
+    ]
+    vector = [
+        Candidate(
+            entity_id=f"dev-{i}",
+            capability_id="main-switch-on",
+            vector_score=rng.random(),
+            reasons=["semantic_match"],
+        )
+        for i in range(count)
+    ]
+    return keyword, vector
+
+
+def _merged(keyword: list[Candidate], vector: list[Candidate]) -> list[Candidate]:
+    """融合后按行顺序物化全部候选（不排序）。"""
+    batch = merge_candidates(keyword, vector)
+    return [batch.candidate(row) for row in range(len(batch))]
+
+
+def _full_sort(keyword: list[Candidate], vector: list[Candidate], top_k: int) -> list[Candidate]:
+    """旧实现：融合后全量排序，筛选时再全量排序一次。"""
+    merged = _merged(keyword, vector)
+    merged.sort(key=lambda c: c.total_score, reverse=True)
+    ranked = sorted(merged, key=lambda c: c.total_score, reverse=True)
+    return ranked[:top_k]
+
+
+def _heap_top_k(keyword: list[Candidate], vector: list[Candidate], top_k: int) -> list[Candidate]:
+    """新实现：融合后只做一次有界 top-k 选择，只物化入选候选。"""
+    return select_top(merge_and_score(keyword, vector, top_k=top_k), top_k=top_k).candidates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=10_000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    keyword, vector = _candidates(args.candidates, seed=0)
+    assert _full_sort(keyword, vector, args.top_k) == _heap_top_k(keyword, vector, args.top_k)
+
+    merged = _merged(keyword, vector)
+    cases = {
+        "merge+select full_sort": lambda: _full_sort(keyword, vector, args.top_k),
+        "merge+select heap_top_k": lambda: _heap_top_k(keyword, vector, args.top_k),
+        "select full_sort": lambda: sorted(
+            sorted(merged, key=lambda c: c.total_score, reverse=True),
+            key=lambda c: c.total_score,
+            reverse=True,
+        )[: args.top_k],
+        "select heap_top_k": lambda: top_k_candidates(merged, args.top_k),
+    }
+    print(f"candidates={len(merged)} top_k={args.top_k}")
+    for name, fn in cases.items():
+        best = min(timeit.Timer(fn).repeat(repeat=args.repeat, number=1))
+        print(f"{name:<24} {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
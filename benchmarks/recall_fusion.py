@@ -0,0 +1,155 @@
+"""融合方式召回率对比：linear 与 rrf 在不同向量召回数量下的 recall@k。
+
+复用集成测试夹具（设备、房间、查询与期望 capability），以 expected_fields 构造的命令
+代替 LLM 解析；默认使用本地哈希 embedding 离线运行，--backend dashscope 使用真实 embedding
+（需要 DASHSCOPE_API_KEY）。
+某条查询的任一命令候选（或 bulk 选中 / 澄清选项）包含期望 capability 即记为命中。
+夹具只有 30 个设备，--replicas 将其复制多份（设备 id/名称加后缀）以模拟大户型。
+
+用法：
+    PYTHONPATH=src python benchmarks/recall_fusion.py [--top-k 5] [--vector-k 5 15 50] [--replicas 20]
+"""
+
+import argparse
+import logging
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "tests" / "integration"))
+
+from test_dashscope_integration import (  # noqa: E402
+    DEVICES_PATH,
+    ROOMS_PATH,
+    build_devices_from_items,
+    load_jsonl,
+    load_room_map,
+    load_test_queries,
+)
+
+from context_retrieval.doc_enrichment import load_spec_index  # noqa: E402
+from context_retrieval.ir_compiler import FakeLLM  # noqa: E402
+from context_retrieval.local_embedding import HashingVectorSearcher  # noqa: E402
+from context_retrieval.models import Device, RetrievalResult  # noqa: E402
+from context_retrieval.pipeline import retrieve  # noqa: E402
+from context_retrieval.recall import recall_at_k  # noqa: E402
+from context_retrieval.state import ConversationState  # noqa: E402
+
+SPEC_PATH = ROOT / "src" / "spec.jsonl"
+EXHAUSTIVE_VECTOR_K = 100_000
+
+
+def _command_from_fields(query: str, fields: dict[str, Any]) -> dict[str, str]:
+    """由期望字段构造命令对象；动作文本直接使用原始查询。"""
+    scope = fields.get("scope_include") or ["*"]
+    exclude = [f"!{room}" for room in fields.get("scope_exclude") or []]
+    return {
+        "a": query,
+        "s": ",".join([*scope, *exclude]),
+        "n": "*",
+        "t": fields.get("type_hint") or "Unknown",
+        "q": fields.get("quantifier") or "one",
+    }
+
+
+def _replicate(devices: list[Device], replicas: int) -> list[Device]:
+    """复制设备集合，副本的 id 与名称追加序号，保留房间、类别与 profile。"""
+    if replicas <= 1:
+        return devices
+    copies: list[Device] = []
+    for index in range(replicas):
+        for device in devices:
+            copies.append(
+                replace(device, id=f"{device.id}#{index}", name=f"{device.name}{index}")
+            )
+    return copies
+
+
+def _is_hit(results: list[RetrievalResult], expected: set[str]) -> bool:
+    for result in results:
+        if result.selected_capability_id in expected:
+            return True
+        if any(cand.capability_id in expected for cand in result.candidates):
+            return True
+        if any(opt.capability_id in expected for opt in result.options):
+            return True
+    return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--vector-k", type=int, nargs="+", default=[5, 10, 15, 50])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--backend", choices=("hashing", "dashscope"), default="hashing")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    devices = _replicate(
+        build_devices_from_items(load_jsonl(DEVICES_PATH), load_room_map(ROOMS_PATH)),
+        args.replicas,
+    )
+    cases = [case for case in load_test_queries() if case.get("expected_capability_ids")]
+    llm = FakeLLM(
+        {
+            case["query"]: [_command_from_fields(case["query"], case.get("expected_fields") or {})]
+            for case in cases
+        }
+    )
+    spec_index = load_spec_index(str(SPEC_PATH))
+    if args.backend == "dashscope":
+        from context_retrieval.vector_search import DashScopeVectorSearcher
+
+        searcher = DashScopeVectorSearcher(spec_index=spec_index)
+    else:
+        searcher = HashingVectorSearcher(
+            spec_index=spec_index,
+            dim=args.dim,
+            query_cache_size=256,
+        )
+
+    def run(fusion: str, vector_k: int) -> list[list[RetrievalResult]]:
+        return [
+            retrieve(
+                text=case["query"],
+                devices=devices,
+                llm=llm,
+                state=ConversationState(),
+                top_k=args.top_k,
+                vector_searcher=searcher,
+                fusion=fusion,
+                vector_top_k=vector_k,
+            )
+            for case in cases
+        ]
+
+    print(
+        f"backend={args.backend} queries={len(cases)} devices={len(devices)} "
+        f"top_k={args.top_k}"
+    )
+    print("hit: 候选命中期望 capability 的查询比例")
+    print("stable: 与同一融合方式全量向量召回的 top-k 重合度（recall@k）")
+    print(f"{'fusion':<8}{'vector_k':>10}{'hit':>8}{'stable':>8}")
+    for fusion in ("linear", "rrf"):
+        exhaustive = run(fusion, EXHAUSTIVE_VECTOR_K)
+        for vector_k in args.vector_k:
+            outputs = run(fusion, vector_k)
+            hits = sum(
+                _is_hit(results, set(case["expected_capability_ids"]))
+                for case, results in zip(cases, outputs)
+            )
+            overlaps = [
+                recall_at_k(ref.candidates, result.candidates, args.top_k)
+                for ref_results, results in zip(exhaustive, outputs)
+                for ref, result in zip(ref_results, results)
+            ]
+            print(
+                f"{fusion:<8}{vector_k:>10}{hits / len(cases):>8.3f}"
+                f"{sum(overlaps) / len(overlaps):>8.3f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 from command_parser.parser import (
     CommandParser,
     CommandParserConfig,
+    CommandStreamParser,
     ParseResult,
     ParsedCommand,
     ParserMetrics,
@@ -18,6 +19,7 @@ __all__ = [
     "PROMPT_REGRESSION_CASES",
     "CommandParser",
     "CommandParserConfig",
+    "CommandStreamParser",
     "ParseResult",
     "ParsedCommand",
     "ParserMetrics",
@@ -110,6 +110,111 @@ class CommandParser:
         )
 
 
+class CommandStreamParser:
+    """增量解析 LLM 流式输出的命令数组。
+
+    逐段 feed 输出文本，每个顶层对象闭合后立即解析为 ParsedCommand；
+    流结束后 close 按完整文本调用 parse_command_output，返回权威的 ParseResult。
+    输出不是以 ``[`` 开头的数组或对象片段无法解析时停止增量产出，交由 close 处理。
+    """
+
+    def __init__(
+        self,
+        config: CommandParserConfig | None = None,
+        logger_override: logging.Logger | None = None,
+        metrics: ParserMetrics | None = None,
+    ) -> None:
+        self.config = config or CommandParserConfig()
+        self.metrics = metrics
+        self.commands: list[ParsedCommand] = []
+        self.errors: list[str] = []
+        self.degraded = False
+        self._logger = logger_override
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._stopped = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start: int | None = None
+
+    @property
+    def text(self) -> str:
+        """已接收的完整输出文本。"""
+        return self._text
+
+    def feed(self, chunk: str) -> list[ParsedCommand]:
+        """追加一段输出，返回本段内闭合的命令。"""
+        self._text += chunk
+        commands: list[ParsedCommand] = []
+        text = self._text
+        while self._pos < len(text) and not self._stopped:
+            position = self._pos
+            char = text[position]
+            self._pos += 1
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                elif not char.isspace():
+                    self._stopped = True
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = position
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # 顶层数组闭合（或多余的右括号），之后的内容交给 close
+                    self._stopped = True
+                    continue
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    command = self._close_object(text[self._object_start : position + 1])
+                    self._object_start = None
+                    if command is not None:
+                        commands.append(command)
+        return commands
+
+    def close(self) -> ParseResult:
+        """结束解析，返回按完整文本解析的 ParseResult。"""
+        return parse_command_output(
+            self._text,
+            config=self.config,
+            logger_override=self._logger,
+            metrics=self.metrics,
+        )
+
+    def _close_object(self, fragment: str) -> ParsedCommand | None:
+        """解析一个已闭合的顶层对象片段。"""
+        try:
+            entry = json.loads(fragment)
+        except json.JSONDecodeError:
+            self._stopped = True
+            return None
+        if self.config.only_take_first and self.commands:
+            self._stopped = True
+            return None
+        command, command_errors = _parse_command_object(entry)
+        if command_errors:
+            self.errors.extend(command_errors)
+            self.degraded = True
+        if command is None:
+            return None
+        self.commands.append(command)
+        return command
+
+
 def parse_command_output(
     raw_output: object,
     *,
@@ -0,0 +1,352 @@
+"""近似最近邻向量检索。
+
+IVFVectorSearcher 在精确检索器的共享向量行之上构建倒排文件（IVF）索引：
+用球面 k-means 训练粗量化中心，查询时只对最近的 nprobe 个簇内的条目打分，
+适用于楼宇级聚合索引（数万行以上）。纯 NumPy 实现，无额外依赖。
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+from numpy.typing import NDArray
+
+from context_retrieval.models import Candidate, Device
+from context_retrieval.recall import compare_recall
+from context_retrieval.vector_search import (
+    EmbeddingVectorSearcher,
+    VectorSearcher,
+    _expand_device_filters,
+    _normalize_rows,
+    _top_k_indices,
+)
+
+_TRAIN_POINTS_PER_LIST = 64
+# 分配簇时每次打分的行数，限制临时分数矩阵与反量化的内存
+_ASSIGN_BLOCK_ROWS = 4096
+
+
+def spherical_kmeans(
+    vectors: NDArray[np.float32],
+    n_clusters: int,
+    n_iter: int = 10,
+    seed: int = 0,
+) -> NDArray[np.float32]:
+    """对归一化向量做球面 k-means，返回归一化后的簇中心。
+
+    Args:
+        vectors: 归一化后的向量矩阵
+        n_clusters: 簇数量（不超过向量数）
+        n_iter: 迭代次数
+        seed: 随机种子
+
+    Returns:
+        簇中心矩阵，shape=(n_clusters, dim)
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, min(n_clusters, vectors.shape[0]))
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            # 空簇重新以随机样本为中心，避免簇数量塌缩
+            sums[empty] = vectors[rng.choice(vectors.shape[0], empty.size, replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+@dataclass(frozen=True)
+class _InvertedLists:
+    """簇中心与每个簇的条目下标，作为整体替换，并发检索不会读到半成品。"""
+
+    centroids: NDArray[np.float32]
+    lists: list[NDArray[np.intp]]
+
+
+class IVFVectorSearcher(VectorSearcher):
+    """基于倒排文件（IVF）的近似向量检索器。
+
+    组合一个精确检索器：embedding、行去重、增量更新与持久化都由其负责，
+    本类只维护簇中心与每个簇的条目列表。通过本类增删设备时立即重建倒排列表；
+    直接修改精确检索器后（index_version 变化），下次检索时在锁内重建。
+    行数变化超过一倍时重新训练簇中心。
+    """
+
+    def __init__(
+        self,
+        base: EmbeddingVectorSearcher,
+        n_lists: int | None = None,
+        nprobe: int = 8,
+        exact_threshold: int = 2048,
+        n_iter: int = 10,
+        seed: int = 0,
+    ):
+        """初始化。
+
+        Args:
+            base: 提供向量行与条目的精确检索器
+            n_lists: 簇数量，默认取 sqrt(行数)
+            nprobe: 每次查询探测的簇数量
+            exact_threshold: 待检索条目数不超过该值时直接精确检索
+            n_iter: k-means 迭代次数
+            seed: k-means 随机种子
+        """
+        self.base = base
+        self.n_lists = n_lists
+        self.nprobe = max(1, nprobe)
+        self.exact_threshold = exact_threshold
+        self.n_iter = n_iter
+        self.seed = seed
+        self._inverted: _InvertedLists | None = None
+        self._trained_rows = 0
+        self._built_version = -1
+        self._lock = threading.Lock()
+
+    @property
+    def list_count(self) -> int:
+        """当前簇数量。"""
+        inverted = self._inverted
+        return len(inverted.lists) if inverted is not None else 0
+
+    def index(self, devices: list[Device]) -> None:
+        """索引设备，并重新训练簇中心。"""
+        self.base.index(devices)
+        self.rebuild(retrain=True)
+
+    def add_devices(self, devices: list[Device]) -> None:
+        """增量添加设备，新行分配到已有簇。"""
+        self.base.add_devices(devices)
+        self.rebuild()
+
+    def remove_devices(self, device_ids: set[str] | list[str]) -> None:
+        """删除设备，并重新分配剩余行。"""
+        self.base.remove_devices(device_ids)
+        self.rebuild()
+
+    def update_device(self, device: Device) -> None:
+        """更新单个设备。"""
+        self.base.update_device(device)
+        self.rebuild()
+
+    def rebuild(self, retrain: bool = False) -> None:
+        """根据精确检索器当前的向量行重建倒排列表。
+
+        Args:
+            retrain: 是否强制重新训练簇中心
+        """
+        with self._lock:
+            self._rebuild(retrain)
+
+    def _current_lists(self) -> _InvertedLists | None:
+        """返回与精确检索器当前索引一致的倒排列表，过期时在锁内重建一次。"""
+        if self._built_version != self.base.index_version:
+            with self._lock:
+                if self._built_version != self.base.index_version:
+                    self._rebuild(retrain=False)
+        return self._inverted
+
+    def _rebuild(self, retrain: bool) -> None:
+        """重建倒排列表（调用方持有锁）。
+
+        行按块打分分配到簇，量化存储时不反量化整个矩阵；
+        条目继承其向量行所在的簇。
+        """
+        base = self.base
+        version = base.index_version
+        rows = base.row_count
+        if rows == 0:
+            self._inverted = None
+            self._trained_rows = 0
+            self._built_version = version
+            return
+
+        centroids = self._inverted.centroids if self._inverted is not None else None
+        drifted = rows > 2 * self._trained_rows or 2 * rows < self._trained_rows
+        if retrain or centroids is None or drifted:
+            centroids = self._train(rows)
+            self._trained_rows = rows
+
+        assignment = np.empty(rows, dtype=np.intp)
+        for start in range(0, rows, _ASSIGN_BLOCK_ROWS):
+            block = np.arange(start, min(start + _ASSIGN_BLOCK_ROWS, rows))
+            assignment[block] = np.argmax(base.score_rows(centroids.T, block), axis=1)
+
+        entry_assignment = assignment[base.entry_rows]
+        order = np.argsort(entry_assignment, kind="stable")
+        bounds = np.searchsorted(entry_assignment[order], np.arange(centroids.shape[0] + 1))
+        self._inverted = _InvertedLists(
+            centroids=centroids,
+            lists=[order[bounds[i]:bounds[i + 1]] for i in range(centroids.shape[0])],
+        )
+        self._built_version = version
+
+    def _train(self, rows: int) -> NDArray[np.float32]:
+        """在采样的行向量上训练簇中心，只反量化采样行。"""
+        n_lists = self.n_lists or int(np.sqrt(rows))
+        n_lists = max(1, min(n_lists, rows))
+        sample_size = n_lists * _TRAIN_POINTS_PER_LIST
+        sample_rows = np.arange(rows)
+        if rows > sample_size:
+            rng = np.random.default_rng(self.seed)
+            sample_rows = np.sort(rng.choice(rows, sample_size, replace=False))
+        sample = self.base.row_vectors(sample_rows)
+        return spherical_kmeans(sample, n_lists, n_iter=self.n_iter, seed=self.seed)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        device_ids: set[str] | None = None,
+    ) -> list[Candidate]:
+        """执行近似向量检索。"""
+        return self.search_many([query], top_k=top_k, device_ids_per_query=[device_ids])[0]
+
+    def search_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """批量执行近似向量检索。
+
+        候选条目数不超过 exact_threshold 的查询退化为精确检索；
+        其余查询合并编码后逐条探测倒排列表。
+        """
+        results, exact, approximate, inverted = self._plan_search(
+            queries, top_k, device_ids_per_query
+        )
+        base = self.base
+        if exact:
+            exact_results = base.search_many(
+                [queries[position] for position, _ in exact],
+                top_k=top_k,
+                device_ids_per_query=[device_ids for _, device_ids in exact],
+            )
+            for (position, _), candidates in zip(exact, exact_results):
+                results[position] = candidates
+
+        if approximate:
+            query_norms = base.query_vectors([queries[position] for position, _ in approximate])
+            for query_norm, (position, entry_indices) in zip(query_norms, approximate):
+                results[position] = self._probe(inverted, query_norm, top_k, entry_indices)
+        return results
+
+    async def asearch_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """异步批量执行近似向量检索，查询编码通过精确检索器的异步接口等待。"""
+        results, exact, approximate, inverted = self._plan_search(
+            queries, top_k, device_ids_per_query
+        )
+        base = self.base
+        if exact:
+            exact_results = await base.asearch_many(
+                [queries[position] for position, _ in exact],
+                top_k=top_k,
+                device_ids_per_query=[device_ids for _, device_ids in exact],
+            )
+            for (position, _), candidates in zip(exact, exact_results):
+                results[position] = candidates
+
+        if approximate:
+            query_norms = await base.aquery_vectors(
+                [queries[position] for position, _ in approximate]
+            )
+            for query_norm, (position, entry_indices) in zip(query_norms, approximate):
+                results[position] = self._probe(inverted, query_norm, top_k, entry_indices)
+        return results
+
+    def _plan_search(
+        self,
+        queries: list[str],
+        top_k: int,
+        device_ids_per_query: list[set[str] | None] | None,
+    ) -> tuple[
+        list[list[Candidate]],
+        list[tuple[int, set[str] | None]],
+        list[tuple[int, NDArray[np.intp] | None]],
+        _InvertedLists | None,
+    ]:
+        """将查询分为精确检索与近似检索两组，返回 (空结果, 精确组, 近似组, 倒排列表)。"""
+        filters = _expand_device_filters(queries, device_ids_per_query)
+        results: list[list[Candidate]] = [[] for _ in queries]
+        base = self.base
+        if base.row_count == 0 or top_k <= 0:
+            return results, [], [], None
+        inverted = self._current_lists()
+
+        exact: list[tuple[int, set[str] | None]] = []
+        approximate: list[tuple[int, NDArray[np.intp] | None]] = []
+        for position, device_ids in enumerate(filters):
+            entry_count = base.entry_rows.shape[0]
+            entry_indices: NDArray[np.intp] | None = None
+            if device_ids:
+                entry_indices = base.filter_entry_indices(device_ids)
+                entry_count = entry_indices.shape[0]
+                if entry_count == 0:
+                    continue
+            if entry_count <= self.exact_threshold or inverted is None:
+                exact.append((position, device_ids))
+            else:
+                approximate.append((position, entry_indices))
+        return results, exact, approximate, inverted
+
+    def _probe(
+        self,
+        inverted: _InvertedLists,
+        query_norm: NDArray[np.float32],
+        top_k: int,
+        entry_indices: NDArray[np.intp] | None,
+    ) -> list[Candidate]:
+        """探测最近的簇并选出 top_k 候选。
+
+        只为探测到的条目（共享的向量行去重后）打分；
+        设备过滤后探测到的条目不足 top_k 时逐步扩大探测范围。
+        """
+        base = self.base
+        entry_rows = base.entry_rows
+        list_order = np.argsort(-(inverted.centroids @ query_norm), kind="stable")
+
+        probed_entries: list[NDArray[np.intp]] = []
+        hit_count = 0
+        nprobe = min(self.nprobe, len(list_order))
+        probed = 0
+        while True:
+            entries = np.concatenate([inverted.lists[i] for i in list_order[probed:nprobe]])
+            if entry_indices is not None and entries.size:
+                # entry_indices 有序，二分查找判断条目是否在过滤集合内
+                positions = np.searchsorted(entry_indices, entries)
+                positions = np.minimum(positions, entry_indices.shape[0] - 1)
+                entries = entries[entry_indices[positions] == entries]
+            probed_entries.append(entries)
+            hit_count += entries.shape[0]
+            probed = nprobe
+            if hit_count >= top_k or probed >= len(list_order):
+                break
+            nprobe = min(probed * 2, len(list_order))
+
+        # 按条目下标排序，同分时与精确检索的先后一致
+        entries = np.sort(np.concatenate(probed_entries))
+        if entries.size == 0:
+            return []
+        rows, inverse = np.unique(entry_rows[entries], return_inverse=True)
+        scores = base.score_rows(query_norm, rows)[inverse]
+        top = _top_k_indices(scores, top_k)
+        return base.build_candidates(entries[top], scores[top])
+
+    def evaluate_recall(
+        self,
+        queries: Iterable[str],
+        top_k: int = 10,
+        device_ids: set[str] | None = None,
+    ) -> float:
+        """以精确检索为基准计算平均 recall@k。"""
+        return compare_recall(self.base, self, queries, top_k=top_k, device_ids=device_ids)
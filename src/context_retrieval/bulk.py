@@ -2,15 +2,18 @@
 
 from __future__ import annotations
 
+import heapq
 from dataclasses import dataclass
 from typing import Any
 
 from context_retrieval.doc_enrichment import CapabilityDoc
 from context_retrieval.models import (
+    Candidate,
     CapabilityOption,
     Device,
     Group,
 )
+from context_retrieval.scoring import top_k_by
 from context_retrieval.vector_search import VectorSearcher
 
 
@@ -44,8 +47,8 @@ def is_bulk_quantifier(quantifier: str | None) -> bool:
 
 
 def device_profile_id(device: Device) -> str | None:
-    """从设备信息中解析 profile_id（兼容旧字段）。"""
-    profile_id = getattr(device, "profile_id", None) or getattr(device, "profileId", None)
+    """从设备信息中解析 profile_id（去除首尾空白，空值返回 None）。"""
+    profile_id = device.profile_id
     if isinstance(profile_id, str) and profile_id.strip():
         return profile_id.strip()
     return None
@@ -113,18 +116,23 @@ def build_capability_options(
     options_top_n: int = DEFAULT_OPTIONS_TOP_N,
     options_search_k: int = DEFAULT_OPTIONS_SEARCH_K,
     evidence_per_capability: int = DEFAULT_EVIDENCE_PER_CAPABILITY,
+    candidates: list[Candidate] | None = None,
 ) -> tuple[list[CapabilityOption], dict[str, Any]]:
-    """基于检索证据与覆盖率构造 capability 候选。"""
+    """基于检索证据与覆盖率构造 capability 候选。
+
+    candidates 为调用方预取的向量检索结果；为 None 时在 devices 范围内检索。
+    """
     if not devices:
         return [], {"top1_ratio": 0.0, "margin": 0.0}
 
     spec_lookup = build_spec_lookup(spec_index)
-    device_ids = {device.id for device in devices}
-    candidates = vector_searcher.search(
-        query_text,
-        top_k=options_search_k,
-        device_ids=device_ids,
-    )
+    if candidates is None:
+        device_ids = {device.id for device in devices}
+        candidates = vector_searcher.search(
+            query_text,
+            top_k=options_search_k,
+            device_ids=device_ids,
+        )
 
     evidence: dict[str, list[float]] = {}
     for cand in candidates:
@@ -135,11 +143,10 @@ def build_capability_options(
 
     aggregated: list[tuple[str, float, list[float]]] = []
     for cap_id, scores in evidence.items():
-        top_scores = sorted(scores, reverse=True)[:evidence_per_capability]
+        top_scores = heapq.nlargest(evidence_per_capability, scores)
         aggregated.append((cap_id, sum(top_scores), top_scores))
 
-    aggregated.sort(key=lambda item: item[1], reverse=True)
-    aggregated = aggregated[:options_top_n]
+    aggregated = top_k_by(aggregated, options_top_n, key=lambda item: item[1])
 
     total_score = sum(item[1] for item in aggregated)
     options: list[CapabilityOption] = []
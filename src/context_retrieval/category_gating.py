@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from typing import Iterable
+from typing import Iterable, Mapping
 
 from context_retrieval.models import Device
 
@@ -51,8 +51,17 @@ def map_type_to_category(type_hint: str | None) -> str | None:
     return None
 
 
-def filter_by_category(devices: Iterable[Device], category: str | None) -> list[Device]:
-    """Filter devices by category."""
+def filter_by_category(
+    devices: Iterable[Device],
+    category: str | None,
+    category_keys: Mapping[str, frozenset[str]] | None = None,
+) -> list[Device]:
+    """Filter devices by category.
+
+    ``category_keys`` optionally maps device ids to precomputed
+    :func:`device_category_keys` results, so repeated filtering over the same
+    device list skips re-resolving every device category.
+    """
     device_list = list(devices)
 
     canonical_category = map_type_to_category(category)
@@ -65,21 +74,22 @@ def filter_by_category(devices: Iterable[Device], category: str | None) -> list[
 
     filtered: list[Device] = []
     for device in device_list:
-        if _device_matches_category(device, category_key):
+        keys = category_keys.get(device.id) if category_keys is not None else None
+        if keys is None:
+            keys = device_category_keys(device)
+        if category_key in keys:
             filtered.append(device)
     return filtered or device_list
 
 
-def _device_matches_category(device: Device, category_key: str) -> bool:
-    """判断设备是否匹配指定规范化类别。"""
+def device_category_keys(device: Device) -> frozenset[str]:
+    """返回设备可匹配的规范化类别键集合。"""
+    keys: set[str] = set()
     for raw_value in _device_category_values(device):
-        mapped = map_type_to_category(raw_value)
-        if not mapped:
-            continue
-        mapped_key = _compact_key(mapped)
-        if mapped_key == category_key:
-            return True
-    return False
+        mapped_key = _compact_key(map_type_to_category(raw_value))
+        if mapped_key:
+            keys.add(mapped_key)
+    return frozenset(keys)
 
 
 def _device_category_values(device: Device) -> list[str]:
@@ -99,7 +99,7 @@ def enrich_description(desc: str) -> str:
 
 def build_enriched_doc(device: Device, spec_index: dict[str, list[CapabilityDoc]]) -> list[str]:
     """Build enriched documents for a device."""
-    profile_id = getattr(device, "profile_id", None) or getattr(device, "profileId", None)
+    profile_id = device.profile_id
     docs = spec_index.get(profile_id) if profile_id else None
 
     if not docs:
@@ -0,0 +1,198 @@
+"""Embedding 缓存。
+
+- EmbeddingCache：按 (model, 文本) 内容寻址的本地 embedding 存储，进程重启后可直接读取，
+  避免对相同文档重复调用 embedding 服务。
+- QueryEmbeddingLRU：进程内有界 LRU（带 TTL），缓存高频查询文本的向量。
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+from numpy.typing import NDArray
+
+_KEY_PREFIX = "keys_"
+_VECTOR_PREFIX = "vectors_"
+DEFAULT_SAVE_THRESHOLD = 256
+
+
+def _save_at_exit(ref: "weakref.ref[EmbeddingCache]") -> None:
+    """进程退出时写入仍存活的缓存中未落盘的条目。"""
+    cache = ref()
+    if cache is not None:
+        cache.save()
+
+
+class EmbeddingCache:
+    """内容寻址的持久化 embedding 缓存。
+
+    以 sha256(model + 文本) 为键保存向量；指定 path 时以 npz 文件落盘，
+    同一维度的向量合并为一个矩阵存储。
+
+    每次落盘都重写整个文件（O(缓存大小)），因此新条目先在内存中累积：
+    未落盘条目达到 save_threshold 时由 save_if_needed 写入，
+    其余条目在 save() / close()、退出 with 块或进程正常退出时写入。
+    """
+
+    def __init__(self, path: str | None = None, save_threshold: int = DEFAULT_SAVE_THRESHOLD):
+        """初始化。
+
+        Args:
+            path: 缓存文件路径；为 None 时仅在内存中缓存
+            save_threshold: save_if_needed 触发落盘的未落盘条目数
+        """
+        self.path = path
+        self.save_threshold = max(1, save_threshold)
+        self._vectors: dict[str, NDArray[np.float32]] = {}
+        self._pending = 0
+        if path and os.path.exists(path):
+            self.load()
+        if path:
+            atexit.register(_save_at_exit, weakref.ref(self))
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    @property
+    def pending(self) -> int:
+        """尚未写入缓存文件的条目数。"""
+        return self._pending
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """生成 (model, 文本) 的内容寻址键。"""
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, model: str, text: str) -> NDArray[np.float32] | None:
+        """读取缓存向量，未命中返回 None。"""
+        return self._vectors.get(self.make_key(model, text))
+
+    def put(self, model: str, text: str, vector: NDArray[np.float32]) -> None:
+        """写入缓存向量。"""
+        self._vectors[self.make_key(model, text)] = np.asarray(vector, dtype=np.float32)
+        self._pending += 1
+
+    def load(self) -> None:
+        """从缓存文件加载向量（与内存中已有条目合并）。"""
+        if not self.path:
+            return
+        with np.load(self.path, allow_pickle=False) as payload:
+            for name in payload.files:
+                if not name.startswith(_KEY_PREFIX):
+                    continue
+                suffix = name[len(_KEY_PREFIX):]
+                keys = payload[name]
+                vectors = payload[f"{_VECTOR_PREFIX}{suffix}"]
+                for key, vector in zip(keys.tolist(), vectors):
+                    self._vectors.setdefault(key, np.asarray(vector, dtype=np.float32))
+
+    def save_if_needed(self) -> None:
+        """未落盘条目达到 save_threshold 时写入文件。"""
+        if self._pending >= self.save_threshold:
+            self.save()
+
+    def close(self) -> None:
+        """写入未落盘的条目。"""
+        self.save()
+
+    def save(self) -> None:
+        """将缓存写入文件（先写临时文件再原子替换）。"""
+        if not self.path or not self._pending:
+            return
+
+        groups: dict[int, list[tuple[str, NDArray[np.float32]]]] = {}
+        for key, vector in self._vectors.items():
+            groups.setdefault(int(vector.shape[0]), []).append((key, vector))
+
+        arrays: dict[str, NDArray] = {}
+        for dim, items in groups.items():
+            arrays[f"{_KEY_PREFIX}{dim}"] = np.array([key for key, _ in items])
+            arrays[f"{_VECTOR_PREFIX}{dim}"] = np.vstack([vec for _, vec in items])
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, **arrays)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+
+class QueryEmbeddingLRU:
+    """查询向量的进程内 LRU 缓存。
+
+    容量有界，条目超过 TTL 后视为未命中；提供命中/未命中计数。
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float | None = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """初始化。
+
+        Args:
+            maxsize: 最大条目数
+            ttl: 条目有效期（秒），None 表示不过期
+            clock: 时钟函数，便于测试注入
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._items: OrderedDict[tuple[str, str], tuple[float, NDArray[np.float32]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, model: str, text: str) -> NDArray[np.float32] | None:
+        """读取查询向量，未命中或已过期返回 None。"""
+        key = (model, text)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                stored_at, vector = item
+                if self.ttl is None or self._clock() - stored_at < self.ttl:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector: NDArray[np.float32]) -> None:
+        """写入查询向量，超出容量时淘汰最久未使用的条目。"""
+        if self.maxsize <= 0:
+            return
+        key = (model, text)
+        with self._lock:
+            self._items[key] = (self._clock(), vector)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """返回命中统计。"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
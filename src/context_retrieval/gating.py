@@ -6,6 +6,7 @@
 from dataclasses import dataclass
 
 from context_retrieval.models import Candidate
+from context_retrieval.scoring import top_k_candidates
 
 DEFAULT_TOP_K = 5
 DEFAULT_CLOSE_THRESHOLD = 0.1
@@ -37,8 +38,7 @@ def select_top(
     if not candidates:
         return SelectionResult(candidates=[])
 
-    sorted_candidates = sorted(candidates, key=lambda c: c.total_score, reverse=True)
-    top_candidates = sorted_candidates[:top_k]
+    top_candidates = top_k_candidates(candidates, top_k)
 
     # 判断是否存在多个分数接近的候选
     hint = None
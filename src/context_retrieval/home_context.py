@@ -0,0 +1,189 @@
+"""家庭级检索上下文。
+
+同一家庭的设备列表在多轮对话之间很少变化。HomeContext 按设备列表一次性预计算
+设备索引、能力规格查找表、scope 过滤所需的规范化房间/名称、规范类别以及关键词/向量索引，
+每次检索只做与请求本身相关的计算。
+
+向量检索器只持有一份索引：每个家庭应使用独立的检索器实例（可共享 embedding 客户端与
+EmbeddingCache）。多个家庭共享同一检索器时，每次切换家庭都会由 sync_vector_index
+重新索引（差异更新与压缩，并重新编码或读取缓存），缓存上下文无法避免这部分开销。
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from context_retrieval.bulk import build_spec_lookup
+from context_retrieval.category_gating import device_category_keys
+from context_retrieval.keyword_search import (
+    KeywordSearcher,
+    device_fingerprint,
+    get_keyword_searcher,
+)
+from context_retrieval.logic import ScopeIndex
+from context_retrieval.models import Device
+from context_retrieval.vector_search import VectorSearcher
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class HomeContext:
+    """一个家庭（设备列表 + 向量检索器）的预计算检索上下文。
+
+    Attributes:
+        devices: 设备列表
+        fingerprint: 设备列表指纹（见 device_fingerprint）
+        device_by_id: 设备 id -> 设备
+        scope: scope 过滤索引（规范化房间与名称）
+        category_keys: 设备 id -> 规范化类别键集合
+        keyword_searcher: 关键词检索器
+        vector_searcher: 可选的向量检索器（已为 devices 建好索引）
+        spec_index: 向量检索器的 profile_id -> CapabilityDoc 列表映射
+        spec_lookup: profile_id -> capability_id -> CapabilityDoc 查找表，规格为空时为 None
+        vector_index_version: 建立本上下文时向量索引的版本号（检索器不提供版本时为 None）
+    """
+
+    devices: list[Device]
+    fingerprint: str
+    device_by_id: dict[str, Device]
+    scope: ScopeIndex
+    category_keys: dict[str, frozenset[str]]
+    keyword_searcher: KeywordSearcher
+    vector_searcher: VectorSearcher | None = None
+    spec_index: dict | None = None
+    spec_lookup: dict | None = None
+    vector_index_version: int | None = None
+
+    @classmethod
+    def build(
+        cls,
+        devices: list[Device],
+        vector_searcher: VectorSearcher | None = None,
+        fingerprint: str | None = None,
+    ) -> "HomeContext":
+        """为设备列表构建检索上下文，并在提供向量检索器时完成索引。
+
+        Args:
+            devices: 设备列表
+            vector_searcher: 可选的向量检索器
+            fingerprint: 调用方已计算的设备指纹，None 时现算
+
+        Returns:
+            预计算完成的 HomeContext
+        """
+        devices = list(devices)
+        if fingerprint is None:
+            fingerprint = device_fingerprint(devices)
+
+        spec_index: dict | None = None
+        spec_lookup: dict | None = None
+        index_version: int | None = None
+        if vector_searcher is not None:
+            vector_searcher.index(devices)
+            index_version = getattr(vector_searcher, "index_version", None)
+            spec_index = getattr(vector_searcher, "spec_index", None)
+            if isinstance(spec_index, dict) and spec_index:
+                spec_lookup = build_spec_lookup(spec_index)
+
+        return cls(
+            devices=devices,
+            fingerprint=fingerprint,
+            device_by_id={device.id: device for device in devices},
+            scope=ScopeIndex(devices),
+            category_keys={device.id: device_category_keys(device) for device in devices},
+            keyword_searcher=get_keyword_searcher(devices, fingerprint),
+            vector_searcher=vector_searcher,
+            spec_index=spec_index,
+            spec_lookup=spec_lookup,
+            vector_index_version=index_version,
+        )
+
+    @property
+    def vector_index_stale(self) -> bool:
+        """向量检索器是否已被其他设备列表重新索引。
+
+        只有提供 index_version 的检索器能检测到这种变化；其余检索器视为本上下文独占。
+        """
+        searcher = self.vector_searcher
+        if searcher is None:
+            return False
+        version = getattr(searcher, "index_version", None)
+        return version is not None and version != self.vector_index_version
+
+    def sync_vector_index(self) -> None:
+        """向量检索器被其他设备列表重新索引后，恢复为本家庭的索引。
+
+        只用于检索器偶尔被其他设备列表索引的场景；多个家庭交替共享同一检索器时
+        每次切换都会重新索引，应改为每个家庭使用独立的检索器。
+        """
+        if not self.vector_index_stale:
+            return
+        searcher = self.vector_searcher
+        logger.warning(
+            "vector_index_reindex fingerprint=%s devices=%d reason=shared_searcher",
+            self.fingerprint,
+            len(self.devices),
+        )
+        searcher.index(self.devices)
+        self.vector_index_version = getattr(searcher, "index_version", None)
+
+
+class HomeContextCache:
+    """按设备列表指纹与向量检索器缓存 HomeContext。
+
+    设备列表变化后指纹改变，自动重建；同一设备列表换用不同的向量检索器也会重建。
+    缓存只省去上下文的预计算：不同家庭的上下文共享同一向量检索器时，
+    检索器的索引仍随家庭切换而重建（见模块文档）。
+    """
+
+    def __init__(self, maxsize: int = 8):
+        """初始化。
+
+        Args:
+            maxsize: 缓存的上下文数量上限（按最近使用淘汰）
+        """
+        self.maxsize = maxsize
+        self._items: OrderedDict[tuple[str, int], HomeContext] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(
+        self,
+        devices: list[Device],
+        vector_searcher: VectorSearcher | None = None,
+    ) -> HomeContext:
+        """返回设备列表对应的 HomeContext，未命中时构建。"""
+        fingerprint = device_fingerprint(devices)
+        key = (fingerprint, id(vector_searcher))
+        with self._lock:
+            context = self._items.get(key)
+            if context is not None and context.vector_searcher is vector_searcher:
+                self._items.move_to_end(key)
+                return context
+
+        context = HomeContext.build(devices, vector_searcher, fingerprint)
+        if self.maxsize <= 0:
+            return context
+        with self._lock:
+            self._items[key] = context
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return context
+
+
+_DEFAULT_CONTEXT_CACHE = HomeContextCache()
+
+
+def get_home_context(
+    devices: list[Device],
+    vector_searcher: VectorSearcher | None = None,
+) -> HomeContext:
+    """从进程级缓存获取设备列表对应的 HomeContext。"""
+    return _DEFAULT_CONTEXT_CACHE.get(devices, vector_searcher)
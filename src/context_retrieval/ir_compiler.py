@@ -3,17 +3,24 @@
 负责命令映射与 LLM 适配。
 """
 
+import asyncio
 import json
 import os
 import re
-from typing import Any, Protocol
+from typing import Any, AsyncIterator, Iterator, Protocol
 
 from command_parser import ParsedCommand
 from context_retrieval.models import QueryIR
 
 
 class LLMClient(Protocol):
-    """LLM 客户端协议。"""
+    """LLM 客户端协议。
+
+    异步管线会优先调用可选的 ``agenerate_with_prompt`` 协程，
+    未实现时在线程中调用 generate_with_prompt。
+    流式管线会调用可选的 ``stream_with_prompt`` / ``astream_with_prompt``，
+    逐段返回增量文本；未实现时退化为一次性生成。
+    """
 
     def generate_with_prompt(self, text: str, system_prompt: str) -> str:
         """生成文本（带 system prompt）。"""
@@ -31,6 +38,8 @@ class LLMClient(Protocol):
 class FakeLLM(LLMClient):
     """用于测试和离线 demo 的假 LLM。"""
 
+    stream_chunk_size = 16
+
     def __init__(self, preset_responses: dict[str, dict[str, Any]] | None = None):
         """初始化。
 
@@ -61,6 +70,24 @@ class FakeLLM(LLMClient):
                 return json.dumps(preset, ensure_ascii=False)
         return "[]"
 
+    async def agenerate_with_prompt(self, text: str, system_prompt: str) -> str:
+        """异步返回预设的命令数组文本。"""
+        return self.generate_with_prompt(text, system_prompt)
+
+    def stream_with_prompt(self, text: str, system_prompt: str) -> Iterator[str]:
+        """按 stream_chunk_size 分段返回预设的命令数组文本。"""
+        content = self.generate_with_prompt(text, system_prompt)
+        size = max(1, self.stream_chunk_size)
+        for start in range(0, len(content), size):
+            yield content[start : start + size]
+
+    async def astream_with_prompt(
+        self, text: str, system_prompt: str
+    ) -> AsyncIterator[str]:
+        """异步分段返回预设的命令数组文本。"""
+        for chunk in self.stream_with_prompt(text, system_prompt):
+            yield chunk
+
 
 class DashScopeLLM(LLMClient):
     """基于 dashscope 的 LLM 解析器。
@@ -74,6 +101,7 @@ class DashScopeLLM(LLMClient):
         api_key: str | None = None,
         generation_client: Any | None = None,
         system_prompt: str | None = None,
+        aio_generation_client: Any | None = None,
     ):
         """初始化。
 
@@ -82,9 +110,12 @@ class DashScopeLLM(LLMClient):
             api_key: API Key，未提供时从环境变量 `DASHSCOPE_API_KEY` 读取
             generation_client: 可注入的 Generation 客户端，便于测试
             system_prompt: 可选自定义 system prompt
+            aio_generation_client: 可注入的异步 Generation 客户端（call 为协程），
+                未注入时使用 dashscope.AioGeneration
         """
         self.model = model
         self._system_prompt = system_prompt or ""
+        self._aio_generation = aio_generation_client
 
         if generation_client is not None:
             self._generation = generation_client
@@ -103,6 +134,8 @@ class DashScopeLLM(LLMClient):
 
         self._generation = Generation
         self._dashscope = dashscope
+        if self._aio_generation is None:
+            self._aio_generation = getattr(dashscope, "AioGeneration", None)
 
     def parse(self, text: str) -> dict[str, Any]:
         """调用 dashscope 解析 QueryIR。"""
@@ -116,19 +149,73 @@ class DashScopeLLM(LLMClient):
 
     def generate_with_prompt(self, text: str, system_prompt: str) -> str:
         """调用 dashscope 返回原始文本（可覆盖 system prompt）。"""
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": text},
-        ]
-
         response = self._generation.call(
             model=self.model,
-            messages=messages,  # type: ignore
+            messages=self._messages(text, system_prompt),  # type: ignore
             result_format="message",  # 使用 message 格式以获取 choices 结构
         )
 
         return self._extract_content(response)
 
+    async def agenerate_with_prompt(self, text: str, system_prompt: str) -> str:
+        """异步调用 dashscope 返回原始文本。
+
+        使用 AioGeneration 直接 await；没有异步客户端时在线程中调用同步接口。
+        """
+        if self._aio_generation is None:
+            return await asyncio.to_thread(self.generate_with_prompt, text, system_prompt)
+
+        response = await self._aio_generation.call(
+            model=self.model,
+            messages=self._messages(text, system_prompt),
+            result_format="message",
+        )
+        return self._extract_content(response)
+
+    def stream_with_prompt(self, text: str, system_prompt: str) -> Iterator[str]:
+        """流式调用 dashscope，逐段返回增量文本。"""
+        responses = self._generation.call(
+            model=self.model,
+            messages=self._messages(text, system_prompt),  # type: ignore
+            result_format="message",
+            stream=True,
+            incremental_output=True,
+        )
+        for response in responses:
+            content = self._extract_content(response)
+            if content:
+                yield content
+
+    async def astream_with_prompt(
+        self, text: str, system_prompt: str
+    ) -> AsyncIterator[str]:
+        """异步流式调用 dashscope，逐段返回增量文本。
+
+        没有异步客户端时一次性返回 agenerate_with_prompt 的完整文本。
+        """
+        if self._aio_generation is None:
+            yield await self.agenerate_with_prompt(text, system_prompt)
+            return
+
+        responses = await self._aio_generation.call(
+            model=self.model,
+            messages=self._messages(text, system_prompt),
+            result_format="message",
+            stream=True,
+            incremental_output=True,
+        )
+        async for response in responses:
+            content = self._extract_content(response)
+            if content:
+                yield content
+
+    def _messages(self, text: str, system_prompt: str) -> list[dict[str, str]]:
+        """构造 system + user 消息列表。"""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text},
+        ]
+
     def _extract_content(self, response: Any) -> str:
         """从 dashscope 响应中提取文本内容。
 
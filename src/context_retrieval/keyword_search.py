@@ -3,21 +3,78 @@
 基于 QueryIR 和设备元数据（name/room/type）进行检索。
 """
 
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+
 from context_retrieval.category_gating import map_type_to_category
-from context_retrieval.models import Candidate, Device, QueryIR
+from context_retrieval.models import Candidate, CommandSpec, Device, QueryIR
+from context_retrieval.scoring import top_k_by
 from context_retrieval.text import (
     contains_substring,
     exact_match,
-    fuzzy_match_score,
+    fuzzy_match_matrix,
 )
 
 
+CommandSignature = tuple[tuple[str, str], ...]
+
+DEFAULT_ACTION_CACHE_SIZE = 1024
+
+
+def _command_signature(commands: list[CommandSpec]) -> CommandSignature:
+    """命令列表的签名（id + 描述），同型号设备共享。"""
+    return tuple((cmd.id, cmd.description) for cmd in commands)
+
+
+def _command_texts(signature: CommandSignature) -> tuple[str, ...]:
+    """命令的规范化匹配文本（小写的 "id 描述"）。"""
+    return tuple(f"{cmd_id} {description}".lower() for cmd_id, description in signature)
+
+
+def _add_postings(
+    postings: dict[str, set[Hashable]],
+    key: Hashable,
+    texts: Iterable[str],
+) -> None:
+    """将文本中的每个字符映射到 key。"""
+    for text in texts:
+        for char in text:
+            postings.setdefault(char, set()).add(key)
+
+
+def _lookup_postings(
+    postings: dict[str, set[Hashable]],
+    texts: Iterable[str],
+) -> set[Hashable]:
+    """返回与查询文本至少共享一个字符的 key 集合。"""
+    keys: set[Hashable] = set()
+    for text in texts:
+        for char in set(text):
+            keys.update(postings.get(char, ()))
+    return keys
+
+
 class KeywordSearcher:
     """关键词检索器。
 
     基于 QueryIR 解析结果和设备元数据进行匹配。
     主要负责精确匹配和基于 rapidfuzz 的模糊匹配。
     语义相似度匹配由 VectorSearcher 负责。
+
+    初始化时构建倒排索引：名称/房间/命令文本的字符 -> 唯一值，
+    以及名称、房间、命令签名、类别 -> 设备下标。检索时只对与查询共享字符的
+    唯一名称/房间/命令集打分（精确、子串与模糊匹配都要求至少共享一个字符），
+    每个唯一值只打分一次，再展开到设备。模糊匹配通过 rapidfuzz.process.cdist
+    对候选唯一值批量计算。动作词表远小于设备 × 命令数，动作 -> 命中设备的结果
+    按动作文本缓存，常见动词只需一次字典查询。
+
+    倒排键使用单字符而非字符二元组：中文名称常为单字（如“灯”），没有二元组，
+    且只共享单个字符的唯一值仍可能得到非零的模糊分数。匹配区分大小写且
+    不经过 processor 预处理（命令文本的原文与小写形式同时建索引和查询），
+    与查询不共享任何字符的唯一值精确、子串与模糊得分均为 0，
+    因此按单字符剪枝不会改变检索结果。
     """
 
     # 评分权重
@@ -29,50 +86,213 @@ class KeywordSearcher:
     WEIGHT_TYPE = 0.5
     WEIGHT_ACTION = 0.3
 
-    def __init__(self, devices: list[Device]):
+    def __init__(
+        self,
+        devices: list[Device],
+        workers: int = 1,
+        action_cache_size: int = DEFAULT_ACTION_CACHE_SIZE,
+    ):
         """初始化检索器。
 
         Args:
             devices: 设备列表
+            workers: 批量模糊匹配的线程数，-1 表示使用全部 CPU
+            action_cache_size: 动作 -> 命中设备缓存的条目上限，0 表示关闭
         """
         self.devices = devices
+        self.workers = workers
+        self.action_cache_size = action_cache_size
+        self._action_cache: OrderedDict[str, tuple[int, ...]] = OrderedDict()
+        self._action_lock = threading.Lock()
         self._device_map = {d.id: d for d in devices}
-
-    def search(self, ir: QueryIR, top_k: int = 10) -> list[Candidate]:
+        self._positions: dict[str, list[int]] = {}
+
+        self._by_name: dict[str, list[int]] = {}
+        self._by_room: dict[str, list[int]] = {}
+        self._by_commands: dict[CommandSignature, list[int]] = {}
+        self._by_category: dict[str | None, list[int]] = {}
+        self._name_postings: dict[str, set[Hashable]] = {}
+        self._room_postings: dict[str, set[Hashable]] = {}
+        self._command_postings: dict[str, set[Hashable]] = {}
+        self._command_texts: dict[CommandSignature, tuple[str, ...]] = {}
+
+        for idx, device in enumerate(devices):
+            self._positions.setdefault(device.id, []).append(idx)
+            name = device.name or ""
+            room = device.room or ""
+            signature = _command_signature(device.commands)
+            self._by_name.setdefault(name, []).append(idx)
+            self._by_room.setdefault(room, []).append(idx)
+            self._by_commands.setdefault(signature, []).append(idx)
+            self._by_category.setdefault(
+                map_type_to_category(device.category), []
+            ).append(idx)
+
+        for name in self._by_name:
+            _add_postings(self._name_postings, name, [name])
+        for room in self._by_room:
+            _add_postings(self._room_postings, room, [room])
+        for signature in self._by_commands:
+            command_texts = _command_texts(signature)
+            self._command_texts[signature] = command_texts
+            descriptions = [description for _, description in signature]
+            _add_postings(
+                self._command_postings,
+                signature,
+                [*command_texts, *descriptions],
+            )
+
+    def search(
+        self,
+        ir: QueryIR,
+        top_k: int = 10,
+        device_ids: set[str] | None = None,
+    ) -> list[Candidate]:
         """执行关键词检索。
 
         Args:
             ir: 查询 IR（由 LLM 解析得到）
             top_k: 返回的最大候选数
+            device_ids: 可选设备集合（scope/类别门控后的设备），None 表示不限制
 
         Returns:
             候选列表，按分数降序排列
         """
-        candidates: list[Candidate] = []
-
-        for device in self.devices:
-            score, reasons = self._score_device(device, ir)
+        allowed: set[int] | None = None
+        if device_ids is not None:
+            allowed = {
+                idx
+                for device_id in device_ids
+                for idx in self._positions.get(device_id, ())
+            }
+            if not allowed:
+                return []
+
+        name_scores = self._device_scores(
+            self._by_name,
+            self._name_postings,
+            [ir.name_hint] if ir.name_hint else [],
+            lambda names: self._score_names(names, ir),
+            allowed,
+        )
+        room_scores = self._device_scores(
+            self._by_room,
+            self._room_postings,
+            list(ir.scope_include),
+            lambda rooms: self._score_rooms(rooms, ir),
+            allowed,
+        )
+        action_scores = {
+            idx: self.WEIGHT_ACTION
+            for idx in self._action_matches((ir.action or "").strip())
+            if allowed is None or idx in allowed
+        }
+        hint_category = self._hint_category(ir.type_hint)
+        type_hits: set[int] = set()
+        if hint_category:
+            type_hits = set(self._by_category.get(hint_category, []))
+            if allowed is not None:
+                type_hits &= allowed
+
+        scored: list[tuple[int, float, list[str]]] = []
+        matched = set(name_scores) | set(room_scores) | set(action_scores) | type_hits
+        for idx in sorted(matched):
+            score, reasons = self._combine_scores(
+                name_scores.get(idx, 0.0),
+                room_scores.get(idx, 0.0),
+                self.WEIGHT_TYPE if idx in type_hits else 0.0,
+                action_scores.get(idx, 0.0),
+            )
             if score > 0:
-                candidates.append(
-                    Candidate(
-                        entity_id=device.id,
-                        entity_kind="device",
-                        keyword_score=score,
-                        total_score=score,
-                        reasons=reasons,
-                    )
-                )
-
-        candidates.sort(key=lambda c: c.keyword_score, reverse=True)
-        return candidates[:top_k]
-
-    def _score_device(self, device: Device, ir: QueryIR) -> tuple[float, list[str]]:
-        """计算设备的匹配分数。"""
+                scored.append((idx, score, reasons))
+
+        # 只为入选的 top_k 构造候选对象
+        return [
+            Candidate(
+                entity_id=self.devices[idx].id,
+                entity_kind="device",
+                keyword_score=score,
+                total_score=score,
+                reasons=reasons,
+            )
+            for idx, score, reasons in top_k_by(scored, top_k, key=lambda item: item[1])
+        ]
+
+    @staticmethod
+    def _device_scores(
+        groups: dict[Hashable, list[int]],
+        postings: dict[str, set[Hashable]],
+        query_texts: list[str],
+        score_fn: Callable[[list], list[float]],
+        allowed: set[int] | None = None,
+    ) -> dict[int, float]:
+        """对与查询共享字符（或完全相等）的唯一值批量打分，并展开为设备下标 -> 分数。
+
+        allowed 不为 None 时跳过不含允许设备的唯一值。
+        """
+        if not query_texts:
+            return {}
+        keys = _lookup_postings(postings, query_texts)
+        keys.update(text for text in query_texts if text in groups)
+
+        plausible: list[Hashable] = []
+        positions: list[list[int]] = []
+        for key in keys:
+            key_positions = groups[key]
+            if allowed is not None:
+                key_positions = [idx for idx in key_positions if idx in allowed]
+                if not key_positions:
+                    continue
+            plausible.append(key)
+            positions.append(key_positions)
+        if not plausible:
+            return {}
+
+        scores: dict[int, float] = {}
+        for score, key_positions in zip(score_fn(plausible), positions):
+            if score > 0:
+                for idx in key_positions:
+                    scores[idx] = score
+        return scores
+
+    def _action_matches(self, action_text: str) -> tuple[int, ...]:
+        """返回动作命中的设备下标（与设备子集无关，按动作文本缓存）。"""
+        if not action_text:
+            return ()
+
+        with self._action_lock:
+            cached = self._action_cache.get(action_text)
+            if cached is not None:
+                self._action_cache.move_to_end(action_text)
+                return cached
+
+        scores = self._device_scores(
+            self._by_commands,
+            self._command_postings,
+            [action_text.lower(), action_text],
+            lambda signatures: self._score_command_sets(signatures, action_text),
+        )
+        matches = tuple(sorted(scores))
+        if self.action_cache_size > 0:
+            with self._action_lock:
+                self._action_cache[action_text] = matches
+                self._action_cache.move_to_end(action_text)
+                while len(self._action_cache) > self.action_cache_size:
+                    self._action_cache.popitem(last=False)
+        return matches
+
+    def _combine_scores(
+        self,
+        name_score: float,
+        room_score: float,
+        type_score: float,
+        action_score: float,
+    ) -> tuple[float, list[str]]:
+        """合并各信号分数并生成命中原因。"""
         scores: list[float] = []
         reasons: list[str] = []
 
         # 1. 名称匹配（基于 name_hint）
-        name_score = self._score_name(device, ir)
         if name_score > 0:
             scores.append(name_score)
             if name_score >= self.WEIGHT_NAME_EXACT:
@@ -83,7 +303,6 @@ class KeywordSearcher:
                 reasons.append("name_fuzzy")
 
         # 2. 房间匹配（基于 scope_include）
-        room_score = self._score_room(device, ir)
         if room_score > 0:
             scores.append(room_score)
             if room_score >= self.WEIGHT_ROOM_EXACT:
@@ -92,13 +311,11 @@ class KeywordSearcher:
                 reasons.append("room_fuzzy")
 
         # 3. 类型匹配（基于 type_hint）
-        type_score = self._score_type(device, ir)
         if type_score > 0:
             scores.append(type_score)
             reasons.append("type_hit")
 
         # 4. 动作-命令匹配
-        action_score = self._score_action(device, ir)
         if action_score > 0:
             scores.append(action_score)
             reasons.append("action_match")
@@ -115,70 +332,178 @@ class KeywordSearcher:
 
         return total, reasons
 
-    def _score_name(self, device: Device, ir: QueryIR) -> float:
-        """计算名称匹配分数。"""
-        if not ir.name_hint:
-            return 0.0
-
-        queries = [ir.name_hint]
-
-        best_score = 0.0
-        for q in queries:
-            if exact_match(device.name, q):
-                return self.WEIGHT_NAME_EXACT
-            if contains_substring(device.name, q) or contains_substring(q, device.name):
-                best_score = max(best_score, self.WEIGHT_NAME_SUBSTRING)
+    def _score_names(self, names: list[str], ir: QueryIR) -> list[float]:
+        """批量计算名称与 name_hint 的匹配分数。"""
+        query = ir.name_hint
+        if not query:
+            return [0.0] * len(names)
+
+        scores = [0.0] * len(names)
+        fuzzy_positions: list[int] = []
+        for pos, name in enumerate(names):
+            if exact_match(name, query):
+                scores[pos] = self.WEIGHT_NAME_EXACT
+            elif contains_substring(name, query) or contains_substring(query, name):
+                scores[pos] = self.WEIGHT_NAME_SUBSTRING
             else:
-                fuzzy = fuzzy_match_score(device.name, q)
-                if fuzzy > 0.6:
-                    best_score = max(best_score, fuzzy * self.WEIGHT_NAME_FUZZY)
+                fuzzy_positions.append(pos)
+
+        fuzzy = fuzzy_match_matrix(
+            [names[pos] for pos in fuzzy_positions], [query], workers=self.workers
+        )
+        for pos, value in zip(fuzzy_positions, fuzzy[:, 0].tolist()):
+            if value > 0.6:
+                scores[pos] = value * self.WEIGHT_NAME_FUZZY
 
-        return best_score
+        return scores
 
-    def _score_room(self, device: Device, ir: QueryIR) -> float:
-        """计算房间匹配分数。"""
+    def _score_rooms(self, device_rooms: list[str], ir: QueryIR) -> list[float]:
+        """批量计算房间与 scope_include 的匹配分数（按 scope 顺序取首个命中）。"""
         if not ir.scope_include:
-            return 0.0
+            return [0.0] * len(device_rooms)
+
+        scope_rooms = list(ir.scope_include)
+        fuzzy = fuzzy_match_matrix(device_rooms, scope_rooms, workers=self.workers).tolist()
+        scores = [0.0] * len(device_rooms)
+        for pos, device_room in enumerate(device_rooms):
+            for col, room in enumerate(scope_rooms):
+                if exact_match(device_room, room):
+                    scores[pos] = self.WEIGHT_ROOM_EXACT
+                    break
+                if contains_substring(device_room, room):
+                    scores[pos] = self.WEIGHT_ROOM_EXACT * 0.9
+                    break
+                if fuzzy[pos][col] > 0.7:
+                    scores[pos] = fuzzy[pos][col] * self.WEIGHT_ROOM_FUZZY
+                    break
+
+        return scores
+
+    @staticmethod
+    def _hint_category(type_hint: str | None) -> str | None:
+        """将 type_hint 映射为已知类别，无法映射时返回 None。"""
+        if not type_hint:
+            return None
+
+        hint_category = map_type_to_category(type_hint)
+        if not hint_category or hint_category == "Unknown":
+            return None
 
-        for room in ir.scope_include:
-            if exact_match(device.room, room):
-                return self.WEIGHT_ROOM_EXACT
-            if contains_substring(device.room, room):
-                return self.WEIGHT_ROOM_EXACT * 0.9
-            fuzzy = fuzzy_match_score(device.room, room)
-            if fuzzy > 0.7:
-                return fuzzy * self.WEIGHT_ROOM_FUZZY
+        return hint_category
 
-        return 0.0
+    def _score_command_sets(
+        self,
+        signatures: list[CommandSignature],
+        action_text: str,
+    ) -> list[float]:
+        """批量计算动作与各组命令（id, 描述）的匹配分数。
+
+        先做子串匹配；未命中的命令组把描述去重后一次性做模糊匹配。
+        """
+        if not action_text:
+            return [0.0] * len(signatures)
 
-    def _score_type(self, device: Device, ir: QueryIR) -> float:
-        """计算类型匹配分数。"""
-        if not ir.type_hint:
-            return 0.0
+        action_lower = action_text.lower()
+        scores = [0.0] * len(signatures)
+        pending: list[int] = []
+        for pos, signature in enumerate(signatures):
+            command_texts = self._command_texts.get(signature)
+            if command_texts is None:
+                command_texts = _command_texts(signature)
+            if any(action_lower in text for text in command_texts):
+                scores[pos] = self.WEIGHT_ACTION
+            else:
+                pending.append(pos)
+
+        descriptions = list(
+            dict.fromkeys(
+                description
+                for pos in pending
+                for _, description in signatures[pos]
+            )
+        )
+        fuzzy = fuzzy_match_matrix(descriptions, [action_text], workers=self.workers)
+        matched = {
+            description
+            for description, value in zip(descriptions, fuzzy[:, 0].tolist())
+            if value > 0.7
+        }
+        for pos in pending:
+            if any(description in matched for _, description in signatures[pos]):
+                scores[pos] = self.WEIGHT_ACTION
+
+        return scores
+
+
+def device_fingerprint(devices: list[Device]) -> str:
+    """计算设备列表中影响检索的字段指纹（id/名称/房间/类别/profile/命令）。"""
+    digest = hashlib.blake2b(digest_size=16)
+    for device in devices:
+        parts = [
+            device.id,
+            device.name or "",
+            device.room or "",
+            device.category or "",
+            device.profile_id or "",
+        ]
+        for cmd in device.commands:
+            parts.extend((cmd.id, cmd.description))
+        digest.update("\x1f".join(parts).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
 
-        hint_category = map_type_to_category(ir.type_hint)
-        if not hint_category or hint_category == "Unknown":
-            return 0.0
 
-        device_mapped = map_type_to_category(device.category)
+class KeywordIndexCache:
+    """按设备列表指纹缓存 KeywordSearcher。
 
-        if device_mapped == hint_category:
-            return self.WEIGHT_TYPE
+    同一家庭的设备列表只构建一次倒排索引；设备变化后指纹改变，自动重建。
+    """
 
-        return 0.0
+    def __init__(self, maxsize: int = 8):
+        """初始化。
 
-    def _score_action(self, device: Device, ir: QueryIR) -> float:
-        """计算动作-命令匹配分数。"""
-        action_text = (ir.action or "").strip()
-        if not action_text:
-            return 0.0
+        Args:
+            maxsize: 缓存的索引数量上限（按最近使用淘汰）
+        """
+        self.maxsize = maxsize
+        self._items: OrderedDict[str, KeywordSearcher] = OrderedDict()
+        self._lock = threading.Lock()
 
-        action_lower = action_text.lower()
-        for cmd in device.commands:
-            cmd_text = f"{cmd.id} {cmd.description}".lower()
-            if action_lower in cmd_text:
-                return self.WEIGHT_ACTION
-            if fuzzy_match_score(cmd.description, action_text) > 0.7:
-                return self.WEIGHT_ACTION
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, devices: list[Device], fingerprint: str | None = None) -> KeywordSearcher:
+        """返回设备列表对应的 KeywordSearcher，未命中时构建。
 
-        return 0.0
+        Args:
+            devices: 设备列表
+            fingerprint: 调用方已计算的设备指纹，None 时现算
+        """
+        if fingerprint is None:
+            fingerprint = device_fingerprint(devices)
+        with self._lock:
+            searcher = self._items.get(fingerprint)
+            if searcher is not None:
+                self._items.move_to_end(fingerprint)
+                return searcher
+
+        searcher = KeywordSearcher(devices)
+        if self.maxsize <= 0:
+            return searcher
+        with self._lock:
+            self._items[fingerprint] = searcher
+            self._items.move_to_end(fingerprint)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return searcher
+
+
+_DEFAULT_INDEX_CACHE = KeywordIndexCache()
+
+
+def get_keyword_searcher(
+    devices: list[Device],
+    fingerprint: str | None = None,
+) -> KeywordSearcher:
+    """从进程级缓存获取设备列表对应的 KeywordSearcher。"""
+    return _DEFAULT_INDEX_CACHE.get(devices, fingerprint)
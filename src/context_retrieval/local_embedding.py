@@ -0,0 +1,143 @@
+"""本地确定性 embedding 后端。
+
+基于字符 n-gram 特征哈希（hashing trick）生成固定维度向量，纯 NumPy 实现、无网络依赖。
+用于离线压测与基准测试真实的索引/检索路径，也可作为 DashScope 不可用时的降级后端。
+"""
+
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from numpy.typing import NDArray
+
+from context_retrieval.doc_enrichment import CapabilityDoc
+from context_retrieval.embedding_cache import EmbeddingCache
+from context_retrieval.quantization import StorageMode
+from context_retrieval.vector_search import EmbeddingVectorSearcher
+
+DEFAULT_HASH_DIM = 512
+DEFAULT_NGRAM_RANGE = (1, 3)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_SIGN_BIT = 1 << 31
+
+
+def _char_ngrams(text: str, ngram_range: tuple[int, int]) -> Counter[str]:
+    """提取字符 n-gram 及其出现次数（小写、合并空白）。"""
+    normalized = _WHITESPACE_RE.sub(" ", text.lower()).strip()
+    min_n, max_n = ngram_range
+    grams: Counter[str] = Counter()
+    for n in range(min_n, max_n + 1):
+        for start in range(len(normalized) - n + 1):
+            gram = normalized[start:start + n]
+            if gram.strip():
+                grams[gram] += 1
+    return grams
+
+
+def hash_embed(
+    texts: list[str],
+    dim: int = DEFAULT_HASH_DIM,
+    ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+) -> NDArray[np.float32]:
+    """将文本编码为字符 n-gram 哈希向量。
+
+    每个 n-gram 经 crc32 映射到一个维度，最高位决定符号以抵消哈希冲突；
+    词频取 1 + log(tf) 做亚线性缩放。
+
+    Args:
+        texts: 文本列表
+        dim: 向量维度
+        ngram_range: n-gram 长度范围（闭区间）
+
+    Returns:
+        向量数组，shape=(len(texts), dim)，未归一化
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    rows: list[int] = []
+    cols: list[int] = []
+    values: list[float] = []
+    for row, text in enumerate(texts):
+        for gram, count in _char_ngrams(text, ngram_range).items():
+            digest = zlib.crc32(gram.encode("utf-8"))
+            rows.append(row)
+            cols.append(digest % dim)
+            weight = 1.0 + math.log(count)
+            values.append(-weight if digest & _SIGN_BIT else weight)
+    if rows:
+        np.add.at(
+            matrix,
+            (np.asarray(rows), np.asarray(cols)),
+            np.asarray(values, dtype=np.float32),
+        )
+    return matrix
+
+
+class HashingVectorSearcher(EmbeddingVectorSearcher):
+    """基于字符 n-gram 哈希的本地向量检索器。
+
+    与 DashScopeVectorSearcher 共用语料构建、索引与检索实现，
+    只替换 embedding 后端，结果完全确定、无需网络。
+    """
+
+    def __init__(
+        self,
+        spec_index: dict[str, list[CapabilityDoc]] | None = None,
+        dim: int = DEFAULT_HASH_DIM,
+        ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        embedding_cache: EmbeddingCache | None = None,
+        query_cache_size: int = 0,
+        query_cache_ttl: float | None = 600.0,
+        storage: StorageMode = "float32",
+        rescore: bool = False,
+        rescore_multiplier: int = 4,
+        rescore_dir: str | None = None,
+    ):
+        """初始化。
+
+        Args:
+            spec_index: profile_id -> CapabilityDoc 列表的映射
+            dim: 向量维度
+            ngram_range: n-gram 长度范围（闭区间）
+            embedding_cache: 可选的持久化 embedding 缓存
+            query_cache_size: 查询向量 LRU 容量，本地编码开销低，默认关闭
+            query_cache_ttl: 查询向量缓存有效期（秒），None 表示不过期
+            storage: 向量存储格式，float32 / float16 / int8（按行缩放）
+            rescore: 量化存储时是否保留 float32 行（落盘后以内存映射读取），对粗排候选做精确重排
+            rescore_multiplier: 重排候选数为 top_k 的倍数
+            rescore_dir: 重排用 float32 行的落盘目录，None 时使用系统临时目录
+        """
+        min_n, max_n = ngram_range
+        if dim <= 0 or min_n <= 0 or max_n < min_n:
+            raise ValueError(f"无效的哈希参数: dim={dim} ngram_range={ngram_range}")
+        super().__init__(
+            model=f"char-ngram-hash-{dim}-{min_n}-{max_n}",
+            spec_index=spec_index,
+            embedding_cache=embedding_cache,
+            query_cache_size=query_cache_size,
+            query_cache_ttl=query_cache_ttl,
+            storage=storage,
+            rescore=rescore,
+            rescore_multiplier=rescore_multiplier,
+            rescore_dir=rescore_dir,
+        )
+        self.dim = dim
+        self.ngram_range = (min_n, max_n)
+
+    def _request_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 10,
+    ) -> NDArray[np.float32]:
+        """本地编码文本（无需分批）。"""
+        return hash_embed(texts, dim=self.dim, ngram_range=self.ngram_range)
+
+    async def _arequest_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 10,
+    ) -> NDArray[np.float32]:
+        """本地编码没有 I/O，异步检索直接同步计算。"""
+        return self._request_embeddings(texts, batch_size)
@@ -99,70 +99,119 @@ def _extract_room_from_name(
     return unique[0], False
 
 
+def _sorted_room_terms(terms: Iterable[str]) -> list[str]:
+    """按长度降序排列房间词（同长按字典序），长词优先匹配。"""
+    return sorted(terms, key=lambda term: (-len(term), term))
+
+
+class ScopeIndex:
+    """预计算设备的规范化房间与名称，供同一设备列表的多次 scope 过滤复用。
+
+    名称中的房间词抽取依赖房间词表；命令只引用已知房间时词表不变，抽取结果可缓存，
+    出现未知房间词时才按扩展后的词表重新抽取。
+    """
+
+    def __init__(self, devices: list[Device]):
+        """初始化。
+
+        Args:
+            devices: 设备列表
+        """
+        self.devices = list(devices)
+        self._room_norms = [_normalize_text(device.room) for device in self.devices]
+        self._name_norms = [_normalize_text(device.name) for device in self.devices]
+        self.rooms_known = _normalize_room_terms(self._room_norms)
+        self._name_rooms: list[tuple[str | None, bool]] | None = None
+
+    def _extract_name_rooms(self, room_terms: list[str]) -> list[tuple[str | None, bool]]:
+        return [_extract_room_from_name(name, room_terms) for name in self._name_norms]
+
+    def filter(self, ir: QueryIR) -> tuple[list[Device], dict[str, object]]:
+        """根据 IR 的 scope 过滤设备。
+
+        Args:
+            ir: 查询 IR
+
+        Returns:
+            (过滤后的设备列表, scope 元信息)
+        """
+        include_terms = _normalize_room_terms(ir.scope_include)
+        exclude_terms = _normalize_room_terms(ir.scope_exclude)
+        command_terms = include_terms | exclude_terms
+        unknown_terms = sorted(
+            term for term in command_terms if term not in self.rooms_known
+        )
+        if unknown_terms:
+            name_rooms = self._extract_name_rooms(
+                _sorted_room_terms(self.rooms_known | command_terms)
+            )
+        else:
+            if self._name_rooms is None:
+                self._name_rooms = self._extract_name_rooms(
+                    _sorted_room_terms(self.rooms_known)
+                )
+            name_rooms = self._name_rooms
+
+        meta: dict[str, object] = {}
+        if unknown_terms:
+            meta["room_unknown_terms"] = unknown_terms
+
+        room_name_used = 0
+        room_name_ambiguous = 0
+        scoped: list[tuple[Device, str, str | None, bool]] = []
+        enable_unknown_fallback = bool(unknown_terms)
+
+        for device, room_norm, (name_room, ambiguous) in zip(
+            self.devices, self._room_norms, name_rooms
+        ):
+            room_conflict = not room_norm or (
+                name_room is not None and room_norm and name_room != room_norm
+            )
+            use_name_fallback = enable_unknown_fallback or room_conflict
+
+            if ambiguous and use_name_fallback:
+                room_name_ambiguous += 1
+                name_room = None
+
+            if use_name_fallback and name_room:
+                room_name_used += 1
+
+            if exclude_terms:
+                if room_norm and room_norm in exclude_terms:
+                    continue
+                if use_name_fallback and name_room and name_room in exclude_terms:
+                    continue
+
+            scoped.append((device, room_norm, name_room, use_name_fallback))
+
+        result = [device for device, _, _, _ in scoped]
+
+        if include_terms:
+            include_filtered = [
+                device
+                for device, room_norm, name_room, use_name_fallback in scoped
+                if (room_norm and room_norm in include_terms)
+                or (use_name_fallback and name_room and name_room in include_terms)
+            ]
+            if include_filtered:
+                result = include_filtered
+            else:
+                meta["scope_include_fallback"] = 1
+
+        if room_name_used:
+            meta["room_name_used"] = room_name_used
+        if room_name_ambiguous:
+            meta["room_name_ambiguous"] = room_name_ambiguous
+
+        return result, meta
+
+
 def apply_scope_filters(
     devices: list[Device],
     ir: QueryIR,
 ) -> tuple[list[Device], dict[str, object]]:
-    """根据 IR 的 scope 过滤设备。"""
-    include_terms = _normalize_room_terms(ir.scope_include)
-    exclude_terms = _normalize_room_terms(ir.scope_exclude)
-    rooms_known = _normalize_room_terms(
-        _normalize_text(device.room) for device in devices
-    )
-    command_terms = include_terms | exclude_terms
-    unknown_terms = sorted(term for term in command_terms if term not in rooms_known)
-    room_terms = sorted(rooms_known | command_terms, key=len, reverse=True)
-
-    meta: dict[str, object] = {}
-    if unknown_terms:
-        meta["room_unknown_terms"] = unknown_terms
-
-    room_name_used = 0
-    room_name_ambiguous = 0
-    scoped: list[tuple[Device, str, str | None, bool]] = []
-    enable_unknown_fallback = bool(unknown_terms)
-
-    for device in devices:
-        room_norm = _normalize_text(device.room)
-        name_norm = _normalize_text(device.name)
-        name_room, ambiguous = _extract_room_from_name(name_norm, room_terms)
-        room_conflict = not room_norm or (
-            name_room is not None and room_norm and name_room != room_norm
-        )
-        use_name_fallback = enable_unknown_fallback or room_conflict
-
-        if ambiguous and use_name_fallback:
-            room_name_ambiguous += 1
-            name_room = None
-
-        if use_name_fallback and name_room:
-            room_name_used += 1
-
-        if exclude_terms:
-            if room_norm and room_norm in exclude_terms:
-                continue
-            if use_name_fallback and name_room and name_room in exclude_terms:
-                continue
-
-        scoped.append((device, room_norm, name_room, use_name_fallback))
-
-    result = [device for device, _, _, _ in scoped]
-
-    if include_terms:
-        include_filtered = [
-            device
-            for device, room_norm, name_room, use_name_fallback in scoped
-            if (room_norm and room_norm in include_terms)
-            or (use_name_fallback and name_room and name_room in include_terms)
-        ]
-        if include_filtered:
-            result = include_filtered
-        else:
-            meta["scope_include_fallback"] = 1
-
-    if room_name_used:
-        meta["room_name_used"] = room_name_used
-    if room_name_ambiguous:
-        meta["room_name_ambiguous"] = room_name_ambiguous
+    """根据 IR 的 scope 过滤设备。
 
-    return result, meta
+    同一设备列表需要多次过滤时，使用 ScopeIndex 复用预计算结果。
+    """
+    return ScopeIndex(devices).filter(ir)
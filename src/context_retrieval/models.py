@@ -1,13 +1,15 @@
 """核心数据模型定义。
 
 包含设备、命令、查询IR、候选、澄清请求等数据结构。
+所有模型使用 slots（无实例 __dict__），大户型下设备与候选的内存占用更低；
+规格类模型（命令、取值）创建后不再修改，声明为 frozen。
 """
 
 from dataclasses import dataclass, field
 from typing import Any, Literal
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ValueOption:
     """命令参数的可选值。"""
 
@@ -15,7 +17,7 @@ class ValueOption:
     description: str = ""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ValueRange:
     """命令参数的取值范围。"""
 
@@ -24,7 +26,7 @@ class ValueRange:
     unit: str = ""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CommandSpec:
     """设备命令规格。"""
 
@@ -35,7 +37,7 @@ class CommandSpec:
     value_list: list[ValueOption] | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Device:
     """智能家居设备。"""
 
@@ -44,9 +46,10 @@ class Device:
     room: str
     category: str
     commands: list[CommandSpec] = field(default_factory=list)
+    profile_id: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Group:
     """设备分组。"""
 
@@ -55,7 +58,7 @@ class Group:
     device_ids: list[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryIR:
     """查询中间表示（Intermediate Representation）。"""
 
@@ -71,7 +74,7 @@ class QueryIR:
     meta: dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class Candidate:
     """检索候选。"""
 
@@ -84,7 +87,7 @@ class Candidate:
     reasons: list[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class CapabilityOption:
     """Bulk mode 下的 capability 候选选项。"""
 
@@ -99,7 +102,7 @@ class CapabilityOption:
     examples: list[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class RetrievalResult:
     """检索结果。"""
 
@@ -113,7 +116,7 @@ class RetrievalResult:
     meta: dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandRetrieval:
     """单条命令的检索结果。"""
 
@@ -122,7 +125,7 @@ class CommandRetrieval:
     result: RetrievalResult
 
 
-@dataclass
+@dataclass(slots=True)
 class MultiRetrievalResult:
     """多命令检索结果。"""
 
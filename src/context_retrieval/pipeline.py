@@ -3,17 +3,31 @@
 整合各模块完成上下文检索流程。
 """
 
+import asyncio
+import functools
 import logging
 import os
+import queue
 import re
-
-from command_parser import CommandParserConfig, parse_command_output
+import threading
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from command_parser import (
+    CommandParserConfig,
+    CommandStreamParser,
+    ParsedCommand,
+    ParseResult,
+    parse_command_output,
+)
 from command_parser.prompt import DEFAULT_SYSTEM_PROMPT
 from context_retrieval.bulk import (
     DEFAULT_BULK_BATCH_SIZE,
     DEFAULT_COVERAGE_THRESHOLD,
     DEFAULT_MAX_GROUPS,
     DEFAULT_MAX_TARGETS,
+    DEFAULT_OPTIONS_SEARCH_K,
     build_capability_options,
     build_spec_lookup,
     group_by_command_compatibility,
@@ -24,12 +38,11 @@ from context_retrieval.bulk import (
 )
 from context_retrieval.category_gating import filter_by_category, map_type_to_category
 from context_retrieval.doc_enrichment import enrich_description
-from context_retrieval.models import Candidate, Device, RetrievalResult
+from context_retrieval.home_context import HomeContext
+from context_retrieval.models import Candidate, Device, QueryIR, RetrievalResult
 from context_retrieval.ir_compiler import LLMClient, compile_ir
 from context_retrieval.state import ConversationState
-from context_retrieval.logic import apply_scope_filters
-from context_retrieval.keyword_search import KeywordSearcher
-from context_retrieval.scoring import apply_room_bonus, merge_and_score
+from context_retrieval.scoring import DEFAULT_RRF_K, FusionMode, merge_candidates
 from context_retrieval.gating import select_top
 from context_retrieval.text import fuzzy_match_score
 from context_retrieval.vector_search import VectorSearcher
@@ -38,6 +51,15 @@ DEFAULT_KEYWORD_WEIGHT = 1.0
 DEFAULT_VECTOR_WEIGHT = 0.3
 FALLBACK_KEYWORD_WEIGHT = 1.2
 FALLBACK_VECTOR_WEIGHT = 0.2
+# 线性融合依赖分数量纲，需要多取向量候选；RRF 只看名次，少量候选即可
+LINEAR_VECTOR_SEARCH_MULTIPLIER = 10
+LINEAR_MIN_VECTOR_SEARCH_K = 50
+RRF_VECTOR_SEARCH_MULTIPLIER = 3
+RRF_MIN_VECTOR_SEARCH_K = 15
+# 多命令请求中各命令并发检索的线程数上限
+MAX_COMMAND_WORKERS = 4
+# 推测检索不做设备过滤，多取若干倍候选，使过滤后仍足够复用
+SPECULATIVE_VECTOR_SEARCH_MULTIPLIER = 4
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +68,7 @@ _CJK_RE = re.compile(r"[\u4e00-\u9fff]")
 _DIGIT_RE = re.compile(r"\d")
 _CANCEL_TOKEN = "\u53d6\u6d88"
 _BULK_ARBITRATION_ENV = "ENABLE_BULK_ARBITRATION_LLM"
+_TOP_PREVIEW_SIZE = 5
 
 _BULK_QUERY_TOKENS = ("所有", "全部", "全体", "所有的", "全部的")
 _BULK_QUERY_PREFIXES = ("把", "将", "请")
@@ -106,8 +129,8 @@ def _should_force_capability_guess(query: str) -> bool:
 
 
 def _device_profile_id(device: Device) -> str | None:
-    """解析设备的 profile_id（兼容旧字段）。"""
-    profile_id = getattr(device, "profile_id", None) or getattr(device, "profileId", None)
+    """解析设备的 profile_id（去除首尾空白，空值返回 None）。"""
+    profile_id = device.profile_id
     if isinstance(profile_id, str) and profile_id.strip():
         return profile_id.strip()
     return None
@@ -238,62 +261,28 @@ def _guess_capability_id(
     return best_id
 
 
-def _fill_missing_capability_ids(
-    candidates: list[Candidate],
+def _fill_capability_id(
+    candidate: Candidate,
     *,
     query: str,
     device_by_id: dict[str, Device],
     spec_lookup,
-) -> list[Candidate]:
-    """为缺失 capability_id 的候选补全能力标识。"""
-    if not candidates:
-        return candidates
+) -> Candidate:
+    """为缺失 capability_id 的候选原地补全能力标识。
 
-    filled: list[Candidate] = []
-    for cand in candidates:
-        if cand.entity_kind != "device" or cand.capability_id:
-            filled.append(cand)
-            continue
-
-        device = device_by_id.get(cand.entity_id)
-        if device is None:
-            filled.append(cand)
-            continue
-
-        cap_id = _guess_capability_id(query=query, device=device, spec_lookup=spec_lookup)
-        if not cap_id:
-            filled.append(cand)
-            continue
-
-        filled.append(
-            Candidate(
-                entity_id=cand.entity_id,
-                entity_kind=cand.entity_kind,
-                capability_id=cap_id,
-                keyword_score=cand.keyword_score,
-                vector_score=cand.vector_score,
-                total_score=cand.total_score,
-                reasons=list(cand.reasons),
-            )
-        )
-
-    return filled
-
-
-def _dedupe_device_candidates(candidates: list[Candidate]) -> list[Candidate]:
-    """同一设备只保留最高分候选。"""
-    if not candidates:
-        return candidates
+    候选由 CandidateBatch 按需物化，归本次检索独占，无需复制。
+    """
+    if candidate.entity_kind != "device" or candidate.capability_id:
+        return candidate
 
-    best: dict[str, Candidate] = {}
-    for cand in candidates:
-        if cand.entity_kind != "device":
-            continue
-        current = best.get(cand.entity_id)
-        if current is None or cand.total_score > current.total_score:
-            best[cand.entity_id] = cand
+    device = device_by_id.get(candidate.entity_id)
+    if device is None:
+        return candidate
 
-    return list(best.values())
+    cap_id = _guess_capability_id(query=query, device=device, spec_lookup=spec_lookup)
+    if cap_id:
+        candidate.capability_id = cap_id
+    return candidate
 
 
 def _apply_capability_guess(
@@ -303,43 +292,24 @@ def _apply_capability_guess(
     device_by_id: dict[str, Device],
     spec_lookup,
 ) -> list[Candidate]:
-    """在满足条件时为候选补充能力猜测标记。"""
-    if not candidates:
-        return candidates
-
-    updated: list[Candidate] = []
+    """在满足条件时为候选原地补充能力猜测标记。"""
     for cand in candidates:
         if cand.entity_kind != "device":
-            updated.append(cand)
             continue
 
         device = device_by_id.get(cand.entity_id)
         if device is None:
-            updated.append(cand)
             continue
 
         cap_id = _guess_capability_id(query=query, device=device, spec_lookup=spec_lookup)
         if not cap_id or cap_id == cand.capability_id:
-            updated.append(cand)
             continue
 
-        reasons = list(cand.reasons)
-        if "capability_guess" not in reasons:
-            reasons.append("capability_guess")
-
-        updated.append(
-            Candidate(
-                entity_id=cand.entity_id,
-                entity_kind=cand.entity_kind,
-                capability_id=cap_id,
-                keyword_score=cand.keyword_score,
-                vector_score=cand.vector_score,
-                total_score=cand.total_score,
-                reasons=reasons,
-            )
-        )
+        cand.capability_id = cap_id
+        if "capability_guess" not in cand.reasons:
+            cand.reasons.append("capability_guess")
 
-    return updated
+    return candidates
 
 
 def _is_supported_candidate(
@@ -423,35 +393,38 @@ def _can_bulk_retrieve(ir, vector_searcher: VectorSearcher | None) -> bool:
     return True
 
 
-def _generate_command_output(text: str, llm: LLMClient) -> str:
-    """调用 LLM 生成命令解析输出文本。"""
-    try:
-        return llm.generate_with_prompt(text, DEFAULT_SYSTEM_PROMPT)
-    except Exception as exc:  # pragma: no cover - 保护主流程
-        logger.warning("command_output_failed error=%s", exc)
-        return "[]"
+@dataclass
+class _PreparedCommand:
+    """单条 QueryIR 的预处理结果（scope 过滤、类别门控与向量检索请求）。"""
 
+    filtered_devices: list[Device]
+    scope_meta: dict[str, object]
+    mapped_category: str | None
+    apply_gating: bool
+    gated_devices: list[Device]
+    bulk: bool = False
+    search_text: str | None = None
+    search_k: int = 0
+    device_ids: set[str] = field(default_factory=set)
 
-def _retrieve_with_ir(
-    ir,
-    devices: list[Device],
-    llm: LLMClient,
-    state: ConversationState,
-    top_k: int = 5,
-    vector_searcher: VectorSearcher | None = None,
-    spec_index: dict | None = None,
-    spec_lookup: dict | None = None,
-    device_by_id: dict[str, Device] | None = None,
-) -> RetrievalResult:
-    """执行单条 QueryIR 的检索。
 
-    Pipeline 流程：
-    1. Scope 预过滤
-    2. Keyword 召回
-    3. Vector 召回（可选）
-    4. 融合评分
-    5. Top-K 筛选
-    6. 更新会话状态
+def _vector_search_k(top_k: int, fusion: FusionMode) -> int:
+    """按融合方式确定非 bulk 命令的向量召回数量。"""
+    if fusion == "rrf":
+        return max(top_k * RRF_VECTOR_SEARCH_MULTIPLIER, RRF_MIN_VECTOR_SEARCH_K)
+    return max(top_k * LINEAR_VECTOR_SEARCH_MULTIPLIER, LINEAR_MIN_VECTOR_SEARCH_K)
+
+
+def _prepare_command(
+    ir,
+    context: HomeContext,
+    top_k: int,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+) -> _PreparedCommand:
+    """执行 scope 预过滤与类别门控，并确定向量检索请求。
+
+    该步骤不依赖会话状态，可在检索前对所有命令统一执行。
     """
     logger.info(
         "query=%s action=%s type_hint=%s quantifier=%s scope_include=%s scope_exclude=%s",
@@ -463,11 +436,8 @@ def _retrieve_with_ir(
         sorted(ir.scope_exclude),
     )
 
-    # 2. Scope 预过滤
-    filtered_devices, scope_meta = apply_scope_filters(devices, ir)
-
-    def _with_scope(result: RetrievalResult) -> RetrievalResult:
-        return _attach_meta(result, scope_meta)
+    vector_searcher = context.vector_searcher
+    filtered_devices, scope_meta = context.scope.filter(ir)
 
     if not ir.name_hint:
         inferred = _infer_name_hint(ir.raw, filtered_devices)
@@ -481,7 +451,11 @@ def _retrieve_with_ir(
             mapped_category = inferred_category
     apply_gating = bool(mapped_category and mapped_category != "Unknown")
     if apply_gating:
-        gated_devices = filter_by_category(filtered_devices, mapped_category)
+        gated_devices = filter_by_category(
+            filtered_devices,
+            mapped_category,
+            category_keys=context.category_keys,
+        )
     else:
         gated_devices = filtered_devices
 
@@ -497,21 +471,294 @@ def _retrieve_with_ir(
         len(gated_devices),
     )
 
-    if _can_bulk_retrieve(ir, vector_searcher):
-        active_spec_index = spec_index
-        if not isinstance(active_spec_index, dict) or not active_spec_index:
-            active_spec_index = getattr(vector_searcher, "spec_index", {})
-        if not isinstance(active_spec_index, dict) or not active_spec_index:
-            active_spec_index = {}
+    prepared = _PreparedCommand(
+        filtered_devices=filtered_devices,
+        scope_meta=scope_meta,
+        mapped_category=mapped_category,
+        apply_gating=apply_gating,
+        gated_devices=gated_devices,
+        bulk=_can_bulk_retrieve(ir, vector_searcher),
+    )
+    if vector_searcher is None:
+        return prepared
+
+    prepared.device_ids = {d.id for d in gated_devices}
+    if prepared.bulk:
+        # 无设备时 build_capability_options 直接返回，不需要检索
+        if gated_devices:
+            search_text = _vector_search_text(ir)
+            if (
+                _is_explicit_device_name(ir.name_hint, gated_devices)
+                and ir.name_hint not in search_text
+            ):
+                search_text = f"{ir.name_hint} {search_text}"
+            prepared.search_text = search_text
+            prepared.search_k = DEFAULT_OPTIONS_SEARCH_K
+    else:
+        prepared.search_text = _vector_search_text(ir)
+        prepared.search_k = vector_top_k or _vector_search_k(top_k, fusion)
+    return prepared
+
+
+@dataclass
+class _SpeculativeSearch:
+    """LLM 解析期间以原始文本发起的向量检索结果（未做设备过滤）。"""
+
+    query: str
+    top_k: int
+    candidates: list[Candidate]
+
+    def take(self, item: _PreparedCommand) -> list[Candidate] | None:
+        """命令的检索文本与原始文本一致且结果充足时复用，否则返回 None。
+
+        检索器 exact_filtering 时，未过滤结果中属于设备子集的候选恰是子集内检索结果的前缀；
+        不足 search_k 条且未过滤结果没有取尽时无法确认完整，需重新检索。
+        """
+        if item.search_text != self.query:
+            return None
+        candidates = self.candidates
+        if item.device_ids:
+            candidates = [c for c in candidates if c.entity_id in item.device_ids]
+        exhausted = len(self.candidates) < self.top_k
+        if len(candidates) < item.search_k and not exhausted:
+            return None
+        return candidates[: item.search_k]
+
+
+def _can_speculate(vector_searcher: VectorSearcher | None) -> bool:
+    """检索器的过滤检索可由无过滤结果截取时，推测检索结果才可复用。"""
+    if vector_searcher is None:
+        return False
+    if not vector_searcher.exact_filtering:
+        logger.info("speculative_vector disabled reason=inexact_filtering")
+        return False
+    return True
+
+
+def _speculative_search_k(
+    top_k: int,
+    fusion: FusionMode,
+    vector_top_k: int | None,
+) -> int:
+    """推测检索的召回数量。"""
+    return SPECULATIVE_VECTOR_SEARCH_MULTIPLIER * (
+        vector_top_k or _vector_search_k(top_k, fusion)
+    )
+
+
+def _prefetch_vector_candidates(
+    prepared: list[_PreparedCommand],
+    vector_searcher: VectorSearcher | None,
+    speculation: _SpeculativeSearch | None = None,
+) -> list[list[Candidate] | None]:
+    """合并所有命令的向量检索请求，一次 search_many 完成编码与打分。
+
+    各命令按最大的 top_k 检索后再截断；top-k 结果与单独检索一致。
+    可复用推测检索结果的命令不再重复检索。
+    """
+    prefetched = _take_speculation(prepared, speculation)
+    requests = _vector_requests(prepared, prefetched)
+    if vector_searcher is None or not requests:
+        return prefetched
+
+    batch = vector_searcher.search_many(
+        [item.search_text for _, item in requests],
+        top_k=max(item.search_k for _, item in requests),
+        device_ids_per_query=[item.device_ids for _, item in requests],
+    )
+    _distribute_prefetched(prefetched, requests, batch)
+    return prefetched
+
+
+async def _aprefetch_vector_candidates(
+    prepared: list[_PreparedCommand],
+    vector_searcher: VectorSearcher | None,
+    speculation: _SpeculativeSearch | None = None,
+) -> list[list[Candidate] | None]:
+    """_prefetch_vector_candidates 的异步版本，等待 asearch_many。"""
+    prefetched = _take_speculation(prepared, speculation)
+    requests = _vector_requests(prepared, prefetched)
+    if vector_searcher is None or not requests:
+        return prefetched
+
+    batch = await vector_searcher.asearch_many(
+        [item.search_text for _, item in requests],
+        top_k=max(item.search_k for _, item in requests),
+        device_ids_per_query=[item.device_ids for _, item in requests],
+    )
+    _distribute_prefetched(prefetched, requests, batch)
+    return prefetched
+
+
+def _take_speculation(
+    prepared: list[_PreparedCommand],
+    speculation: _SpeculativeSearch | None,
+) -> list[list[Candidate] | None]:
+    """按命令位置取出可复用的推测检索结果。"""
+    prefetched: list[list[Candidate] | None] = [None] * len(prepared)
+    if speculation is None:
+        return prefetched
+    for position, item in enumerate(prepared):
+        prefetched[position] = speculation.take(item)
+    reused = sum(candidates is not None for candidates in prefetched)
+    logger.info(
+        "speculative_vector reused=%s commands=%s",
+        reused,
+        sum(item.search_text is not None for item in prepared),
+    )
+    return prefetched
+
+
+def _vector_requests(
+    prepared: list[_PreparedCommand],
+    prefetched: list[list[Candidate] | None],
+) -> list[tuple[int, _PreparedCommand]]:
+    """筛选仍需要向量检索的命令及其位置。"""
+    return [
+        (position, item)
+        for position, item in enumerate(prepared)
+        if item.search_text is not None and prefetched[position] is None
+    ]
+
+
+def _distribute_prefetched(
+    prefetched: list[list[Candidate] | None],
+    requests: list[tuple[int, _PreparedCommand]],
+    batch: list[list[Candidate]],
+) -> None:
+    """将合并检索的结果按命令位置截断到各自的 search_k。"""
+    for (position, item), candidates in zip(requests, batch):
+        prefetched[position] = candidates[: item.search_k]
+
+
+def _speculative_search(
+    text: str,
+    vector_searcher: VectorSearcher,
+    top_k: int,
+) -> _SpeculativeSearch | None:
+    """以原始文本执行不带设备过滤的向量检索；失败时返回 None，不影响主流程。"""
+    query = text.strip()
+    if not query:
+        return None
+    try:
+        candidates = vector_searcher.search(query, top_k=top_k)
+    except Exception as exc:  # pragma: no cover - 推测失败时退回正常检索
+        logger.warning("speculative_vector_failed error=%s", exc)
+        return None
+    return _SpeculativeSearch(query=query, top_k=top_k, candidates=candidates)
+
+
+async def _aspeculative_search(
+    text: str,
+    vector_searcher: VectorSearcher,
+    top_k: int,
+) -> _SpeculativeSearch | None:
+    """_speculative_search 的异步版本。"""
+    query = text.strip()
+    if not query:
+        return None
+    try:
+        candidates = await vector_searcher.asearch(query, top_k=top_k)
+    except Exception as exc:  # pragma: no cover - 推测失败时退回正常检索
+        logger.warning("speculative_vector_failed error=%s", exc)
+        return None
+    return _SpeculativeSearch(query=query, top_k=top_k, candidates=candidates)
+
+
+def _generate_command_output(text: str, llm: LLMClient) -> str:
+    """调用 LLM 生成命令解析输出文本。"""
+    try:
+        return llm.generate_with_prompt(text, DEFAULT_SYSTEM_PROMPT)
+    except Exception as exc:  # pragma: no cover - 保护主流程
+        logger.warning("command_output_failed error=%s", exc)
+        return "[]"
+
+
+async def _agenerate_command_output(text: str, llm: LLMClient) -> str:
+    """异步调用 LLM 生成命令解析输出文本。
+
+    优先 await 客户端的 agenerate_with_prompt，未实现时在线程中调用同步接口。
+    """
+    try:
+        agenerate = getattr(llm, "agenerate_with_prompt", None)
+        if callable(agenerate):
+            return await agenerate(text, DEFAULT_SYSTEM_PROMPT)
+        return await asyncio.to_thread(
+            llm.generate_with_prompt, text, DEFAULT_SYSTEM_PROMPT
+        )
+    except Exception as exc:  # pragma: no cover - 保护主流程
+        logger.warning("command_output_failed error=%s", exc)
+        return "[]"
+
+
+def _stream_command_output(text: str, llm: LLMClient) -> Iterator[str]:
+    """流式调用 LLM 逐段返回输出；客户端不支持流式时一次性返回完整输出。"""
+    stream = getattr(llm, "stream_with_prompt", None)
+    if not callable(stream):
+        yield _generate_command_output(text, llm)
+        return
+    try:
+        yield from stream(text, DEFAULT_SYSTEM_PROMPT)
+    except Exception as exc:  # pragma: no cover - 保护主流程，已接收的输出交给解析器
+        logger.warning("command_stream_failed error=%s", exc)
+
+
+async def _astream_command_output(text: str, llm: LLMClient) -> AsyncIterator[str]:
+    """_stream_command_output 的异步版本，优先使用 astream_with_prompt。"""
+    astream = getattr(llm, "astream_with_prompt", None)
+    if not callable(astream):
+        yield await _agenerate_command_output(text, llm)
+        return
+    try:
+        async for chunk in astream(text, DEFAULT_SYSTEM_PROMPT):
+            yield chunk
+    except Exception as exc:  # pragma: no cover - 保护主流程，已接收的输出交给解析器
+        logger.warning("command_stream_failed error=%s", exc)
+
+
+def _retrieve_with_ir(
+    ir,
+    context: HomeContext,
+    llm: LLMClient,
+    top_k: int = 5,
+    prepared: _PreparedCommand | None = None,
+    vector_candidates: list[Candidate] | None = None,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+) -> RetrievalResult:
+    """执行单条 QueryIR 的检索。
+
+    Pipeline 流程：
+    1. Scope 预过滤与类别门控（可由调用方预先完成）
+    2. Keyword 召回
+    3. Vector 召回（可选，可由调用方批量预取）
+    4. 融合评分
+    5. Top-K 筛选
+
+    不读写会话状态，多条命令可以并发检索；状态由调用方按命令顺序更新。
+    """
+    vector_searcher = context.vector_searcher
+    spec_lookup = context.spec_lookup
+    device_by_id = context.device_by_id
+
+    # 1. Scope 预过滤与类别门控
+    if prepared is None:
+        prepared = _prepare_command(ir, context, top_k, fusion, vector_top_k)
+    gated_devices = prepared.gated_devices
+    apply_gating = prepared.apply_gating
+
+    def _with_scope(result: RetrievalResult) -> RetrievalResult:
+        return _attach_meta(result, prepared.scope_meta)
+
+    if prepared.bulk:
+        active_spec_index = context.spec_index or {}
 
-        search_text = _vector_search_text(ir)
-        if _is_explicit_device_name(ir.name_hint, gated_devices) and ir.name_hint not in search_text:
-            search_text = f"{ir.name_hint} {search_text}"
         options, confidence = build_capability_options(
-            query_text=search_text,
+            query_text=prepared.search_text or "",
             devices=gated_devices,
             vector_searcher=vector_searcher,
             spec_index=active_spec_index,
+            candidates=vector_candidates,
         )
         top1_ratio = float(confidence.get("top1_ratio", 0.0))
         margin = float(confidence.get("margin", 0.0))
@@ -675,94 +922,67 @@ def _retrieve_with_ir(
         w_keyword = FALLBACK_KEYWORD_WEIGHT
         w_vector = FALLBACK_VECTOR_WEIGHT
 
-    # 3. Keyword 召回
-    searcher = KeywordSearcher(gated_devices)
-    keyword_candidates = searcher.search(ir)
+    # 3. Keyword 召回：复用按设备列表构建的索引，门控结果作为设备子集掩码
+    keyword_candidates = context.keyword_searcher.search(
+        ir,
+        device_ids={d.id for d in gated_devices},
+    )
 
     # 4. Vector 召回（可选）
-    vector_candidates = []
-    if vector_searcher:
-        device_ids = {d.id for d in gated_devices}
-        search_text = _vector_search_text(ir)
-        vector_candidates = vector_searcher.search(
-            search_text,
-            top_k=max(top_k * 10, 50),
-            device_ids=device_ids,
-        )
+    if vector_candidates is None:
+        vector_candidates = []
+        if vector_searcher and prepared.search_text is not None:
+            vector_candidates = vector_searcher.search(
+                prepared.search_text,
+                top_k=prepared.search_k,
+                device_ids=prepared.device_ids,
+            )
 
-    # 5. 融合评分
-    merged = merge_and_score(
+    # 5. 融合评分：列式批次上完成融合与房间加分，按设备去重时只物化入选的候选
+    batch = merge_candidates(
         keyword_candidates,
         vector_candidates=vector_candidates,
         w_keyword=w_keyword,
         w_vector=w_vector,
+        fusion=fusion,
+        rrf_k=DEFAULT_RRF_K,
     )
-    merged = apply_room_bonus(
-        merged,
-        {d.id: d for d in filtered_devices},
-        ir.scope_include,
-    )
+    # 候选均来自门控后的设备子集，按全量设备索引查房间即可
+    batch.add_room_bonus(device_by_id, ir.scope_include)
 
-    active_spec_lookup = spec_lookup
-    active_device_by_id = device_by_id
-    if vector_searcher and active_spec_lookup is None:
-        active_spec_index = spec_index
-        if not isinstance(active_spec_index, dict) or not active_spec_index:
-            active_spec_index = getattr(vector_searcher, "spec_index", None)
-        if isinstance(active_spec_index, dict) and active_spec_index:
-            active_spec_lookup = build_spec_lookup(active_spec_index)
-    if vector_searcher and active_spec_lookup:
-        if active_device_by_id is None:
-            active_device_by_id = {device.id: device for device in devices}
-        merged = _fill_missing_capability_ids(
-            merged,
-            query=ir.raw,
-            device_by_id=active_device_by_id,
-            spec_lookup=active_spec_lookup,
-        )
-        merged = [
-            candidate
-            for candidate in merged
-            if _is_supported_candidate(
+    accept = None
+    if vector_searcher and spec_lookup:
+
+        def accept(candidate: Candidate) -> Candidate | None:
+            candidate = _fill_capability_id(
                 candidate,
-                active_device_by_id,
-                active_spec_lookup,
+                query=ir.raw,
+                device_by_id=device_by_id,
+                spec_lookup=spec_lookup,
             )
-        ]
+            if not _is_supported_candidate(candidate, device_by_id, spec_lookup):
+                return None
+            return candidate
 
-    merged = _dedupe_device_candidates(merged)
-    if (
-        active_spec_lookup
-        and active_device_by_id
-        and _should_force_capability_guess(ir.raw)
-    ):
+    merged = batch.select_devices(max(top_k, _TOP_PREVIEW_SIZE), accept=accept)
+    if vector_searcher and spec_lookup and _should_force_capability_guess(ir.raw):
         merged = _apply_capability_guess(
             merged,
             query=ir.raw,
-            device_by_id=active_device_by_id,
-            spec_lookup=active_spec_lookup,
+            device_by_id=device_by_id,
+            spec_lookup=spec_lookup,
         )
-    merged.sort(key=lambda c: c.total_score, reverse=True)
 
     if merged:
         top_preview = [
             f"{cand.entity_id}:{cand.capability_id}:{cand.total_score:.3f}"
-            for cand in merged[:5]
+            for cand in merged[:_TOP_PREVIEW_SIZE]
         ]
         logger.info("top_candidates=%s", ",".join(top_preview))
 
     # 6. Top-K 筛选
     selection = select_top(merged, top_k=top_k)
 
-    # 7. 更新会话状态
-    if selection.candidates:
-        top_candidate = selection.candidates[0]
-        # 找到对应设备并更新状态
-        for device in devices:
-            if device.id == top_candidate.entity_id:
-                state.update_mentioned(device)
-                break
-
     return _with_scope(
         RetrievalResult(
             candidates=selection.candidates,
@@ -771,6 +991,194 @@ def _retrieve_with_ir(
     )
 
 
+def _finish_command(
+    command: ParsedCommand,
+    ir: QueryIR,
+    item: _PreparedCommand,
+    result: RetrievalResult,
+    context: HomeContext,
+    state: ConversationState,
+    parser_errors: list[str],
+    parser_degraded: bool,
+) -> RetrievalResult:
+    """附加单条命令的命令与解析器元信息，并按检索结果更新会话状态。"""
+    if not item.bulk and result.candidates:
+        device = context.device_by_id.get(result.candidates[0].entity_id)
+        if device is not None:
+            state.update_mentioned(device)
+    result.meta.setdefault("command", _command_meta(command, ir))
+    if parser_errors:
+        result.meta.setdefault("parser_errors", list(parser_errors))
+    if parser_degraded:
+        result.meta.setdefault("parser_degraded", parser_degraded)
+    return result
+
+
+@dataclass
+class _CommandPlan:
+    """一次请求解析出的命令、QueryIR 与预处理结果。"""
+
+    parsed: ParseResult
+    irs: list[QueryIR]
+    prepared: list[_PreparedCommand]
+
+    def finish(
+        self,
+        results: list[RetrievalResult],
+        context: HomeContext,
+        state: ConversationState,
+    ) -> list[RetrievalResult]:
+        """按命令顺序附加命令与解析器元信息，并更新会话状态。
+
+        命令可能并发检索，状态更新统一在这里按命令顺序执行，结果与串行检索一致。
+        """
+        parsed = self.parsed
+        for command, ir, item, result in zip(
+            parsed.commands, self.irs, self.prepared, results
+        ):
+            _finish_command(
+                command, ir, item, result, context, state, parsed.errors, parsed.degraded
+            )
+        return results
+
+    def command_calls(
+        self,
+        context: HomeContext,
+        llm: LLMClient,
+        top_k: int,
+        prefetched: list[list[Candidate] | None],
+        fusion: FusionMode,
+    ) -> list[functools.partial[RetrievalResult]]:
+        """为每条命令构造可独立执行的检索调用。"""
+        return [
+            functools.partial(
+                _retrieve_with_ir,
+                ir,
+                context=context,
+                llm=llm,
+                top_k=top_k,
+                prepared=item,
+                vector_candidates=vector_candidates,
+                fusion=fusion,
+            )
+            for ir, item, vector_candidates in zip(self.irs, self.prepared, prefetched)
+        ]
+
+@dataclass
+class _StreamedCommand:
+    """流式解析出的单条命令、QueryIR 与预处理结果。
+
+    parser_errors / parser_degraded 是该命令解析完成时已知的解析器状态。
+    """
+
+    command: ParsedCommand
+    ir: QueryIR
+    prepared: _PreparedCommand
+    parser_errors: list[str]
+    parser_degraded: bool
+
+    def call(
+        self,
+        context: HomeContext,
+        llm: LLMClient,
+        top_k: int,
+        fusion: FusionMode,
+        vector_candidates: list[Candidate] | None = None,
+    ) -> functools.partial[RetrievalResult]:
+        """构造该命令可独立执行的检索调用。"""
+        return functools.partial(
+            _retrieve_with_ir,
+            self.ir,
+            context=context,
+            llm=llm,
+            top_k=top_k,
+            prepared=self.prepared,
+            vector_candidates=vector_candidates,
+            fusion=fusion,
+        )
+
+    def finish(
+        self,
+        result: RetrievalResult,
+        context: HomeContext,
+        state: ConversationState,
+    ) -> RetrievalResult:
+        """附加元信息并更新会话状态。"""
+        return _finish_command(
+            self.command,
+            self.ir,
+            self.prepared,
+            result,
+            context,
+            state,
+            self.parser_errors,
+            self.parser_degraded,
+        )
+
+
+def _stream_command(
+    text: str,
+    command: ParsedCommand,
+    context: HomeContext,
+    top_k: int,
+    fusion: FusionMode,
+    vector_top_k: int | None,
+    parser_errors: list[str],
+    parser_degraded: bool,
+) -> _StreamedCommand:
+    """编译并预处理一条流式解析出的命令。"""
+    ir = compile_ir(command, raw_text=text)
+    return _StreamedCommand(
+        command=command,
+        ir=ir,
+        prepared=_prepare_command(ir, context, top_k, fusion, vector_top_k),
+        parser_errors=list(parser_errors),
+        parser_degraded=parser_degraded,
+    )
+
+
+def _remaining_commands(
+    parser: CommandStreamParser,
+    parsed: ParseResult,
+) -> list[ParsedCommand]:
+    """流结束后，完整解析结果中尚未在流式阶段产出的命令。
+
+    流式阶段没有产出命令时（如输出不是数组），返回完整解析结果（含 UNKNOWN 兜底）；
+    完整解析与已产出的命令不一致时（如输出被截断），已产出的命令不撤回，不再补充。
+    """
+    streamed = parser.commands
+    if parsed.commands[: len(streamed)] != streamed:
+        logger.warning(
+            "command_stream_mismatch streamed=%d parsed=%d errors=%s",
+            len(streamed),
+            len(parsed.commands),
+            ",".join(parsed.errors),
+        )
+        return []
+    return parsed.commands[len(streamed) :]
+
+
+def _plan_commands(
+    text: str,
+    raw_output: str,
+    context: HomeContext,
+    top_k: int,
+    fusion: FusionMode,
+    vector_top_k: int | None,
+) -> _CommandPlan:
+    """解析 LLM 输出，并对所有命令完成与会话状态无关的预处理。"""
+    parsed = parse_command_output(
+        raw_output,
+        config=CommandParserConfig(),
+    )
+    irs = [compile_ir(command, raw_text=text) for command in parsed.commands]
+    prepared = [
+        _prepare_command(ir, context, top_k, fusion, vector_top_k)
+        for ir in irs
+    ]
+    return _CommandPlan(parsed=parsed, irs=irs, prepared=prepared)
+
+
 def retrieve(
     text: str,
     devices: list[Device],
@@ -778,46 +1186,336 @@ def retrieve(
     state: ConversationState,
     top_k: int = 5,
     vector_searcher: VectorSearcher | None = None,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+    speculative: bool = False,
 ) -> list[RetrievalResult]:
-    """执行上下文检索（多命令），按命令顺序返回结果列表。"""
-    raw_output = _generate_command_output(text, llm)
-    parsed = parse_command_output(
-        raw_output,
-        config=CommandParserConfig(),
+    """执行上下文检索（多命令），按命令顺序返回结果列表。
+
+    每次调用都会为设备列表构建 HomeContext；同一家庭多次检索时，
+    使用 retrieve_with_context 复用预计算的上下文。
+
+    Args:
+        text: 用户输入
+        devices: 设备列表
+        llm: 命令解析使用的 LLM
+        state: 会话状态
+        top_k: 每条命令返回的候选数量
+        vector_searcher: 可选的向量检索器
+        fusion: 关键词与向量结果的融合方式，linear 或 rrf
+        vector_top_k: 非 bulk 命令的向量召回数量，None 时按融合方式取默认值
+        speculative: 是否在 LLM 解析期间以原始文本推测执行向量检索，
+            命令的检索文本回退为原始文本时复用其结果（仅限 exact_filtering 的检索器）
+
+    Returns:
+        按命令顺序排列的检索结果
+    """
+    return retrieve_with_context(
+        text=text,
+        context=HomeContext.build(devices, vector_searcher),
+        llm=llm,
+        state=state,
+        top_k=top_k,
+        fusion=fusion,
+        vector_top_k=vector_top_k,
+        speculative=speculative,
     )
 
-    spec_index: dict | None = None
-    spec_lookup: dict | None = None
-    device_by_id: dict[str, Device] | None = None
-    if vector_searcher:
-        vector_searcher.index(devices)
-        spec_index = getattr(vector_searcher, "spec_index", None)
-        if isinstance(spec_index, dict) and spec_index:
-            spec_lookup = build_spec_lookup(spec_index)
-            device_by_id = {device.id: device for device in devices}
-
-    results: list[RetrievalResult] = []
-    for command in parsed.commands:
-        ir = compile_ir(command, raw_text=text)
-        result = _retrieve_with_ir(
-            ir,
-            devices=devices,
-            llm=llm,
-            state=state,
-            top_k=top_k,
-            vector_searcher=vector_searcher,
-            spec_index=spec_index,
-            spec_lookup=spec_lookup,
-            device_by_id=device_by_id,
+
+def retrieve_with_context(
+    text: str,
+    context: HomeContext,
+    llm: LLMClient,
+    state: ConversationState,
+    top_k: int = 5,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+    speculative: bool = False,
+) -> list[RetrievalResult]:
+    """基于预计算的 HomeContext 执行上下文检索，按命令顺序返回结果列表。
+
+    所有命令的向量检索合并为一次请求；多条命令的其余检索（关键词召回、融合、
+    bulk 命令的 LLM 仲裁）在线程池中并发执行。会话状态在全部命令检索完成后按命令顺序更新。
+
+    Args:
+        text: 用户输入
+        context: 家庭检索上下文（见 HomeContext.build / get_home_context）
+        llm: 命令解析使用的 LLM
+        state: 会话状态
+        top_k: 每条命令返回的候选数量
+        fusion: 关键词与向量结果的融合方式，linear 或 rrf
+        vector_top_k: 非 bulk 命令的向量召回数量，None 时按融合方式取默认值
+        speculative: 是否在 LLM 解析期间以原始文本推测执行向量检索，
+            命令的检索文本回退为原始文本时复用其结果（仅限 exact_filtering 的检索器）
+
+    Returns:
+        按命令顺序排列的检索结果
+    """
+    context.sync_vector_index()
+    vector_searcher = context.vector_searcher
+    speculation: _SpeculativeSearch | None = None
+    if speculative and _can_speculate(vector_searcher):
+        # 推测检索在后台线程执行，与 LLM 解析的网络往返重叠
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                _speculative_search,
+                text,
+                vector_searcher,
+                _speculative_search_k(top_k, fusion, vector_top_k),
+            )
+            raw_output = _generate_command_output(text, llm)
+            speculation = future.result()
+    else:
+        raw_output = _generate_command_output(text, llm)
+    plan = _plan_commands(text, raw_output, context, top_k, fusion, vector_top_k)
+    # 多命令的向量检索合并为一次 embedding 请求
+    prefetched = _prefetch_vector_candidates(plan.prepared, vector_searcher, speculation)
+    calls = plan.command_calls(context, llm, top_k, prefetched, fusion)
+
+    if len(calls) < 2:
+        return plan.finish([call() for call in calls], context, state)
+
+    # 各命令互不依赖，提交到线程池并发检索，按命令顺序收集结果
+    with ThreadPoolExecutor(max_workers=min(MAX_COMMAND_WORKERS, len(calls))) as executor:
+        futures = [executor.submit(call) for call in calls]
+        results = [future.result() for future in futures]
+
+    return plan.finish(results, context, state)
+
+
+async def aretrieve(
+    text: str,
+    devices: list[Device],
+    llm: LLMClient,
+    state: ConversationState,
+    top_k: int = 5,
+    vector_searcher: VectorSearcher | None = None,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+    speculative: bool = False,
+) -> list[RetrievalResult]:
+    """retrieve 的异步版本，参数与返回值相同。
+
+    构建 HomeContext（可能需要为设备编码向量）在线程中执行；
+    同一家庭多次检索时，使用 aretrieve_with_context 复用上下文。
+    """
+    context = await asyncio.to_thread(HomeContext.build, devices, vector_searcher)
+    return await aretrieve_with_context(
+        text=text,
+        context=context,
+        llm=llm,
+        state=state,
+        top_k=top_k,
+        fusion=fusion,
+        vector_top_k=vector_top_k,
+        speculative=speculative,
+    )
+
+
+async def aretrieve_with_context(
+    text: str,
+    context: HomeContext,
+    llm: LLMClient,
+    state: ConversationState,
+    top_k: int = 5,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+    speculative: bool = False,
+) -> list[RetrievalResult]:
+    """retrieve_with_context 的异步版本，参数与返回值相同。
+
+    LLM 解析与查询编码通过客户端的异步接口等待，不占用线程；
+    命令预处理与各命令的检索（门控、关键词召回、融合与同步的 LLM 仲裁）在线程中执行，
+    不阻塞事件循环，多条命令并发检索。
+    """
+    if context.vector_index_stale:
+        await asyncio.to_thread(context.sync_vector_index)
+    vector_searcher = context.vector_searcher
+    speculation: _SpeculativeSearch | None = None
+    if speculative and _can_speculate(vector_searcher):
+        speculative_task = asyncio.create_task(
+            _aspeculative_search(
+                text,
+                vector_searcher,
+                _speculative_search_k(top_k, fusion, vector_top_k),
+            )
+        )
+        raw_output = await _agenerate_command_output(text, llm)
+        speculation = await speculative_task
+    else:
+        raw_output = await _agenerate_command_output(text, llm)
+    plan = await asyncio.to_thread(
+        _plan_commands, text, raw_output, context, top_k, fusion, vector_top_k
+    )
+    prefetched = await _aprefetch_vector_candidates(plan.prepared, vector_searcher, speculation)
+    calls = plan.command_calls(context, llm, top_k, prefetched, fusion)
+
+    results = await asyncio.gather(*(asyncio.to_thread(call) for call in calls))
+    return plan.finish(list(results), context, state)
+
+
+def stream_retrieve_with_context(
+    text: str,
+    context: HomeContext,
+    llm: LLMClient,
+    state: ConversationState,
+    top_k: int = 5,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+) -> Iterator[RetrievalResult]:
+    """流式检索：边接收 LLM 输出边解析，按命令顺序逐条产出检索结果。
+
+    LLM 输出在后台线程接收，每个命令对象闭合后立即提交到线程池检索，
+    与 LLM 生成后续命令重叠执行；首条结果的等待时间约为首个命令对象的生成时间加一次检索。
+    LLM 未实现 stream_with_prompt 时退化为一次性生成。
+
+    与 retrieve_with_context 的差异：各命令分别发起向量检索（无法合并为一次请求）；
+    结果的 parser_errors 只包含该命令及之前命令的解析错误；
+    输出在已产出命令之后被截断或出错时，已产出的结果保留，不再退化为 UNKNOWN。
+
+    Args:
+        text: 用户输入
+        context: 家庭检索上下文（见 HomeContext.build / get_home_context）
+        llm: 命令解析使用的 LLM
+        state: 会话状态（每产出一条结果即按该结果更新）
+        top_k: 每条命令返回的候选数量
+        fusion: 关键词与向量结果的融合方式，linear 或 rrf
+        vector_top_k: 非 bulk 命令的向量召回数量，None 时按融合方式取默认值
+
+    Yields:
+        按命令顺序排列的检索结果
+    """
+    context.sync_vector_index()
+    submitted: queue.SimpleQueue[
+        tuple[_StreamedCommand, Future[RetrievalResult]] | None
+    ] = queue.SimpleQueue()
+    stopped = threading.Event()
+    # 额外一个线程用于接收 LLM 输出
+    executor = ThreadPoolExecutor(max_workers=MAX_COMMAND_WORKERS + 1)
+
+    def submit(command: ParsedCommand, errors: list[str], degraded: bool) -> None:
+        streamed = _stream_command(
+            text, command, context, top_k, fusion, vector_top_k, errors, degraded
         )
-        result.meta.setdefault("command", _command_meta(command, ir))
-        if parsed.errors:
-            result.meta.setdefault("parser_errors", list(parsed.errors))
-        if parsed.degraded:
-            result.meta.setdefault("parser_degraded", parsed.degraded)
-        results.append(result)
+        call = streamed.call(context, llm, top_k, fusion)
+        submitted.put((streamed, executor.submit(call)))
+
+    def receive() -> None:
+        try:
+            parser = CommandStreamParser(config=CommandParserConfig())
+            for chunk in _stream_command_output(text, llm):
+                if stopped.is_set():
+                    return
+                for command in parser.feed(chunk):
+                    submit(command, parser.errors, parser.degraded)
+            parsed = parser.close()
+            for command in _remaining_commands(parser, parsed):
+                submit(command, parsed.errors, parsed.degraded)
+        finally:
+            submitted.put(None)
 
-    return results
+    try:
+        receiver = executor.submit(receive)
+        while (item := submitted.get()) is not None:
+            streamed, future = item
+            yield streamed.finish(future.result(), context, state)
+        receiver.result()
+    finally:
+        # 调用方提前停止迭代时，不等待 LLM 输出接收完毕，也不再执行排队中的检索
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _aretrieve_streamed(
+    text: str,
+    command: ParsedCommand,
+    context: HomeContext,
+    llm: LLMClient,
+    top_k: int,
+    fusion: FusionMode,
+    vector_top_k: int | None,
+    parser_errors: list[str],
+    parser_degraded: bool,
+) -> tuple[_StreamedCommand, RetrievalResult]:
+    """异步检索一条流式命令：await 向量检索，预处理与其余检索在线程中执行。"""
+    streamed = await asyncio.to_thread(
+        _stream_command,
+        text,
+        command,
+        context,
+        top_k,
+        fusion,
+        vector_top_k,
+        parser_errors,
+        parser_degraded,
+    )
+    prefetched = await _aprefetch_vector_candidates(
+        [streamed.prepared], context.vector_searcher
+    )
+    call = streamed.call(context, llm, top_k, fusion, prefetched[0])
+    return streamed, await asyncio.to_thread(call)
+
+
+async def astream_retrieve_with_context(
+    text: str,
+    context: HomeContext,
+    llm: LLMClient,
+    state: ConversationState,
+    top_k: int = 5,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+) -> AsyncIterator[RetrievalResult]:
+    """stream_retrieve_with_context 的异步版本，参数与产出相同。
+
+    优先使用 LLM 的 astream_with_prompt；接收 LLM 输出与每条命令的检索均作为任务并发执行。
+    """
+    if context.vector_index_stale:
+        await asyncio.to_thread(context.sync_vector_index)
+    submitted: asyncio.Queue[
+        asyncio.Task[tuple[_StreamedCommand, RetrievalResult]] | None
+    ] = asyncio.Queue()
+    tasks: list[asyncio.Task] = []
+
+    def submit(command: ParsedCommand, errors: list[str], degraded: bool) -> None:
+        task = asyncio.create_task(
+            _aretrieve_streamed(
+                text,
+                command,
+                context,
+                llm,
+                top_k,
+                fusion,
+                vector_top_k,
+                list(errors),
+                degraded,
+            )
+        )
+        tasks.append(task)
+        submitted.put_nowait(task)
+
+    async def receive() -> None:
+        try:
+            parser = CommandStreamParser(config=CommandParserConfig())
+            async for chunk in _astream_command_output(text, llm):
+                for command in parser.feed(chunk):
+                    submit(command, parser.errors, parser.degraded)
+            parsed = parser.close()
+            for command in _remaining_commands(parser, parsed):
+                submit(command, parsed.errors, parsed.degraded)
+        finally:
+            submitted.put_nowait(None)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while (task := await submitted.get()) is not None:
+            streamed, result = await task
+            yield streamed.finish(result, context, state)
+        await receiver
+    finally:
+        # 调用方提前停止迭代时取消仍在进行的接收与检索
+        receiver.cancel()
+        for task in tasks:
+            task.cancel()
 
 
 def retrieve_single(
@@ -827,6 +1525,9 @@ def retrieve_single(
     state: ConversationState,
     top_k: int = 5,
     vector_searcher: VectorSearcher | None = None,
+    fusion: FusionMode = "linear",
+    vector_top_k: int | None = None,
+    speculative: bool = False,
 ) -> RetrievalResult:
     """执行单命令检索（兼容入口），返回首条结果。"""
     results = retrieve(
@@ -836,6 +1537,9 @@ def retrieve_single(
         state=state,
         top_k=top_k,
         vector_searcher=vector_searcher,
+        fusion=fusion,
+        vector_top_k=vector_top_k,
+        speculative=speculative,
     )
 
     if not results:
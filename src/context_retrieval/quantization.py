@@ -0,0 +1,106 @@
+"""向量量化存储。
+
+支持 float16 与按行缩放的 int8 两种压缩格式，用于降低向量索引的常驻内存。
+"""
+
+from typing import Literal
+
+import numpy as np
+from numpy.typing import NDArray
+
+StorageMode = Literal["float32", "float16", "int8"]
+STORAGE_MODES: tuple[str, ...] = ("float32", "float16", "int8")
+
+_INT8_MAX = 127.0
+_DOT_BLOCK_ROWS = 4096
+
+
+class QuantizedMatrix:
+    """量化后的向量矩阵。
+
+    - float16：直接以半精度存储
+    - int8：每行独立缩放，codes * scales 还原为近似 float32
+    """
+
+    def __init__(
+        self,
+        codes: NDArray,
+        scales: NDArray[np.float32] | None = None,
+    ):
+        """初始化。
+
+        Args:
+            codes: 量化后的矩阵（float16 或 int8）
+            scales: int8 模式下每行的缩放系数
+        """
+        if codes.dtype == np.int8 and scales is None:
+            raise ValueError("int8 量化矩阵需要提供每行缩放系数")
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_float(cls, matrix: NDArray[np.float32], mode: StorageMode) -> "QuantizedMatrix":
+        """将 float32 矩阵量化为指定格式。"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if mode == "float16":
+            return cls(matrix.astype(np.float16))
+        if mode == "int8":
+            max_abs = np.abs(matrix).max(axis=1, initial=0.0)
+            scales = (max_abs / _INT8_MAX).astype(np.float32)
+            safe = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            codes = np.rint(matrix / safe[:, None]).astype(np.int8)
+            return cls(codes, scales)
+        raise ValueError(f"不支持的量化格式: {mode}")
+
+    @property
+    def mode(self) -> StorageMode:
+        """量化格式。"""
+        return "int8" if self.codes.dtype == np.int8 else "float16"
+
+    @property
+    def nbytes(self) -> int:
+        """占用字节数。"""
+        size = int(self.codes.nbytes)
+        if self.scales is not None:
+            size += int(self.scales.nbytes)
+        return size
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    def take(self, rows: list[int] | NDArray[np.intp]) -> "QuantizedMatrix":
+        """按行下标取子矩阵。"""
+        scales = self.scales[rows] if self.scales is not None else None
+        return QuantizedMatrix(self.codes[rows], scales)
+
+    def concat(self, other: "QuantizedMatrix") -> "QuantizedMatrix":
+        """按行拼接另一个同格式的量化矩阵。"""
+        if other.codes.dtype != self.codes.dtype:
+            raise ValueError("量化格式不一致，无法拼接")
+        scales = None
+        if self.scales is not None and other.scales is not None:
+            scales = np.concatenate([self.scales, other.scales])
+        return QuantizedMatrix(np.vstack([self.codes, other.codes]), scales)
+
+    def dot(self, query: NDArray[np.float32]) -> NDArray[np.float32]:
+        """计算每行与查询向量的内积。
+
+        query 可以是单个向量 (dim,) 或按列排列的多个查询 (dim, n)；
+        分块反量化，避免一次性生成完整的 float32 临时矩阵。
+        """
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty((len(self),) + query.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), _DOT_BLOCK_ROWS):
+            stop = start + _DOT_BLOCK_ROWS
+            block = self.codes[start:stop].astype(np.float32)
+            scores[start:stop] = block @ query
+        if self.scales is not None:
+            scores *= self.scales.reshape((-1,) + (1,) * (query.ndim - 1))
+        return scores
+
+    def to_float(self) -> NDArray[np.float32]:
+        """反量化为 float32 矩阵。"""
+        matrix = self.codes.astype(np.float32)
+        if self.scales is not None:
+            matrix *= self.scales[:, None]
+        return matrix
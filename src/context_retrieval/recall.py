@@ -0,0 +1,67 @@
+"""检索召回率评估。
+
+用于比较近似检索（量化存储、近似索引等）与精确检索的 top-k 结果重合度。
+"""
+
+from typing import Iterable
+
+from context_retrieval.models import Candidate
+from context_retrieval.vector_search import VectorSearcher
+
+
+def _candidate_key(candidate: Candidate) -> tuple[str, str | None]:
+    return (candidate.entity_id, candidate.capability_id)
+
+
+def recall_at_k(
+    reference: list[Candidate],
+    candidates: list[Candidate],
+    k: int,
+) -> float:
+    """计算 candidates 前 k 个对 reference 前 k 个的召回率。
+
+    Args:
+        reference: 精确检索结果（视为真值）
+        candidates: 待评估的检索结果
+        k: 截断位置
+
+    Returns:
+        召回率，reference 为空时返回 1.0
+    """
+    expected = {_candidate_key(c) for c in reference[:k]}
+    if not expected:
+        return 1.0
+    found = {_candidate_key(c) for c in candidates[:k]}
+    return len(expected & found) / len(expected)
+
+
+def compare_recall(
+    reference_searcher: VectorSearcher,
+    candidate_searcher: VectorSearcher,
+    queries: Iterable[str],
+    top_k: int = 10,
+    device_ids: set[str] | None = None,
+) -> float:
+    """在一组查询上计算平均 recall@k。
+
+    Args:
+        reference_searcher: 精确检索器
+        candidate_searcher: 待评估检索器
+        queries: 查询文本
+        top_k: 每次检索的候选数
+        device_ids: 可选设备集合过滤
+
+    Returns:
+        平均召回率，查询为空时返回 1.0
+    """
+    scores = [
+        recall_at_k(
+            reference_searcher.search(query, top_k=top_k, device_ids=device_ids),
+            candidate_searcher.search(query, top_k=top_k, device_ids=device_ids),
+            top_k,
+        )
+        for query in queries
+    ]
+    if not scores:
+        return 1.0
+    return sum(scores) / len(scores)
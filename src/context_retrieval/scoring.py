@@ -1,13 +1,297 @@
 """候选融合与统一评分模块。
 
 合并 Keyword 和 Vector 检索的结果，计算综合分数。
+大规模候选使用列式的 CandidateBatch 融合，只为最终入选的候选创建对象。
 """
 
+import heapq
 from dataclasses import replace
+from typing import Callable, Iterable, Literal, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
 
 from context_retrieval.models import Candidate, Device
 
 ROOM_MATCH_BONUS = 0.2
+DEFAULT_RRF_K = 60
+
+FusionMode = Literal["linear", "rrf"]
+
+T = TypeVar("T")
+
+
+def _total_score(candidate: Candidate) -> float:
+    return candidate.total_score
+
+
+def top_k_by(
+    items: Iterable[T],
+    k: int | None,
+    key: Callable[[T], float],
+) -> list[T]:
+    """按 key 降序选出前 k 个元素（稳定，同分保持原有顺序）。
+
+    k 远小于元素数时用堆做 O(n log k) 选择，结果与
+    sorted(items, key=key, reverse=True)[:k] 完全一致。
+
+    Args:
+        items: 待选元素
+        k: 保留数量，None 表示全部排序
+        key: 排序分数函数
+
+    Returns:
+        按分数降序排列的前 k 个元素
+    """
+    if k is None:
+        return sorted(items, key=key, reverse=True)
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, items, key=key)
+
+
+def top_k_candidates(candidates: Iterable[Candidate], k: int | None) -> list[Candidate]:
+    """按综合分数选出前 k 个候选。"""
+    return top_k_by(candidates, k, _total_score)
+
+
+class CandidateBatch:
+    """列式候选批次（struct-of-arrays）。
+
+    每行是一个 (实体, capability) 候选：实体、capability 与 reasons 列表
+    均以下标引用去重后的表，分数为 float64 数组。reasons 保持逐对象实现的插入顺序
+    （关键词 reasons、向量 reasons、房间加分），不同的 reasons 组合通常只有几种。
+    融合、房间加分与按设备去重都在数组上完成，只有最终入选的行才物化为 Candidate。
+    """
+
+    def __init__(self) -> None:
+        self.entity_ids: list[str] = []
+        self.entity_kinds: list[str] = []
+        self.capability_ids: list[str | None] = [None]
+        self.reason_lists: list[tuple[str, ...]] = []
+        self.entity_index = np.zeros(0, dtype=np.intp)
+        self.capability_index = np.zeros(0, dtype=np.intp)
+        self.reason_index = np.zeros(0, dtype=np.intp)
+        self.keyword_scores = np.zeros(0, dtype=np.float64)
+        self.vector_scores = np.zeros(0, dtype=np.float64)
+        self.total_scores = np.zeros(0, dtype=np.float64)
+        self._reason_lookup: dict[tuple[str, ...], int] = {}
+        self._merged_reasons: dict[tuple[tuple[str, ...], tuple[str, ...]], int] = {}
+
+    def __len__(self) -> int:
+        return self.total_scores.shape[0]
+
+    @classmethod
+    def merge(
+        cls,
+        keyword_candidates: list[Candidate],
+        vector_candidates: list[Candidate],
+        w_keyword: float = 1.0,
+        w_vector: float = 0.5,
+        fusion: FusionMode = "linear",
+        rrf_k: int = DEFAULT_RRF_K,
+    ) -> "CandidateBatch":
+        """合并 keyword 和 vector 检索结果，规则同 merge_and_score。
+
+        行顺序：先按向量候选顺序，再追加仅有关键词命中的实体。
+        """
+        if fusion not in ("linear", "rrf"):
+            raise ValueError(f"不支持的融合方式: {fusion}")
+        batch = cls()
+        keyword_map: dict[str, Candidate] = {c.entity_id: c for c in keyword_candidates}
+        vector_map: dict[tuple[str, str | None], Candidate] = {
+            (c.entity_id, c.capability_id): c for c in vector_candidates
+        }
+
+        entity_lookup: dict[str, int] = {}
+        capability_lookup: dict[str | None, int] = {None: 0}
+        entity_rows: list[int] = []
+        capability_rows: list[int] = []
+        keyword_scores: list[float] = []
+        vector_scores: list[float] = []
+        reason_rows: list[int] = []
+
+        def add_entity(entity_id: str, entity_kind: str) -> int:
+            index = entity_lookup.get(entity_id)
+            if index is None:
+                index = entity_lookup[entity_id] = len(batch.entity_ids)
+                batch.entity_ids.append(entity_id)
+                batch.entity_kinds.append(entity_kind)
+            return index
+
+        for (entity_id, capability_id), vec_cand in vector_map.items():
+            kw_cand = keyword_map.get(entity_id)
+            capability_row = capability_lookup.get(capability_id)
+            if capability_row is None:
+                capability_row = capability_lookup[capability_id] = len(batch.capability_ids)
+                batch.capability_ids.append(capability_id)
+
+            entity_rows.append(add_entity(entity_id, vec_cand.entity_kind))
+            capability_rows.append(capability_row)
+            keyword_scores.append(kw_cand.keyword_score if kw_cand else 0.0)
+            vector_scores.append(vec_cand.vector_score)
+            reason_rows.append(
+                batch._merge_reasons(kw_cand.reasons if kw_cand else (), vec_cand.reasons)
+            )
+
+        for entity_id, kw_cand in keyword_map.items():
+            if entity_id in entity_lookup:
+                continue
+            entity_rows.append(add_entity(entity_id, kw_cand.entity_kind))
+            capability_rows.append(0)
+            keyword_scores.append(kw_cand.keyword_score)
+            vector_scores.append(0.0)
+            reason_rows.append(batch._intern_reasons(tuple(kw_cand.reasons)))
+
+        batch.entity_index = np.asarray(entity_rows, dtype=np.intp)
+        batch.capability_index = np.asarray(capability_rows, dtype=np.intp)
+        batch.keyword_scores = np.asarray(keyword_scores, dtype=np.float64)
+        batch.vector_scores = np.asarray(vector_scores, dtype=np.float64)
+        if fusion == "rrf":
+            keyword_positions = {entity_id: i for i, entity_id in enumerate(keyword_map)}
+            keyword_rows = np.asarray(
+                [keyword_positions.get(entity_id, -1) for entity_id in batch.entity_ids],
+                dtype=np.intp,
+            )[batch.entity_index]
+            vector_rows = np.full(len(entity_rows), -1, dtype=np.intp)
+            vector_rows[: len(vector_map)] = np.arange(len(vector_map))
+            batch.total_scores = _rrf_scores(
+                [c.keyword_score for c in keyword_map.values()],
+                keyword_rows,
+                w_keyword,
+                rrf_k,
+            ) + _rrf_scores(
+                [c.vector_score for c in vector_map.values()],
+                vector_rows,
+                w_vector,
+                rrf_k,
+            )
+        else:
+            batch.total_scores = (
+                batch.keyword_scores * w_keyword + batch.vector_scores * w_vector
+            )
+        batch.reason_index = np.asarray(reason_rows, dtype=np.intp)
+        return batch
+
+    def _intern_reasons(self, reasons: tuple[str, ...]) -> int:
+        """返回 reasons 列表在 reason_lists 中的下标，新列表追加到末尾。"""
+        index = self._reason_lookup.get(reasons)
+        if index is None:
+            index = self._reason_lookup[reasons] = len(self.reason_lists)
+            self.reason_lists.append(reasons)
+        return index
+
+    def _merge_reasons(self, keyword: Iterable[str], vector: Iterable[str]) -> int:
+        """合并关键词与向量 reasons（关键词在前，向量 reasons 去重追加），返回下标。"""
+        key = (tuple(keyword), tuple(vector))
+        index = self._merged_reasons.get(key)
+        if index is None:
+            reasons = list(key[0])
+            reasons.extend(reason for reason in key[1] if reason not in reasons)
+            index = self._merged_reasons[key] = self._intern_reasons(tuple(reasons))
+        return index
+
+    def add_room_bonus(
+        self,
+        devices: dict[str, Device],
+        scope_include: set[str],
+        bonus: float = ROOM_MATCH_BONUS,
+    ) -> None:
+        """对命中房间的行原地加分并标记 room_bonus，规则同 apply_room_bonus。"""
+        if not len(self) or not scope_include:
+            return
+
+        in_scope = np.fromiter(
+            (
+                device is not None and device.room in scope_include
+                for device in map(devices.get, self.entity_ids)
+            ),
+            dtype=bool,
+            count=len(self.entity_ids),
+        )
+        rows = in_scope[self.entity_index]
+        self.total_scores[rows] += bonus
+        # 每种 reasons 列表映射到追加 room_bonus 后的列表，再按行替换下标
+        boosted = np.asarray(
+            [
+                self._intern_reasons(
+                    reasons if "room_bonus" in reasons else (*reasons, "room_bonus")
+                )
+                for reasons in list(self.reason_lists)
+            ],
+            dtype=np.intp,
+        )
+        self.reason_index[rows] = boosted[self.reason_index[rows]]
+
+    def candidate(self, row: int) -> Candidate:
+        """物化单行为 Candidate。"""
+        return Candidate(
+            entity_id=self.entity_ids[self.entity_index[row]],
+            entity_kind=self.entity_kinds[self.entity_index[row]],
+            capability_id=self.capability_ids[self.capability_index[row]],
+            keyword_score=float(self.keyword_scores[row]),
+            vector_score=float(self.vector_scores[row]),
+            total_score=float(self.total_scores[row]),
+            reasons=list(self.reason_lists[self.reason_index[row]]),
+        )
+
+    def top_rows(self, k: int | None = None) -> NDArray[np.intp]:
+        """综合分数最高的 k 行下标（降序，同分保持行顺序）。"""
+        scores = -self.total_scores
+        if k is None or k >= len(self):
+            return np.argsort(scores, kind="stable")
+        if k <= 0:
+            return np.zeros(0, dtype=np.intp)
+        # 阈值内的行（含全部同分行）再做一次稳定排序
+        threshold = np.partition(scores, k - 1)[k - 1]
+        pool = np.flatnonzero(scores <= threshold)
+        return pool[np.argsort(scores[pool], kind="stable")[:k]]
+
+    def to_candidates(self, k: int | None = None) -> list[Candidate]:
+        """物化综合分数最高的 k 行。"""
+        return [self.candidate(row) for row in self.top_rows(k).tolist()]
+
+    def select_devices(
+        self,
+        limit: int,
+        accept: Callable[[Candidate], Candidate | None] | None = None,
+    ) -> list[Candidate]:
+        """按综合分数降序选出最多 limit 个设备候选，每个设备只保留最高分的行。
+
+        结果等价于对全部行先做 accept 转换/过滤、再按设备去重并排序
+        （同分按设备首次出现的顺序），但只物化实际访问到的行。
+
+        Args:
+            limit: 返回的设备数量上限
+            accept: 可选的候选转换函数，返回 None 表示丢弃该行
+
+        Returns:
+            按综合分数降序排列的设备候选
+        """
+        if limit <= 0 or not len(self):
+            return []
+
+        rows = np.arange(len(self), dtype=np.intp)
+        first_row = np.full(len(self.entity_ids), len(self), dtype=np.intp)
+        np.minimum.at(first_row, self.entity_index, rows)
+        order = np.lexsort((rows, first_row[self.entity_index], -self.total_scores))
+
+        taken = [kind != "device" for kind in self.entity_kinds]
+        selected: list[Candidate] = []
+        for row in order.tolist():
+            entity = self.entity_index[row]
+            if taken[entity]:
+                continue
+            candidate = self.candidate(row)
+            if accept is not None:
+                candidate = accept(candidate)
+                if candidate is None:
+                    continue
+            taken[entity] = True
+            selected.append(candidate)
+            if len(selected) >= limit:
+                break
+        return selected
 
 
 def merge_and_score(
@@ -15,6 +299,9 @@ def merge_and_score(
     vector_candidates: list[Candidate],
     w_keyword: float = 1.0,
     w_vector: float = 0.5,
+    top_k: int | None = None,
+    fusion: FusionMode = "linear",
+    rrf_k: int = DEFAULT_RRF_K,
 ) -> list[Candidate]:
     """合并 keyword 和 vector 检索结果并计算综合分数。
 
@@ -22,70 +309,82 @@ def merge_and_score(
     - 若设备同时出现在两个结果中，合并分数和 reasons
     - 若仅出现在一个结果中，使用该来源的分数
 
+    融合方式：
+    - linear：keyword_score * w_keyword + vector_score * w_vector
+    - rrf：倒数排名融合，各来源按分数降序的名次 r 贡献 w * (rrf_k + 1) / (rrf_k + r)，
+      只依赖名次而非分数量纲；乘以 (rrf_k + 1) 使单来源第一名得分等于其权重，
+      与房间加分、接近阈值保持同一量级
+
     Args:
         keyword_candidates: Keyword 检索候选
         vector_candidates: Vector 检索候选
         w_keyword: Keyword 分数权重
         w_vector: Vector 分数权重
+        top_k: 只保留前 top_k 个候选，None 表示全部保留
+        fusion: 融合方式，linear 或 rrf
+        rrf_k: RRF 平滑常数
 
     Returns:
         合并后的候选列表，按综合分数降序排列
     """
-    # 构建映射
-    keyword_map: dict[str, Candidate] = {c.entity_id: c for c in keyword_candidates}
-    vector_map: dict[tuple[str, str | None], Candidate] = {
-        (c.entity_id, c.capability_id): c for c in vector_candidates
-    }
-
-    merged: list[Candidate] = []
-    seen_entities: set[str] = set()
-
-    for (entity_id, capability_id), vec_cand in vector_map.items():
-        kw_cand = keyword_map.get(entity_id)
-
-        keyword_score = kw_cand.keyword_score if kw_cand else 0.0
-        vector_score = vec_cand.vector_score
-        total_score = keyword_score * w_keyword + vector_score * w_vector
-
-        reasons: list[str] = []
-        if kw_cand:
-            reasons.extend(kw_cand.reasons)
-        for r in vec_cand.reasons:
-            if r not in reasons:
-                reasons.append(r)
-
-        merged.append(
-            Candidate(
-                entity_id=entity_id,
-                entity_kind=vec_cand.entity_kind,
-                capability_id=capability_id,
-                keyword_score=keyword_score,
-                vector_score=vector_score,
-                total_score=total_score,
-                reasons=reasons,
-            )
-        )
-        seen_entities.add(entity_id)
-
-    for entity_id, kw_cand in keyword_map.items():
-        if entity_id in seen_entities:
-            continue
-        merged.append(
-            Candidate(
-                entity_id=entity_id,
-                entity_kind=kw_cand.entity_kind,
-                capability_id=None,
-                keyword_score=kw_cand.keyword_score,
-                vector_score=0.0,
-                total_score=kw_cand.keyword_score * w_keyword,
-                reasons=list(kw_cand.reasons),
-            )
-        )
+    batch = merge_candidates(
+        keyword_candidates,
+        vector_candidates,
+        w_keyword=w_keyword,
+        w_vector=w_vector,
+        fusion=fusion,
+        rrf_k=rrf_k,
+    )
+    return batch.to_candidates(top_k)
+
+
+def merge_candidates(
+    keyword_candidates: list[Candidate],
+    vector_candidates: list[Candidate],
+    w_keyword: float = 1.0,
+    w_vector: float = 0.5,
+    fusion: FusionMode = "linear",
+    rrf_k: int = DEFAULT_RRF_K,
+) -> CandidateBatch:
+    """合并 keyword 和 vector 检索结果为列式批次，不排序、不物化候选。
 
-    # 按综合分数降序排列
-    merged.sort(key=lambda c: c.total_score, reverse=True)
+    合并规则同 merge_and_score；供后续还会调整分数、最终统一做 top-k 的调用方使用。
+    """
+    return CandidateBatch.merge(
+        keyword_candidates,
+        vector_candidates,
+        w_keyword=w_keyword,
+        w_vector=w_vector,
+        fusion=fusion,
+        rrf_k=rrf_k,
+    )
+
+
+def _rrf_scores(
+    scores: list[float],
+    positions: NDArray[np.intp],
+    weight: float,
+    rrf_k: int,
+) -> NDArray[np.float64]:
+    """计算单一来源的 RRF 分量。
+
+    Args:
+        scores: 该来源各候选的原始分数
+        positions: 每行对应的候选下标，-1 表示该行不来自此来源
+        weight: 来源权重
+        rrf_k: RRF 平滑常数
 
-    return merged
+    Returns:
+        每行的 RRF 分量（已乘以 rrf_k + 1）
+    """
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")] = np.arange(
+        1, len(scores) + 1
+    )
+    contribution = np.zeros(positions.shape[0], dtype=np.float64)
+    hit = positions >= 0
+    contribution[hit] = weight * (rrf_k + 1) / (rrf_k + ranks[positions[hit]])
+    return contribution
 
 
 def apply_room_bonus(
@@ -3,7 +3,9 @@
 使用 rapidfuzz 进行高效的中文模糊匹配。
 """
 
-from rapidfuzz import fuzz
+import numpy as np
+from numpy.typing import NDArray
+from rapidfuzz import fuzz, process
 
 
 def fuzzy_match_score(text: str, query: str) -> float:
@@ -27,6 +29,37 @@ def fuzzy_match_score(text: str, query: str) -> float:
     return score
 
 
+def fuzzy_match_matrix(
+    texts: list[str],
+    queries: list[str],
+    workers: int = 1,
+) -> NDArray[np.float64]:
+    """批量计算模糊匹配分数矩阵。
+
+    与 fuzzy_match_score 使用相同的 token_set_ratio，
+    通过 rapidfuzz.process.cdist 一次完成全部配对（可多线程）。
+
+    Args:
+        texts: 目标文本列表
+        queries: 查询串列表
+        workers: cdist 使用的线程数，-1 表示使用全部 CPU
+
+    Returns:
+        分数矩阵 [0, 1]，shape=(len(texts), len(queries))
+    """
+    if not texts or not queries:
+        return np.zeros((len(texts), len(queries)), dtype=np.float64)
+
+    scores = process.cdist(
+        texts,
+        queries,
+        scorer=fuzz.token_set_ratio,
+        dtype=np.float64,
+        workers=workers,
+    )
+    return scores / 100.0
+
+
 def partial_match_score(text: str, query: str) -> float:
     """计算部分匹配分数。
 
@@ -1,10 +1,20 @@
 """向量检索模块。
 
-使用 DashScope embedding 进行语义相似度检索。
+基于 embedding 的语义相似度检索：EmbeddingVectorSearcher 负责索引与检索，
+具体 embedding 后端（DashScope、本地哈希等）由子类提供。
 """
 
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import shutil
+import tempfile
+import time
+import weakref
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from http import HTTPStatus
 from typing import Any
@@ -13,12 +23,70 @@ import numpy as np
 from numpy.typing import NDArray
 
 from context_retrieval.doc_enrichment import CapabilityDoc, build_enriched_doc
+from context_retrieval.embedding_cache import EmbeddingCache, QueryEmbeddingLRU
 from context_retrieval.models import Candidate, Device
+from context_retrieval.quantization import STORAGE_MODES, QuantizedMatrix, StorageMode
+
+logger = logging.getLogger(__name__)
+
+_TRANSIENT_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+INDEX_FORMAT_VERSION = 2
+INDEX_MATRIX_FILE = "embeddings.npy"
+INDEX_CODES_FILE = "embeddings.codes.npy"
+INDEX_SCALES_FILE = "embeddings.scales.npy"
+INDEX_ENTRIES_FILE = "entries.json"
+
+_SPILL_BLOCK_ROWS = 4096
+
+
+class TransientEmbeddingError(RuntimeError):
+    """embedding 服务的瞬时错误（限流或服务端错误），可重试。"""
+
+
+def _network_errors() -> tuple[type[BaseException], ...]:
+    """dashscope SDK 底层 HTTP 库的网络异常（requests / aiohttp，未安装时跳过）。
+
+    requests 的 ConnectionError / Timeout 派生自 RequestException（OSError），
+    不是内置的 ConnectionError / TimeoutError，需要单独列出。
+    """
+    errors: list[type[BaseException]] = []
+    try:
+        from requests.exceptions import RequestException
+    except ImportError:  # pragma: no cover - requests 是 dashscope 的依赖
+        pass
+    else:
+        errors.append(RequestException)
+    try:
+        from aiohttp import ClientError
+    except ImportError:  # pragma: no cover - 仅异步客户端需要
+        pass
+    else:
+        errors.append(ClientError)
+    return tuple(errors)
+
+
+_NETWORK_ERRORS = _network_errors()
+_RETRYABLE_ERRORS = (
+    TransientEmbeddingError,
+    ConnectionError,
+    TimeoutError,
+    *_NETWORK_ERRORS,
+)
 
 
 class VectorSearcher(ABC):
     """向量检索器抽象基类。"""
 
+    @property
+    def exact_filtering(self) -> bool:
+        """带设备过滤的检索结果是否恰为无过滤检索结果中属于该设备集合的前缀。
+
+        只有打分与过滤条件无关的精确检索成立；量化粗排后重排、ANN 探测等
+        候选池随过滤条件变化的检索器不成立，默认返回 False。
+        """
+        return False
+
     @abstractmethod
     def index(self, devices: list[Device]) -> None:
         """索引设备。
@@ -47,8 +115,66 @@ class VectorSearcher(ABC):
         """
         ...
 
+    def search_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """批量执行向量检索，默认逐条调用 search。
 
-@dataclass
+        Args:
+            queries: 查询文本列表
+            top_k: 每条查询返回的最大候选数
+            device_ids_per_query: 与 queries 等长的设备过滤集合列表
+
+        Returns:
+            与 queries 一一对应的候选列表
+        """
+        filters = _expand_device_filters(queries, device_ids_per_query)
+        return [
+            self.search(query, top_k=top_k, device_ids=device_ids)
+            for query, device_ids in zip(queries, filters)
+        ]
+
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 10,
+        device_ids: set[str] | None = None,
+    ) -> list[Candidate]:
+        """异步执行向量检索，参数与返回值同 search。"""
+        results = await self.asearch_many([query], top_k=top_k, device_ids_per_query=[device_ids])
+        return results[0]
+
+    async def asearch_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """异步批量执行向量检索，默认在线程中调用 search_many。
+
+        可 await 的 embedding 后端应覆盖此方法，避免为每个请求占用线程。
+        """
+        return await asyncio.to_thread(self.search_many, queries, top_k, device_ids_per_query)
+
+
+def _expand_device_filters(
+    queries: list[str],
+    device_ids_per_query: list[set[str] | None] | None,
+) -> list[set[str] | None]:
+    """补齐并校验每条查询的设备过滤集合。"""
+    if device_ids_per_query is None:
+        return [None] * len(queries)
+    if len(device_ids_per_query) != len(queries):
+        raise ValueError(
+            f"device_ids_per_query 数量不一致: {len(device_ids_per_query)} != {len(queries)}"
+        )
+    return list(device_ids_per_query)
+
+
+@dataclass(frozen=True, slots=True)
 class CorpusEntry:
     """Entry in the command corpus.
 
@@ -57,12 +183,41 @@ class CorpusEntry:
         capability_id: Capability identifier (None for fallback entries)
         category: Device category (e.g., "Light", "Blind")
         room: Device room
+        profile_id: Device profile identifier (None when unknown)
     """
 
     device_id: str
     capability_id: str | None
     category: str | None
     room: str
+    profile_id: str | None = None
+
+
+def _normalize_rows(matrix: NDArray[np.float32]) -> NDArray[np.float32]:
+    """按行做 L2 归一化，返回 float32 矩阵。"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return (matrix / (norms + 1e-8)).astype(np.float32, copy=False)
+
+
+def _top_k_indices(scores: NDArray[np.float32], top_k: int) -> NDArray[np.intp]:
+    """返回分数最高的 top_k 个下标（降序，同分按下标升序）。
+
+    先用 argpartition 做 O(n) 选择，再只对选中的部分排序。
+    """
+    size = int(scores.shape[0])
+    if top_k <= 0 or size == 0:
+        return np.zeros(0, dtype=np.intp)
+    if top_k >= size:
+        return np.argsort(-scores, kind="stable")
+
+    selected = np.argpartition(-scores, top_k - 1)[:top_k]
+    kth_score = scores[selected].min()
+    # 边界处同分时按下标取，保证结果与完整稳定排序一致
+    above = np.flatnonzero(scores > kth_score)
+    ties = np.flatnonzero(scores == kth_score)[: top_k - above.shape[0]]
+    selected = np.concatenate([above, ties])
+    return selected[np.argsort(-scores[selected], kind="stable")]
 
 
 def build_command_corpus(
@@ -71,6 +226,8 @@ def build_command_corpus(
 ) -> tuple[list[CorpusEntry], list[str]]:
     """构建命令级语料库。
 
+    同一 profile 的富化文档只构建一次，在该 profile 的设备间复用。
+
     Args:
         devices: 设备列表
         spec_index: profile_id -> CapabilityDoc 列表的映射
@@ -82,13 +239,18 @@ def build_command_corpus(
     """
     entries: list[CorpusEntry] = []
     texts: list[str] = []
+    profile_docs: dict[str, list[str]] = {}
 
     for device in devices:
-        profile_id = getattr(device, "profile_id", None) or getattr(
-            device, "profileId", None
-        )
+        profile_id = device.profile_id
         spec_docs = spec_index.get(profile_id) if profile_id else None
-        docs = build_enriched_doc(device, spec_index)
+        if spec_docs:
+            docs = profile_docs.get(profile_id)
+            if docs is None:
+                docs = build_enriched_doc(device, spec_index)
+                profile_docs[profile_id] = docs
+        else:
+            docs = build_enriched_doc(device, spec_index)
 
         category = device.category
 
@@ -100,6 +262,7 @@ def build_command_corpus(
                         capability_id=spec_doc.id,
                         category=category,
                         room=device.room,
+                        profile_id=profile_id,
                     )
                 )
                 texts.append(doc)
@@ -112,6 +275,7 @@ def build_command_corpus(
                     capability_id=None,
                     category=category,
                     room=device.room,
+                    profile_id=profile_id,
                 )
             )
             texts.append(doc)
@@ -119,92 +283,604 @@ def build_command_corpus(
     return entries, texts
 
 
-class DashScopeVectorSearcher(VectorSearcher):
-    """基于 DashScope embedding 的向量检索器。
+RowKey = tuple[str, ...]
 
-    使用 text-embedding-v4 模型生成向量，支持命令级索引。
+
+def _text_digest(text: str) -> str:
+    """富化文档文本的摘要，用于区分同一能力的不同文档版本。"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def corpus_row_key(entry: CorpusEntry, text: str) -> RowKey:
+    """计算语料条目对应的共享向量行键。
+
+    有 capability 的条目按 (profile_id, capability_id, 文档摘要) 共享同一行，
+    规格的描述或取值变化后文档摘要随之变化，旧向量不会被误用；
+    兜底条目（无规格文档）按文本内容共享。
+    """
+    if entry.profile_id and entry.capability_id:
+        return ("capability", entry.profile_id, entry.capability_id, _text_digest(text))
+    return ("text", "", text)
+
+
+def _device_signature(device: Device) -> tuple[str, str, str, str]:
+    """设备的索引签名；签名变化时需要重建该设备的条目。"""
+    profile_id = device.profile_id
+    profile = profile_id.strip() if isinstance(profile_id, str) else ""
+    return (profile, device.name, device.room, device.category)
+
+
+@dataclass
+class _IndexedDevice:
+    """单个设备在向量索引中的条目。"""
+
+    signature: tuple[str, str, str, str]
+    entries: list[CorpusEntry]
+    row_keys: list[RowKey]
+
+
+class EmbeddingVectorSearcher(VectorSearcher):
+    """基于 embedding 的向量检索器基类。
+
+    负责命令级语料构建、按 profile 共享的向量行、增量更新、持久化与检索；
+    子类只需实现 _request_embeddings 提供具体的 embedding 后端。
     """
 
     def __init__(
         self,
+        model: str,
         spec_index: dict[str, list[CapabilityDoc]] | None = None,
-        model: str = "text-embedding-v4",
-        api_key: str | None = None,
-        embedding_client: Any | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        query_cache_size: int = 256,
+        query_cache_ttl: float | None = 600.0,
+        storage: StorageMode = "float32",
+        rescore: bool = False,
+        rescore_multiplier: int = 4,
+        rescore_dir: str | None = None,
     ):
         """初始化。
 
         Args:
+            model: 模型名称，用于缓存键与索引文件校验
             spec_index: profile_id -> CapabilityDoc 列表的映射
-            model: 模型名称，默认 text-embedding-v4
-            api_key: API Key，未提供时从 `DASHSCOPE_API_KEY` 读取
-            embedding_client: 可注入的 embedding 客户端，便于测试
+            embedding_cache: 可选的持久化 embedding 缓存，仅未命中的文本会请求后端
+            query_cache_size: 查询向量 LRU 容量，0 表示关闭
+            query_cache_ttl: 查询向量缓存有效期（秒），None 表示不过期
+            storage: 向量存储格式，float32 / float16 / int8（按行缩放）
+            rescore: 量化存储时是否保留 float32 行（落盘后以内存映射读取），对粗排候选做精确重排
+            rescore_multiplier: 重排候选数为 top_k 的倍数
+            rescore_dir: 重排用 float32 行的落盘目录（其下创建临时子目录），None 时使用系统临时目录
         """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"不支持的向量存储格式: {storage}")
         self.spec_index = spec_index or {}
         self.model = model
-        self._entries: list[CorpusEntry] = []
+        self._embedding_cache = embedding_cache
+        self.storage = storage
+        self.rescore = rescore and storage != "float32"
+        self.rescore_multiplier = max(1, rescore_multiplier)
+        self._rescore_dir = rescore_dir
+        self._spill_dir: str | None = None
+        self._spill_path: str | None = None
+        self._spill_count = 0
+        # 重排模式下逻辑行到落盘文件行的映射，None 表示一一对应
+        self._float_index: NDArray[np.intp] | None = None
+        self.query_cache: QueryEmbeddingLRU | None = None
+        if query_cache_size > 0:
+            self.query_cache = QueryEmbeddingLRU(
+                maxsize=query_cache_size,
+                ttl=query_cache_ttl,
+            )
+        self._indexed: dict[str, _IndexedDevice] = {}
+        self._row_keys: list[RowKey] = []
+        self._row_lookup: dict[RowKey, int] = {}
         self._embeddings: NDArray[np.float32] | None = None
-        self._fingerprint: tuple[tuple[str, str], ...] | None = None
+        self._quantized: QuantizedMatrix | None = None
+        self._entries: list[CorpusEntry] = []
+        self._entry_rows: NDArray[np.intp] = np.zeros(0, dtype=np.intp)
+        self._entry_devices: NDArray[np.intp] = np.zeros(0, dtype=np.intp)
+        self._device_codes: dict[str, int] = {}
+        self._index_version = 0
+
+    @property
+    def row_count(self) -> int:
+        """向量矩阵的行数（按 profile 去重后）。"""
+        return len(self._row_keys)
+
+    @property
+    def matrix_nbytes(self) -> int:
+        """向量存储占用的字节数（float32 与量化矩阵之和）。"""
+        size = 0
+        if self._embeddings is not None:
+            size += int(self._embeddings.nbytes)
+        if self._quantized is not None:
+            size += self._quantized.nbytes
+        return size
+
+    @property
+    def resident_nbytes(self) -> int:
+        """常驻进程内存的向量字节数。
+
+        内存映射的矩阵（load(mmap=True) 加载或重排模式落盘的 float32 行）
+        由页缓存按需换入、可在进程间共享，不计入。
+        """
+        arrays = [self._embeddings]
+        if self._quantized is not None:
+            arrays.extend([self._quantized.codes, self._quantized.scales])
+        return sum(
+            int(array.nbytes)
+            for array in arrays
+            if array is not None and not isinstance(array, np.memmap)
+        )
 
-        if embedding_client is not None:
-            self._embedding = embedding_client
-            return
+    @property
+    def index_version(self) -> int:
+        """索引版本号，每次索引内容变化后递增（供派生索引判断是否过期）。"""
+        return self._index_version
 
-        try:
-            import dashscope
-        except ImportError as exc:
-            raise ImportError(
-                "需要安装 dashscope 才能使用 DashScopeVectorSearcher"
-            ) from exc
+    @property
+    def entry_rows(self) -> NDArray[np.intp]:
+        """每个设备条目对应的向量行下标。"""
+        return self._entry_rows
 
-        api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
-        if api_key:
-            dashscope.api_key = api_key
+    def row_vectors(self, rows: NDArray[np.intp] | None = None) -> NDArray[np.float32]:
+        """返回归一化后的 float32 行向量（量化存储时反量化）。
 
-        embedding_class = getattr(dashscope, "TextEmbedding", None)
-        if embedding_class is None:
+        Args:
+            rows: 只返回指定的向量行，None 表示全部行
+
+        Returns:
+            float32 行向量矩阵
+        """
+        if self._embeddings is not None:
+            if rows is None and self._float_index is None:
+                return np.asarray(self._embeddings, dtype=np.float32)
+            if rows is None:
+                rows = np.arange(self.row_count)
+            return np.asarray(self._float_rows(rows), dtype=np.float32)
+        if self._quantized is not None:
+            quantized = self._quantized if rows is None else self._quantized.take(rows)
+            return quantized.to_float()
+        return np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def exact_filtering(self) -> bool:
+        """float32 存储时精确打分，过滤只截取条目，结果等于无过滤结果按设备子集截取。"""
+        return self.storage == "float32"
+
+    @property
+    def _keeps_float(self) -> bool:
+        """是否保留 float32 行（非量化模式或需要精确重排）。"""
+        return self.storage == "float32" or self.rescore
+
+    def _spill_float_rows(self, blocks) -> NDArray[np.float32]:
+        """将 float32 行分块写入新的落盘文件，返回只读内存映射。
+
+        重排只读取少量候选行，float32 矩阵落盘后不常驻内存；
+        写入新文件后删除上一个文件（已映射的数组在 POSIX 上仍然有效）。
+        """
+        if self._spill_dir is None:
+            if self._rescore_dir is not None:
+                os.makedirs(self._rescore_dir, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="vector-rescore-", dir=self._rescore_dir)
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+
+        self._spill_count += 1
+        path = os.path.join(self._spill_dir, f"rows-{self._spill_count}.f32")
+        dim = 0
+        with open(path, "wb") as handle:
+            for block in blocks:
+                dim = block.shape[1]
+                handle.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+        if dim == 0:
+            os.remove(path)
+            raise ValueError("落盘的 float32 行不能为空")
+
+        previous, self._spill_path = self._spill_path, path
+        self._float_index = None
+        if previous is not None:
             try:
-                from dashscope import embeddings as embedding_mod
+                os.remove(previous)
+            except OSError:  # pragma: no cover - 仍被映射且平台不允许删除时留给目录清理
+                pass
+        return self._map_spill(dim)
+
+    def _map_spill(self, dim: int) -> NDArray[np.float32]:
+        """以只读内存映射打开当前落盘文件的全部行。"""
+        rows = os.path.getsize(self._spill_path) // (dim * np.dtype(np.float32).itemsize)
+        return np.memmap(self._spill_path, dtype=np.float32, mode="r", shape=(rows, dim))
+
+    def _owns_spill(self, matrix: NDArray[np.float32] | None) -> bool:
+        """matrix 是否映射自本实例的落盘文件（load 映射的索引文件不可原地修改）。"""
+        return (
+            isinstance(matrix, np.memmap)
+            and self._spill_path is not None
+            and matrix.filename == os.path.abspath(self._spill_path)
+        )
 
-                embedding_class = getattr(embedding_mod, "Embedding")
-            except Exception as exc:
-                raise ImportError(
-                    "未找到 dashscope TextEmbedding/Embedding 接口"
-                ) from exc
+    def _float_rows(self, rows) -> NDArray[np.float32]:
+        """按逻辑行下标读取 float32 行（重排模式下经过落盘文件的行映射）。"""
+        if self._float_index is not None:
+            rows = self._float_index[rows]
+        return self._embeddings[rows]
 
-        self._embedding = embedding_class
+    def _float_blocks(self, rows: NDArray[np.intp]):
+        """按逻辑行下标分块读取 float32 行。"""
+        for start in range(0, len(rows), _SPILL_BLOCK_ROWS):
+            yield self._float_rows(rows[start : start + _SPILL_BLOCK_ROWS])
+
+    def _append_float_rows(self, vectors: NDArray[np.float32]) -> NDArray[np.float32]:
+        """追加 float32 行：精确模式常驻内存，重排模式追加到落盘文件末尾。
+
+        重排模式只写入新增行（O(Δ)），随后重新映射文件；
+        当前矩阵不是本实例的落盘文件（如 load 映射的索引文件）时先整体复制一次。
+        """
+        current = self._embeddings
+        if self.storage == "float32":
+            return vectors if current is None else np.vstack([current, vectors])
+        if current is None:
+            return self._spill_float_rows([vectors])
+        if not self._owns_spill(current):
+            rows = np.arange(self.row_count - len(vectors))
+            return self._spill_float_rows([*self._float_blocks(rows), vectors])
+
+        physical = len(current)
+        with open(self._spill_path, "ab") as handle:
+            handle.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        if self._float_index is not None:
+            appended = np.arange(physical, physical + len(vectors), dtype=np.intp)
+            self._float_index = np.concatenate([self._float_index, appended])
+        return self._map_spill(vectors.shape[1])
+
+    def _take_float_rows(self, keep: list[int]) -> NDArray[np.float32]:
+        """按行下标保留 float32 行。
+
+        重排模式下不立即重写落盘文件，只记录逻辑行到文件行的映射；
+        失效行多于存活行时才整理为新文件，删除的摊销代价为 O(Δ)。
+        """
+        current = self._embeddings
+        if self.storage == "float32":
+            return current[keep]
+        physical = np.asarray(keep, dtype=np.intp)
+        if self._float_index is not None:
+            physical = self._float_index[physical]
+        if not self._owns_spill(current) or len(current) - len(physical) > len(physical):
+            blocks = (
+                current[physical[start : start + _SPILL_BLOCK_ROWS]]
+                for start in range(0, len(physical), _SPILL_BLOCK_ROWS)
+            )
+            return self._spill_float_rows(blocks)
+        self._float_index = physical
+        return current
 
     def index(self, devices: list[Device]) -> None:
-        """索引设备，构建命令级向量索引。"""
+        """索引设备，构建命令级向量索引。
+
+        与上次索引的设备列表做差异比较：只为新增或签名变化的设备构建条目，
+        只编码尚未入库的 (profile_id, capability_id) 行，并压缩不再被引用的行。
+        同一 profile 的 capability 文档只编码一次，设备条目通过行下标共享向量。
+        """
         if not devices:
-            self._entries = []
+            self._indexed = {}
+            self._row_keys = []
+            self._row_lookup = {}
             self._embeddings = None
-            self._fingerprint = None
+            self._float_index = None
+            self._quantized = None
+            self._rebuild_views()
             return
 
-        fingerprint = self._build_fingerprint(devices)
-        if (
-            fingerprint
-            and fingerprint == self._fingerprint
-            and self._embeddings is not None
-            and self._entries
+        signatures = {device.id: _device_signature(device) for device in devices}
+        previous = self._indexed
+        if list(previous) == list(signatures) and all(
+            previous[device_id].signature == signature
+            for device_id, signature in signatures.items()
         ):
             return
 
-        self._entries, texts = build_command_corpus(devices, self.spec_index)
-        self._embeddings = self.encode(texts)
-        self._fingerprint = fingerprint
+        changed = [
+            device
+            for device in devices
+            if device.id not in previous
+            or previous[device.id].signature != signatures[device.id]
+        ]
+        fresh = self._build_indexed_devices(changed)
+        self._indexed = {
+            device_id: fresh.get(device_id) or previous[device_id]
+            for device_id in signatures
+        }
+        self._compact_rows()
+        self._rebuild_views()
+
+    def add_devices(self, devices: list[Device]) -> None:
+        """增量添加设备；已存在的设备按新信息更新条目。"""
+        if not devices:
+            return
+        self._indexed.update(self._build_indexed_devices(devices))
+        self._compact_rows()
+        self._rebuild_views()
+
+    def remove_devices(self, device_ids: set[str] | list[str]) -> None:
+        """移除设备并压缩不再被引用的向量行。"""
+        removed = False
+        for device_id in device_ids:
+            removed = self._indexed.pop(device_id, None) is not None or removed
+        if not removed:
+            return
+        self._compact_rows()
+        self._rebuild_views()
+
+    def update_device(self, device: Device) -> None:
+        """更新单个设备（profile/名称/房间/类别变化）。"""
+        self.add_devices([device])
+
+    def save(self, directory: str) -> None:
+        """保存向量索引。
+
+        - embeddings.npy：归一化后的向量矩阵，可用 np.load(mmap_mode="r") 在多进程间共享页缓存
+        - entries.json：设备签名、条目表（按列存储）与行键
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        devices: list[dict[str, Any]] = []
+        columns: dict[str, list[Any]] = {
+            "capability_id": [],
+            "category": [],
+            "room": [],
+            "profile_id": [],
+            "row": [],
+        }
+        for device_id, item in self._indexed.items():
+            devices.append(
+                {
+                    "id": device_id,
+                    "signature": list(item.signature),
+                    "count": len(item.entries),
+                }
+            )
+            for entry, key in zip(item.entries, item.row_keys):
+                columns["capability_id"].append(entry.capability_id)
+                columns["category"].append(entry.category)
+                columns["room"].append(entry.room)
+                columns["profile_id"].append(entry.profile_id)
+                columns["row"].append(self._row_lookup[key])
+
+        payload = {
+            "version": INDEX_FORMAT_VERSION,
+            "model": self.model,
+            "storage": self.storage,
+            "row_keys": [list(key) for key in self._row_keys],
+            "devices": devices,
+            "entries": columns,
+        }
+
+        if self._float_index is not None:
+            # 落盘文件中有失效行时先整理，保存的矩阵与行键一一对应
+            self._embeddings = self._spill_float_rows(
+                self._float_blocks(np.arange(self.row_count))
+            )
+
+        arrays: dict[str, NDArray] = {}
+        if self._embeddings is not None or self._quantized is None:
+            matrix = self._embeddings
+            if matrix is None:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            arrays[INDEX_MATRIX_FILE] = np.ascontiguousarray(matrix, dtype=np.float32)
+        if self._quantized is not None:
+            arrays[INDEX_CODES_FILE] = np.ascontiguousarray(self._quantized.codes)
+            if self._quantized.scales is not None:
+                arrays[INDEX_SCALES_FILE] = self._quantized.scales
+        stale = {INDEX_MATRIX_FILE, INDEX_CODES_FILE, INDEX_SCALES_FILE} - set(arrays)
+
+        entries_path = os.path.join(directory, INDEX_ENTRIES_FILE)
+        for name, array in arrays.items():
+            with open(os.path.join(directory, f"{name}.tmp"), "wb") as handle:
+                np.save(handle, array)
+        with open(f"{entries_path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, ensure_ascii=False, separators=(",", ":"))
+        for name in arrays:
+            path = os.path.join(directory, name)
+            os.replace(f"{path}.tmp", path)
+        for name in stale:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        os.replace(f"{entries_path}.tmp", entries_path)
+
+    def load(self, directory: str, mmap: bool = True) -> None:
+        """加载 save() 写出的向量索引。
 
-    def _build_fingerprint(self, devices: list[Device]) -> tuple[tuple[str, str], ...]:
-        """构建设备列表的指纹，用于判断索引是否复用。"""
-        parts: list[tuple[str, str]] = []
-        for device in devices:
-            profile_id = getattr(device, "profile_id", None) or getattr(
-                device, "profileId", None
+        Args:
+            directory: 索引目录
+            mmap: 是否以只读内存映射方式加载向量矩阵（多进程共享页缓存）
+        """
+        with open(os.path.join(directory, INDEX_ENTRIES_FILE), "r", encoding="utf-8") as handle:
+            payload = json.load(handle)
+
+        version = payload.get("version")
+        if version != INDEX_FORMAT_VERSION:
+            raise ValueError(f"不支持的向量索引版本: {version}")
+        model = payload.get("model")
+        if model != self.model:
+            raise ValueError(f"向量索引模型不一致: {model} != {self.model}")
+
+        matrix, quantized = self._load_matrices(directory, payload.get("storage"), mmap)
+        row_keys: list[RowKey] = [tuple(key) for key in payload["row_keys"]]  # type: ignore[misc]
+
+        columns = payload["entries"]
+        indexed: dict[str, _IndexedDevice] = {}
+        offset = 0
+        for device in payload["devices"]:
+            device_id = device["id"]
+            count = int(device["count"])
+            entries: list[CorpusEntry] = []
+            keys: list[RowKey] = []
+            for idx in range(offset, offset + count):
+                entries.append(
+                    CorpusEntry(
+                        device_id=device_id,
+                        capability_id=columns["capability_id"][idx],
+                        category=columns["category"][idx],
+                        room=columns["room"][idx],
+                        profile_id=columns["profile_id"][idx],
+                    )
+                )
+                keys.append(row_keys[columns["row"][idx]])
+            offset += count
+            indexed[device_id] = _IndexedDevice(
+                signature=tuple(device["signature"]),  # type: ignore[arg-type]
+                entries=entries,
+                row_keys=keys,
             )
-            profile = profile_id.strip() if isinstance(profile_id, str) else ""
-            parts.append((device.id, profile))
-        return tuple(sorted(parts))
+
+        self._indexed = indexed
+        self._row_keys = row_keys
+        self._row_lookup = {key: row for row, key in enumerate(row_keys)}
+        self._embeddings = matrix if row_keys else None
+        self._float_index = None
+        self._quantized = quantized if row_keys else None
+        self._rebuild_views()
+
+    def _load_matrices(
+        self,
+        directory: str,
+        stored_storage: str | None,
+        mmap: bool,
+    ) -> tuple[NDArray[np.float32] | None, QuantizedMatrix | None]:
+        """按当前存储格式加载 float32 / 量化矩阵，必要时从 float32 重新量化。"""
+        mmap_mode = "r" if mmap else None
+
+        def _load(name: str) -> NDArray | None:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                return None
+            return np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+
+        matrix = _load(INDEX_MATRIX_FILE)
+        quantized: QuantizedMatrix | None = None
+        if self.storage != "float32":
+            codes = _load(INDEX_CODES_FILE) if stored_storage == self.storage else None
+            if codes is not None:
+                quantized = QuantizedMatrix(codes, _load(INDEX_SCALES_FILE))
+            elif matrix is not None:
+                quantized = QuantizedMatrix.from_float(matrix, self.storage)
+            else:
+                raise ValueError(
+                    f"向量索引存储格式不兼容: {stored_storage} -> {self.storage}"
+                )
+
+        if not self._keeps_float:
+            return None, quantized
+        if matrix is None:
+            raise ValueError("向量索引缺少 float32 矩阵，无法精确检索或重排")
+        if self.storage != "float32" and len(matrix) and not isinstance(matrix, np.memmap):
+            # 未使用内存映射加载时，重排用的 float32 行同样落盘，不常驻内存
+            blocks = (
+                matrix[start : start + _SPILL_BLOCK_ROWS]
+                for start in range(0, len(matrix), _SPILL_BLOCK_ROWS)
+            )
+            matrix = self._spill_float_rows(blocks)
+        return matrix, quantized
+
+    def _build_indexed_devices(self, devices: list[Device]) -> dict[str, _IndexedDevice]:
+        """为设备构建条目，并只编码索引中尚不存在的行。"""
+        entries, texts = build_command_corpus(devices, self.spec_index)
+
+        indexed = {
+            device.id: _IndexedDevice(
+                signature=_device_signature(device),
+                entries=[],
+                row_keys=[],
+            )
+            for device in devices
+        }
+        new_rows: dict[RowKey, str] = {}
+        for entry, text in zip(entries, texts):
+            key = corpus_row_key(entry, text)
+            item = indexed[entry.device_id]
+            item.entries.append(entry)
+            item.row_keys.append(key)
+            if key not in self._row_lookup:
+                new_rows.setdefault(key, text)
+
+        self._append_rows(new_rows)
+        return indexed
+
+    def _append_rows(self, rows: dict[RowKey, str]) -> None:
+        """编码新行并追加到向量矩阵。"""
+        if not rows:
+            return
+        # 入库时一次性归一化，检索时只需一次矩阵-向量乘
+        vectors = _normalize_rows(self.encode(list(rows.values())))
+        start = len(self._row_keys)
+        for offset, key in enumerate(rows):
+            self._row_lookup[key] = start + offset
+        self._row_keys.extend(rows)
+        if self.storage != "float32":
+            quantized = QuantizedMatrix.from_float(vectors, self.storage)
+            if self._quantized is None:
+                self._quantized = quantized
+            else:
+                self._quantized = self._quantized.concat(quantized)
+        if self._keeps_float:
+            self._embeddings = self._append_float_rows(vectors)
+
+    def _compact_rows(self) -> None:
+        """删除不再被任何设备引用的行。"""
+        referenced = {key for item in self._indexed.values() for key in item.row_keys}
+        if len(referenced) == len(self._row_keys):
+            return
+
+        keep = [row for row, key in enumerate(self._row_keys) if key in referenced]
+        self._row_keys = [self._row_keys[row] for row in keep]
+        self._row_lookup = {key: row for row, key in enumerate(self._row_keys)}
+        if keep and self._embeddings is not None:
+            self._embeddings = self._take_float_rows(keep)
+        else:
+            self._embeddings = None
+            self._float_index = None
+        if keep and self._quantized is not None:
+            self._quantized = self._quantized.take(keep)
+        else:
+            self._quantized = None
+
+    def _rebuild_views(self) -> None:
+        """重建检索用的扁平视图与 device_id 倒排映射。
+
+        - entries / entry_rows：条目及其对应的向量行
+        - device_codes / entry_devices：设备编码及条目所属设备
+        """
+        entries: list[CorpusEntry] = []
+        entry_rows: list[int] = []
+        entry_devices: list[int] = []
+        device_codes: dict[str, int] = {}
+        for device_id, item in self._indexed.items():
+            code = device_codes.setdefault(device_id, len(device_codes))
+            entries.extend(item.entries)
+            entry_rows.extend(self._row_lookup[key] for key in item.row_keys)
+            entry_devices.extend([code] * len(item.entries))
+
+        self._entries = entries
+        self._entry_rows = np.asarray(entry_rows, dtype=np.intp)
+        self._entry_devices = np.asarray(entry_devices, dtype=np.intp)
+        self._device_codes = device_codes
+        self._index_version += 1
+
+    def filter_entry_indices(self, device_ids: set[str]) -> NDArray[np.intp]:
+        """将设备过滤集合转换为条目下标数组。
+
+        只遍历过滤集合本身，条目级筛选通过布尔掩码在 NumPy 中完成。
+        """
+        codes = [
+            code
+            for code in (self._device_codes.get(device_id) for device_id in device_ids)
+            if code is not None
+        ]
+        if not codes:
+            return np.zeros(0, dtype=np.intp)
+        device_mask = np.zeros(len(self._device_codes), dtype=bool)
+        device_mask[codes] = True
+        return np.flatnonzero(device_mask[self._entry_devices])
 
     def search(
         self,
@@ -213,37 +889,146 @@ class DashScopeVectorSearcher(VectorSearcher):
         device_ids: set[str] | None = None,
     ) -> list[Candidate]:
         """执行向量检索。"""
-        if self._embeddings is None or len(self._entries) == 0:
-            return []
-
-        entries = self._entries
-        embeddings = self._embeddings
-        if device_ids:
-            indices = [
-                idx
-                for idx, entry in enumerate(entries)
-                if entry.device_id in device_ids
-            ]
-            if not indices:
-                return []
-            entries = [entries[idx] for idx in indices]
-            embeddings = embeddings[indices]
+        return self.search_many([query], top_k=top_k, device_ids_per_query=[device_ids])[0]
 
-        query_embedding = self.encode([query])[0]
+    def search_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """批量执行向量检索。
 
-        # 余弦相似度
-        query_norm = query_embedding / (np.linalg.norm(query_embedding) + 1e-8)
-        corpus_norm = embeddings / (
-            np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8
-        )
-        similarities = corpus_norm @ query_norm
+        所有查询文本合并为一次 embedding 请求，并用一次矩阵-矩阵乘完成打分。
+        """
+        results, pending = self._plan_search(queries, device_ids_per_query)
+        if pending:
+            query_norms = self.query_vectors([queries[position] for position, _ in pending])
+            self._rank_pending(results, pending, query_norms, top_k)
+        return results
+
+    async def asearch_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """异步批量执行向量检索。
+
+        只有查询编码需要等待 embedding 后端；打分是内存中的矩阵运算，直接在调用方完成。
+        """
+        results, pending = self._plan_search(queries, device_ids_per_query)
+        if pending:
+            query_norms = await self.aquery_vectors(
+                [queries[position] for position, _ in pending]
+            )
+            self._rank_pending(results, pending, query_norms, top_k)
+        return results
+
+    def _plan_search(
+        self,
+        queries: list[str],
+        device_ids_per_query: list[set[str] | None] | None,
+    ) -> tuple[list[list[Candidate]], list[tuple[int, NDArray[np.intp] | None]]]:
+        """解析设备过滤，返回空结果列表与需要编码的 (查询位置, 条目下标) 列表。"""
+        filters = _expand_device_filters(queries, device_ids_per_query)
+        results: list[list[Candidate]] = [[] for _ in queries]
+        if self.row_count == 0 or len(self._entries) == 0:
+            return results, []
+
+        pending: list[tuple[int, NDArray[np.intp] | None]] = []
+        for position, device_ids in enumerate(filters):
+            entry_indices: NDArray[np.intp] | None = None
+            if device_ids:
+                entry_indices = self.filter_entry_indices(device_ids)
+                if entry_indices.shape[0] == 0:
+                    continue
+            pending.append((position, entry_indices))
+        return results, pending
+
+    def _rank_pending(
+        self,
+        results: list[list[Candidate]],
+        pending: list[tuple[int, NDArray[np.intp] | None]],
+        query_norms: NDArray[np.float32],
+        top_k: int,
+    ) -> None:
+        """为已编码的查询打分并写入 results。"""
+        # 余弦相似度：行向量已归一化，先在共享行上计算，再展开到设备条目
+        row_scores = self._row_scores(query_norms.T)
+        for column, (position, entry_indices) in enumerate(pending):
+            results[position] = self._select_top(
+                query_norms[column],
+                row_scores[:, column],
+                top_k,
+                entry_indices,
+            )
 
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+    def _select_top(
+        self,
+        query_norm: NDArray[np.float32],
+        row_scores: NDArray[np.float32],
+        top_k: int,
+        entry_indices: NDArray[np.intp] | None,
+    ) -> list[Candidate]:
+        """将行分数展开到（过滤后的）条目并选出 top_k 候选。"""
+        entry_rows = self._entry_rows
+        if entry_indices is not None:
+            entry_rows = entry_rows[entry_indices]
+        similarities = row_scores[entry_rows]
+
+        if self.rescore and self._embeddings is not None:
+            # 量化分数只用于粗排，候选池再用 float32 行精确重排
+            pool = _top_k_indices(similarities, top_k * self.rescore_multiplier)
+            exact = self._float_rows(entry_rows[pool]) @ query_norm
+            order = _top_k_indices(exact, top_k)
+            top_indices = pool[order]
+            top_scores = exact[order]
+        else:
+            top_indices = _top_k_indices(similarities, top_k)
+            top_scores = similarities[top_indices]
+
+        if entry_indices is not None:
+            top_indices = entry_indices[top_indices]
+        return self.build_candidates(top_indices, top_scores)
+
+    def query_vector(self, query: str) -> NDArray[np.float32]:
+        """编码并归一化查询文本。"""
+        return self.query_vectors([query])[0]
+
+    def query_vectors(self, queries: list[str]) -> NDArray[np.float32]:
+        """批量编码并归一化查询文本，shape=(len(queries), dim)。"""
+        return _normalize_rows(self._embed_queries(queries))
+
+    async def aquery_vectors(self, queries: list[str]) -> NDArray[np.float32]:
+        """异步批量编码并归一化查询文本，shape=(len(queries), dim)。"""
+        return _normalize_rows(await self._aembed_queries(queries))
+
+    def score_rows(
+        self,
+        query_norm: NDArray[np.float32],
+        rows: NDArray[np.intp],
+    ) -> NDArray[np.float32]:
+        """只计算指定向量行的相似度（保留 float32 行时使用精确分数）。
 
+        query_norm 可以是单个向量 (dim,) 或按列排列的多个查询 (dim, n)。
+        """
+        if self._embeddings is not None:
+            return self._float_rows(rows) @ query_norm
+        if self._quantized is not None:
+            return self._quantized.take(rows).dot(query_norm)
+        return np.zeros(0, dtype=np.float32)
+
+    def build_candidates(
+        self,
+        entry_indices: NDArray[np.intp],
+        scores: NDArray[np.float32],
+    ) -> list[Candidate]:
+        """将条目下标与分数转换为候选列表。"""
         candidates = []
-        for idx in top_indices:
-            score = float(similarities[idx])
-            entry = entries[idx]
+        for entry_idx, raw_score in zip(entry_indices, scores):
+            score = float(raw_score)
+            entry = self._entries[entry_idx]
             candidates.append(
                 Candidate(
                     entity_id=entry.device_id,
@@ -257,9 +1042,71 @@ class DashScopeVectorSearcher(VectorSearcher):
 
         return candidates
 
+    def _row_scores(self, query_norm: NDArray[np.float32]) -> NDArray[np.float32]:
+        """计算查询向量（或按列排列的多个查询）与每个共享行的相似度。
+
+        量化模式下使用压缩矩阵。
+        """
+        if self._quantized is not None:
+            return self._quantized.dot(query_norm)
+        return self._embeddings @ query_norm
+
+    def _embed_queries(self, queries: list[str]) -> NDArray[np.float32]:
+        """编码查询文本，优先命中进程内 LRU。
+
+        未命中的查询去重后合并为一次 embedding 请求；
+        查询向量不写入持久化缓存，避免缓存文件随查询频繁重写。
+        """
+        vectors, missing = self._cached_query_vectors(queries)
+        if missing:
+            self._store_query_vectors(vectors, missing, self._request_embeddings(missing))
+        return np.vstack([vectors[query] for query in queries])
+
+    async def _aembed_queries(self, queries: list[str]) -> NDArray[np.float32]:
+        """异步编码查询文本，缓存策略同 _embed_queries。"""
+        vectors, missing = self._cached_query_vectors(queries)
+        if missing:
+            fetched = await self._arequest_embeddings(missing)
+            self._store_query_vectors(vectors, missing, fetched)
+        return np.vstack([vectors[query] for query in queries])
+
+    def _cached_query_vectors(
+        self,
+        queries: list[str],
+    ) -> tuple[dict[str, NDArray[np.float32]], list[str]]:
+        """查询进程内 LRU，返回 (已命中的向量, 去重后未命中的查询)。"""
+        cache = self.query_cache
+        vectors: dict[str, NDArray[np.float32]] = {}
+        missing: list[str] = []
+        for query in queries:
+            if query in vectors or query in missing:
+                continue
+            cached = cache.get(self.model, query) if cache is not None else None
+            if cached is not None:
+                vectors[query] = cached
+            else:
+                missing.append(query)
+        return vectors, missing
+
+    def _store_query_vectors(
+        self,
+        vectors: dict[str, NDArray[np.float32]],
+        missing: list[str],
+        fetched: NDArray[np.float32],
+    ) -> None:
+        """将新编码的查询向量写入结果与进程内 LRU。"""
+        cache = self.query_cache
+        for query, vector in zip(missing, fetched):
+            vectors[query] = vector
+            if cache is not None:
+                cache.put(self.model, query, vector)
+
     def encode(self, texts: list[str], batch_size: int = 10) -> NDArray[np.float32]:
         """编码文本列表为向量数组。
 
+        配置了 embedding 缓存时先查缓存，仅将未命中的文本（去重后）发送给 embedding 后端，
+        并把新结果写回缓存文件。
+
         Args:
             texts: 文本列表
             batch_size: 每批处理的文本数量，dashscope 限制最大 10
@@ -270,45 +1117,289 @@ class DashScopeVectorSearcher(VectorSearcher):
         if not texts:
             return np.zeros((0, 0), dtype=np.float32)
 
-        all_vectors = []
+        cache = self._embedding_cache
+        if cache is None:
+            return self._request_embeddings(texts, batch_size)
 
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
+        vectors = [cache.get(self.model, text) for text in texts]
+        missing = list(
+            dict.fromkeys(text for text, vec in zip(texts, vectors) if vec is None)
+        )
+        if missing:
+            fetched = self._request_embeddings(missing, batch_size)
+            if len(fetched) != len(missing):
+                raise ValueError(
+                    f"embedding 数量不一致: {len(fetched)} != {len(missing)}"
+                )
+            fetched_map = dict(zip(missing, fetched))
+            for text, vector in fetched_map.items():
+                cache.put(self.model, text, vector)
+            cache.save_if_needed()
+            vectors = [
+                vec if vec is not None else fetched_map[text]
+                for text, vec in zip(texts, vectors)
+            ]
 
-            response = self._embedding.call(
-                model=self.model,
-                input=batch,
-            )
-            self._ensure_success(response)
+        return np.vstack(vectors)
 
-            output = getattr(response, "output", None)
-            if output is None and hasattr(response, "get"):
-                output = response.get("output", {})
-            if output is None:
-                output = {}
+    @abstractmethod
+    def _request_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 10,
+    ) -> NDArray[np.float32]:
+        """调用 embedding 后端生成向量（不经过缓存）。
 
-            embeddings = None
-            if hasattr(output, "get"):
-                embeddings = output.get("embeddings")
-            elif isinstance(output, dict):
-                embeddings = output.get("embeddings")
+        Args:
+            texts: 文本列表
+            batch_size: 每批处理的文本数量（远程后端使用）
 
-            if not embeddings:
-                raise ValueError(
-                    f"dashscope 未返回 embeddings 结果 (batch {i // batch_size})"
+        Returns:
+            向量数组，shape=(len(texts), dim)
+        """
+        ...
+
+    async def _arequest_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 10,
+    ) -> NDArray[np.float32]:
+        """异步调用 embedding 后端，默认在线程中执行 _request_embeddings。"""
+        return await asyncio.to_thread(self._request_embeddings, texts, batch_size)
+
+
+class DashScopeVectorSearcher(EmbeddingVectorSearcher):
+    """基于 DashScope embedding 的向量检索器。
+
+    使用 text-embedding-v4 模型生成向量，支持命令级索引。
+    """
+
+    def __init__(
+        self,
+        spec_index: dict[str, list[CapabilityDoc]] | None = None,
+        model: str = "text-embedding-v4",
+        api_key: str | None = None,
+        embedding_client: Any | None = None,
+        aio_embedding_client: Any | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        query_cache_size: int = 256,
+        query_cache_ttl: float | None = 600.0,
+        max_workers: int = 1,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        storage: StorageMode = "float32",
+        rescore: bool = False,
+        rescore_multiplier: int = 4,
+        rescore_dir: str | None = None,
+    ):
+        """初始化。
+
+        Args:
+            spec_index: profile_id -> CapabilityDoc 列表的映射
+            model: 模型名称，默认 text-embedding-v4
+            api_key: API Key，未提供时从 `DASHSCOPE_API_KEY` 读取
+            embedding_client: 可注入的 embedding 客户端，便于测试
+            aio_embedding_client: 可选的异步 embedding 客户端（call 为协程），
+                提供时异步检索直接 await；dashscope SDK 未提供异步文本 embedding 接口，
+                缺省时异步检索在线程中调用同步客户端
+            embedding_cache: 可选的持久化 embedding 缓存，仅未命中的文本会请求 dashscope
+            query_cache_size: 查询向量 LRU 容量，0 表示关闭
+            query_cache_ttl: 查询向量缓存有效期（秒），None 表示不过期
+            max_workers: 构建索引（或异步编码）时并发请求的批次数上限，1 表示串行
+            max_retries: 单个批次遇到瞬时错误时的最大重试次数
+            retry_backoff: 重试的初始退避时间（秒），每次重试翻倍
+            storage: 向量存储格式，float32 / float16 / int8（按行缩放）
+            rescore: 量化存储时是否保留 float32 行（落盘后以内存映射读取），对粗排候选做精确重排
+            rescore_multiplier: 重排候选数为 top_k 的倍数
+            rescore_dir: 重排用 float32 行的落盘目录，None 时使用系统临时目录
+        """
+        super().__init__(
+            spec_index=spec_index,
+            model=model,
+            embedding_cache=embedding_cache,
+            query_cache_size=query_cache_size,
+            query_cache_ttl=query_cache_ttl,
+            storage=storage,
+            rescore=rescore,
+            rescore_multiplier=rescore_multiplier,
+            rescore_dir=rescore_dir,
+        )
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self._aio_embedding = aio_embedding_client
+
+        if embedding_client is not None:
+            self._embedding = embedding_client
+            return
+
+        try:
+            import dashscope
+        except ImportError as exc:
+            raise ImportError(
+                "需要安装 dashscope 才能使用 DashScopeVectorSearcher"
+            ) from exc
+
+        api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+        if api_key:
+            dashscope.api_key = api_key
+
+        embedding_class = getattr(dashscope, "TextEmbedding", None)
+        if embedding_class is None:
+            try:
+                from dashscope import embeddings as embedding_mod
+
+                embedding_class = getattr(embedding_mod, "Embedding")
+            except Exception as exc:
+                raise ImportError(
+                    "未找到 dashscope TextEmbedding/Embedding 接口"
+                ) from exc
+
+        self._embedding = embedding_class
+
+    def _request_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 10,
+    ) -> NDArray[np.float32]:
+        """按批调用 dashscope 生成向量（不经过缓存）。
+
+        max_workers > 1 时批次通过有界线程池并发发送，结果按输入顺序拼接。
+        """
+        batches = [
+            texts[i : i + batch_size] for i in range(0, len(texts), batch_size)
+        ]
+
+        if self.max_workers > 1 and len(batches) > 1:
+            workers = min(self.max_workers, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                batch_vectors = list(
+                    executor.map(self._request_batch_with_retry, batches, range(len(batches)))
                 )
+        else:
+            batch_vectors = [
+                self._request_batch_with_retry(batch, batch_no)
+                for batch_no, batch in enumerate(batches)
+            ]
 
-            for item in embeddings:
-                if not isinstance(item, dict):
-                    continue
-                vector = item.get("embedding")
-                if vector is not None:
-                    all_vectors.append(np.asarray(vector, dtype=np.float32))
+        return _stack_batches(batch_vectors)
+
+    async def _arequest_embeddings(
+        self,
+        texts: list[str],
+        batch_size: int = 10,
+    ) -> NDArray[np.float32]:
+        """异步按批调用 dashscope，批次并发数受 max_workers 限制。
+
+        未注入异步客户端时退回线程执行。
+        """
+        if self._aio_embedding is None:
+            return await super()._arequest_embeddings(texts, batch_size)
+
+        batches = [
+            texts[i : i + batch_size] for i in range(0, len(texts), batch_size)
+        ]
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def request(batch: list[str], batch_no: int) -> list[NDArray[np.float32]]:
+            async with semaphore:
+                return await self._arequest_batch_with_retry(batch, batch_no)
+
+        batch_vectors = await asyncio.gather(
+            *(request(batch, batch_no) for batch_no, batch in enumerate(batches))
+        )
+        return _stack_batches(batch_vectors)
+
+    async def _arequest_batch_with_retry(
+        self,
+        batch: list[str],
+        batch_no: int,
+    ) -> list[NDArray[np.float32]]:
+        """异步请求单个批次，重试策略同 _request_batch_with_retry。"""
+        attempt = 0
+        while True:
+            try:
+                response = await self._aio_embedding.call(model=self.model, input=batch)
+                return self._parse_batch(response, batch_no)
+            except _RETRYABLE_ERRORS as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2**attempt)
+                logger.warning(
+                    "embedding_retry batch=%s attempt=%s delay=%.2f error=%s",
+                    batch_no,
+                    attempt + 1,
+                    delay,
+                    exc,
+                )
+                attempt += 1
+                if delay > 0:
+                    await asyncio.sleep(delay)
 
-        if not all_vectors:
-            raise ValueError("dashscope 返回的 embedding 为空")
+    def _request_batch_with_retry(
+        self,
+        batch: list[str],
+        batch_no: int,
+    ) -> list[NDArray[np.float32]]:
+        """请求单个批次，遇到瞬时错误时按指数退避重试。"""
+        attempt = 0
+        while True:
+            try:
+                return self._request_batch(batch, batch_no)
+            except _RETRYABLE_ERRORS as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2**attempt)
+                logger.warning(
+                    "embedding_retry batch=%s attempt=%s delay=%.2f error=%s",
+                    batch_no,
+                    attempt + 1,
+                    delay,
+                    exc,
+                )
+                attempt += 1
+                if delay > 0:
+                    time.sleep(delay)
 
-        return np.vstack(all_vectors)
+    def _request_batch(
+        self,
+        batch: list[str],
+        batch_no: int,
+    ) -> list[NDArray[np.float32]]:
+        """调用 dashscope 编码单个批次。"""
+        response = self._embedding.call(
+            model=self.model,
+            input=batch,
+        )
+        return self._parse_batch(response, batch_no)
+
+    def _parse_batch(self, response: Any, batch_no: int) -> list[NDArray[np.float32]]:
+        """校验响应并提取单个批次的向量。"""
+        self._ensure_success(response)
+
+        output = getattr(response, "output", None)
+        if output is None and hasattr(response, "get"):
+            output = response.get("output", {})
+        if output is None:
+            output = {}
+
+        embeddings = None
+        if hasattr(output, "get"):
+            embeddings = output.get("embeddings")
+        elif isinstance(output, dict):
+            embeddings = output.get("embeddings")
+
+        if not embeddings:
+            raise ValueError(f"dashscope 未返回 embeddings 结果 (batch {batch_no})")
+
+        vectors: list[NDArray[np.float32]] = []
+        for item in embeddings:
+            if not isinstance(item, dict):
+                continue
+            vector = item.get("embedding")
+            if vector is not None:
+                vectors.append(np.asarray(vector, dtype=np.float32))
+        return vectors
 
     def _ensure_success(self, response: Any) -> None:
         """校验 dashscope 响应状态。"""
@@ -317,9 +1408,109 @@ class DashScopeVectorSearcher(VectorSearcher):
             message = getattr(response, "message", "") or getattr(
                 response, "error", ""
             )
+            if status in _TRANSIENT_STATUS_CODES:
+                raise TransientEmbeddingError(f"dashscope 调用失败: {status} {message}")
             raise RuntimeError(f"dashscope 调用失败: {status} {message}")
 
 
+def _stack_batches(batch_vectors: list[list[NDArray[np.float32]]]) -> NDArray[np.float32]:
+    """按批次顺序拼接向量。"""
+    all_vectors = [vector for vectors in batch_vectors for vector in vectors]
+    if not all_vectors:
+        raise ValueError("dashscope 返回的 embedding 为空")
+    return np.vstack(all_vectors)
+
+
+# 重试耗尽后抛出的网络异常同样触发降级
+_BACKEND_ERRORS = (RuntimeError, ValueError, OSError, *_NETWORK_ERRORS)
+
+
+class FallbackVectorSearcher(VectorSearcher):
+    """带降级的向量检索器。
+
+    优先使用主检索器（如 DashScope）；主检索器索引或检索失败时记录告警，
+    改用备用检索器（如本地哈希 embedding）返回结果。
+    """
+
+    def __init__(self, primary: VectorSearcher, fallback: VectorSearcher):
+        """初始化。
+
+        Args:
+            primary: 主检索器
+            fallback: 备用检索器（需可离线工作）
+        """
+        self.primary = primary
+        self.fallback = fallback
+        self.degraded = False
+        self._primary_ready = False
+
+    @property
+    def spec_index(self) -> dict[str, list[CapabilityDoc]]:
+        """主检索器的 spec index（bulk 模式依赖）。"""
+        spec_index = getattr(self.primary, "spec_index", None)
+        if not spec_index:
+            spec_index = getattr(self.fallback, "spec_index", None)
+        return spec_index or {}
+
+    @property
+    def exact_filtering(self) -> bool:
+        """主、备检索器都精确过滤时成立（检索时可能随时降级）。"""
+        return self.primary.exact_filtering and self.fallback.exact_filtering
+
+    def index(self, devices: list[Device]) -> None:
+        """同时索引主、备检索器；主检索器失败时后续检索直接降级。"""
+        self.fallback.index(devices)
+        try:
+            self.primary.index(devices)
+            self._primary_ready = True
+        except _BACKEND_ERRORS as exc:
+            logger.warning("vector_fallback stage=index error=%s", exc)
+            self._primary_ready = False
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        device_ids: set[str] | None = None,
+    ) -> list[Candidate]:
+        """执行向量检索，主检索器失败时降级。"""
+        return self.search_many([query], top_k=top_k, device_ids_per_query=[device_ids])[0]
+
+    def search_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """批量执行向量检索，主检索器失败时整批降级。"""
+        if self._primary_ready:
+            try:
+                results = self.primary.search_many(queries, top_k, device_ids_per_query)
+                self.degraded = False
+                return results
+            except _BACKEND_ERRORS as exc:
+                logger.warning("vector_fallback stage=search error=%s", exc)
+        self.degraded = True
+        return self.fallback.search_many(queries, top_k, device_ids_per_query)
+
+    async def asearch_many(
+        self,
+        queries: list[str],
+        top_k: int = 10,
+        device_ids_per_query: list[set[str] | None] | None = None,
+    ) -> list[list[Candidate]]:
+        """异步批量执行向量检索，主检索器失败时整批降级。"""
+        if self._primary_ready:
+            try:
+                results = await self.primary.asearch_many(queries, top_k, device_ids_per_query)
+                self.degraded = False
+                return results
+            except _BACKEND_ERRORS as exc:
+                logger.warning("vector_fallback stage=search error=%s", exc)
+        self.degraded = True
+        return await self.fallback.asearch_many(queries, top_k, device_ids_per_query)
+
+
 class StubVectorSearcher(VectorSearcher):
     """Stub 向量检索器（用于测试）。
 
@@ -346,6 +1537,11 @@ class StubVectorSearcher(VectorSearcher):
         self.last_query: str | None = None
         self.last_device_ids: set[str] | None = None
 
+    @property
+    def exact_filtering(self) -> bool:
+        """预设结果按设备集合直接过滤。"""
+        return True
+
     def index(self, devices: list[Device]) -> None:
         """索引设备（Stub 实现）。"""
         self.devices = devices
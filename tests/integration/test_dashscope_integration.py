@@ -153,7 +153,7 @@ def filter_queries_by_capabilities(
 
 
 def _device_profile_id(device: Device) -> str | None:
-    profile_id = getattr(device, "profile_id", None) or getattr(device, "profileId", None)
+    profile_id = device.profile_id
     if isinstance(profile_id, str) and profile_id.strip():
         return profile_id.strip()
     return None
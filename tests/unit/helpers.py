@@ -0,0 +1,19 @@
+"""单元测试共用的构造函数。"""
+
+from context_retrieval.models import Device
+
+
+def profiled_device(device_id: str, profile_id: str, room: str = "客厅") -> Device:
+    """构造带 profile_id 的测试设备。
+
+    Args:
+        device_id: 设备 ID，同时用作设备名称。
+        profile_id: 设备的 profile ID。
+        room: 设备所在房间。
+
+    Returns:
+        类别为 Light 的设备。
+    """
+    device = Device(id=device_id, name=device_id, room=room, category="Light")
+    device.profile_id = profile_id  # type: ignore[attr-defined]
+    return device
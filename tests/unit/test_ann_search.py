@@ -0,0 +1,212 @@
+"""IVF 近似向量检索测试。"""
+
+import asyncio
+import hashlib
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from context_retrieval.ann_search import IVFVectorSearcher, spherical_kmeans
+from context_retrieval.models import Device
+from context_retrieval.vector_search import DashScopeVectorSearcher
+
+ROOMS = ("客厅", "卧室", "书房", "厨房", "阳台", "餐厅", "车库", "浴室")
+QUERIES = tuple(f"打开{room}的设备" for room in ROOMS)
+
+
+class ClusteredEmbeddingClient:
+    """按文本中出现的房间生成聚簇向量（簇中心 + 文本哈希噪声）。"""
+
+    def __init__(self, dim: int = 32):
+        rng = np.random.default_rng(42)
+        self.centers = rng.standard_normal((len(ROOMS), dim))
+        self.dim = dim
+
+    def call(self, model: str, input: list[str], **kwargs):
+        embeddings = []
+        for text in input:
+            room = next((i for i, name in enumerate(ROOMS) if name in text), 0)
+            seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+            noise = np.random.default_rng(seed).standard_normal(self.dim)
+            embeddings.append({"embedding": (self.centers[room] + 0.5 * noise).tolist()})
+        return type(
+            "Resp",
+            (),
+            {"status_code": 200, "output": {"embeddings": embeddings}, "message": ""},
+        )
+
+
+def _devices(count: int = 400) -> list[Device]:
+    return [
+        Device(
+            id=f"dev-{i}",
+            name=f"设备{i}",
+            room=ROOMS[i % len(ROOMS)],
+            category="Light",
+        )
+        for i in range(count)
+    ]
+
+
+def _ivf(**kwargs) -> IVFVectorSearcher:
+    base = DashScopeVectorSearcher(embedding_client=ClusteredEmbeddingClient())
+    searcher = IVFVectorSearcher(base, exact_threshold=0, **kwargs)
+    searcher.index(_devices())
+    return searcher
+
+
+class TestSphericalKMeans(unittest.TestCase):
+    """测试球面 k-means。"""
+
+    def test_centroids_are_normalized(self):
+        """簇中心归一化且数量不超过样本数。"""
+        vectors = np.random.default_rng(0).standard_normal((20, 4)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        centroids = spherical_kmeans(vectors, 50)
+
+        self.assertEqual(centroids.shape, (20, 4))
+        np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-4)
+
+
+class TestIVFVectorSearcher(unittest.TestCase):
+    """测试 IVFVectorSearcher。"""
+
+    def test_lists_cover_every_entry(self):
+        """倒排列表覆盖全部设备条目且互不重叠。"""
+        searcher = _ivf()
+        entries = np.concatenate(searcher._inverted.lists)
+
+        self.assertEqual(searcher.list_count, int(np.sqrt(searcher.base.row_count)))
+        self.assertEqual(
+            sorted(entries.tolist()), list(range(searcher.base.entry_rows.shape[0]))
+        )
+
+    def test_recall_against_exact_search(self):
+        """聚簇数据上近似检索的召回率接近精确检索。"""
+        searcher = _ivf(nprobe=4)
+
+        self.assertGreaterEqual(searcher.evaluate_recall(QUERIES, top_k=10), 0.9)
+
+    def test_probing_all_lists_is_exact(self):
+        """探测全部簇时结果与精确检索一致。"""
+        searcher = _ivf(nprobe=1000)
+
+        self.assertEqual(searcher.evaluate_recall(QUERIES, top_k=10), 1.0)
+        expected = searcher.base.search(QUERIES[0], top_k=5)
+        actual = searcher.search(QUERIES[0], top_k=5)
+        self.assertEqual(
+            [(c.entity_id, c.vector_score) for c in actual],
+            [(c.entity_id, c.vector_score) for c in expected],
+        )
+
+    def test_asearch_many_matches_search_many(self):
+        """异步批量检索与同步结果一致（含精确与近似两组查询）。"""
+        searcher = _ivf(nprobe=2)
+        filters = [None, {"dev-3", "dev-11"}]
+
+        expected = searcher.search_many(QUERIES[:2], top_k=5, device_ids_per_query=filters)
+        actual = asyncio.run(
+            searcher.asearch_many(QUERIES[:2], top_k=5, device_ids_per_query=filters)
+        )
+
+        self.assertEqual(
+            [[(c.entity_id, c.vector_score) for c in r] for r in actual],
+            [[(c.entity_id, c.vector_score) for c in r] for r in expected],
+        )
+
+    def test_device_filter_expands_probes(self):
+        """设备过滤后探测结果不足时扩大探测范围，只返回过滤集合内的设备。"""
+        searcher = _ivf(nprobe=1)
+        allowed = {"dev-3", "dev-11", "dev-200"}
+
+        results = searcher.search(QUERIES[0], top_k=3, device_ids=allowed)
+
+        self.assertEqual({c.entity_id for c in results}, allowed)
+
+    def test_small_candidate_set_uses_exact_search(self):
+        """条目数不超过阈值时退化为精确检索。"""
+        base = DashScopeVectorSearcher(embedding_client=ClusteredEmbeddingClient())
+        searcher = IVFVectorSearcher(base, nprobe=1)
+        searcher.index(_devices(50))
+
+        self.assertEqual(searcher.evaluate_recall(QUERIES, top_k=10), 1.0)
+
+    def test_incremental_updates_reassign_rows(self):
+        """增量更新后新设备可被检索，删除的设备不再返回。"""
+        searcher = _ivf(nprobe=1000)
+        searcher.add_devices([Device(id="new-1", name="新灯", room="客厅", category="Light")])
+        searcher.remove_devices(["dev-0"])
+
+        ids = {c.entity_id for c in searcher.search(QUERIES[0], top_k=1000)}
+
+        self.assertIn("new-1", ids)
+        self.assertNotIn("dev-0", ids)
+        self.assertEqual(
+            sum(len(entries) for entries in searcher._inverted.lists),
+            searcher.base.entry_rows.shape[0],
+        )
+
+    def test_probe_scores_only_probed_lists(self):
+        """近似检索只为探测到的簇内行打分，不对全部行打分。"""
+        searcher = _ivf(nprobe=1)
+        base = searcher.base
+        scored: list[int] = []
+        score_rows = base.score_rows
+
+        def recording_score_rows(query_norm, rows):
+            scored.append(len(rows))
+            return score_rows(query_norm, rows)
+
+        with mock.patch.object(base, "score_rows", side_effect=recording_score_rows):
+            results = searcher.search(QUERIES[0], top_k=5)
+
+        self.assertEqual(len(results), 5)
+        self.assertLess(sum(scored), base.row_count // 2)
+
+    def test_incremental_rebuild_does_not_dequantize_rows(self):
+        """量化存储下增量更新只按块打分分配簇，不反量化整个矩阵。"""
+        base = DashScopeVectorSearcher(
+            embedding_client=ClusteredEmbeddingClient(), storage="int8"
+        )
+        searcher = IVFVectorSearcher(base, nprobe=2, exact_threshold=0)
+        searcher.index(_devices())
+
+        with mock.patch.object(base, "row_vectors", side_effect=AssertionError):
+            searcher.add_devices([Device(id="new-1", name="新灯", room="客厅", category="Light")])
+            searcher.remove_devices(["dev-0"])
+            ids = {c.entity_id for c in searcher.search(QUERIES[0], top_k=1000)}
+
+        self.assertIn("new-1", ids)
+        self.assertNotIn("dev-0", ids)
+
+    def test_concurrent_searches_rebuild_once(self):
+        """精确检索器被直接修改后，并发检索只重建一次倒排列表。"""
+        searcher = _ivf(nprobe=2)
+        searcher.base.add_devices(
+            [Device(id="new-1", name="新灯", room="客厅", category="Light")]
+        )
+        rebuild = searcher._rebuild
+        calls: list[int] = []
+
+        def slow_rebuild(retrain):
+            calls.append(threading.get_ident())
+            time.sleep(0.05)
+            rebuild(retrain)
+
+        with mock.patch.object(searcher, "_rebuild", side_effect=slow_rebuild):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(
+                    executor.map(lambda query: searcher.search(query, top_k=3), QUERIES)
+                )
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(len(candidates) == 3 for candidates in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,15 @@
 """Bulk mode tests for quantifier semantics."""
 
+import asyncio
 import os
+import threading
 import unittest
 from unittest import mock
 
 from context_retrieval.doc_enrichment import CapabilityDoc
 from context_retrieval.ir_compiler import FakeLLM
 from context_retrieval.models import Device, ValueRange
-from context_retrieval.pipeline import retrieve_single
+from context_retrieval.pipeline import aretrieve, retrieve, retrieve_single
 from context_retrieval.state import ConversationState
 from context_retrieval.vector_search import StubVectorSearcher
 
@@ -23,6 +25,18 @@ class ArbitrationLLM(FakeLLM):
         return self._arbitration_response
 
 
+class BarrierArbitrationLLM(FakeLLM):
+    """仲裁调用在屏障处等待，只有多条命令的仲裁同时进行时才能通过。"""
+
+    def __init__(self, preset_responses, parties: int):
+        super().__init__(preset_responses=preset_responses)
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def parse_with_prompt(self, text: str, system_prompt: str):  # type: ignore[override]
+        self.barrier.wait()
+        return {"choice_index": 0}
+
+
 def _device(device_id: str, profile_id: str, category: str = "Light") -> Device:
     dev = Device(id=device_id, name=device_id, room="R", category=category)
     dev.profile_id = profile_id  # type: ignore[attr-defined]
@@ -112,6 +126,43 @@ class TestBulkMode(unittest.TestCase):
         batches = result.batches.get(result.groups[0].id)
         self.assertEqual(batches, [["d1", "d2"]])
 
+    def test_arbitration_runs_concurrently_across_commands(self):
+        """多条 bulk 命令的 LLM 仲裁并发执行，结果仍按命令顺序返回。"""
+        devices = [_device("d1", "p1"), _device("d2", "p1")]
+        command = {"a": "打开", "s": "*", "n": "灯", "t": "Light", "q": "all"}
+        spec_index = {
+            "p1": [
+                CapabilityDoc(id="cap-on", description="打开"),
+                CapabilityDoc(id="cap-off", description="关闭"),
+            ]
+        }
+        vector = StubVectorSearcher(
+            stub_results={"打开": [("d1", "cap-on", 0.90), ("d2", "cap-off", 0.89)]},
+            spec_index=spec_index,
+        )
+        presets = {"打开所有灯": [command, command]}
+
+        with mock.patch.dict(os.environ, {"ENABLE_BULK_ARBITRATION_LLM": "1"}):
+            results = retrieve(
+                text="打开所有灯",
+                devices=devices,
+                llm=BarrierArbitrationLLM(presets, parties=2),
+                state=ConversationState(),
+                vector_searcher=vector,
+            )
+            async_results = asyncio.run(
+                aretrieve(
+                    text="打开所有灯",
+                    devices=devices,
+                    llm=BarrierArbitrationLLM(presets, parties=2),
+                    state=ConversationState(),
+                    vector_searcher=vector,
+                )
+            )
+
+        for batch in (results, async_results):
+            self.assertEqual([r.selected_capability_id for r in batch], ["cap-on", "cap-on"])
+
     def test_arbitration_invalid_choice_index_returns_need_clarification(self):
         devices = [_device("d1", "p1"), _device("d2", "p1")]
         llm = ArbitrationLLM(
@@ -1,10 +1,12 @@
 """Tests for command parser."""
 
 import unittest
+from unittest import mock
 
 from command_parser import (
     CommandParser,
     CommandParserConfig,
+    CommandStreamParser,
     UNKNOWN_COMMAND,
     parse_command_output,
 )
@@ -160,5 +162,75 @@ class TestPromptRegressionCases(unittest.TestCase):
                     self.assertIn(key, item)
 
 
+
+class TestCommandStreamParser(unittest.TestCase):
+    """Unit tests for incremental command parsing."""
+
+    OUTPUT = (
+        '[{"a":"打开","s":"卧室","n":"顶{灯}","t":"Light","q":"one"},'
+        ' {"a":"关闭","s":["客厅"],"n":"灯\\"","t":"Light","q":"all"}]'
+    )
+
+    def _feed(self, parser, text, size):
+        emitted = []
+        for start in range(0, len(text), size):
+            emitted.append(parser.feed(text[start : start + size]))
+        return emitted
+
+    def test_emits_each_object_when_it_closes(self):
+        parser = CommandStreamParser()
+        first_end = self.OUTPUT.index("},") + 1
+
+        self.assertEqual(parser.feed(self.OUTPUT[: first_end - 1]), [])
+        first = parser.feed(self.OUTPUT[first_end - 1 : first_end])
+        self.assertEqual([cmd.target.name for cmd in first], ["顶{灯}"])
+        second = parser.feed(self.OUTPUT[first_end:])
+        self.assertEqual([cmd.action for cmd in second], ["关闭"])
+
+    def test_matches_full_parse_for_any_chunking(self):
+        expected = parse_command_output(self.OUTPUT).commands
+        for size in (1, 3, 7, len(self.OUTPUT)):
+            parser = CommandStreamParser()
+            emitted = self._feed(parser, self.OUTPUT, size)
+
+            self.assertEqual([cmd for batch in emitted for cmd in batch], expected)
+            self.assertEqual(parser.close().commands, expected)
+
+    def test_records_object_errors(self):
+        parser = CommandStreamParser()
+
+        parser.feed('[{"s":"卧室","n":"灯","t":"Light","q":"one"},')
+        self.assertIn("object_action_missing", parser.errors)
+        self.assertTrue(parser.degraded)
+
+        with mock.patch(
+            "command_parser.parser._parse_command_object",
+            return_value=(None, ["object_invalid"]),
+        ):
+            emitted = parser.feed('{"a":"打开"}]')
+
+        self.assertEqual(emitted, [])
+        self.assertEqual(parser.errors, ["object_action_missing", "object_invalid"])
+
+    def test_stops_on_non_array_output(self):
+        parser = CommandStreamParser()
+
+        self.assertEqual(parser.feed('{"a":"打开"}'), [])
+        result = parser.close()
+        self.assertIn("json_not_array", result.errors)
+        self.assertEqual(result.commands[0].raw, UNKNOWN_COMMAND)
+
+    def test_close_uses_full_text_for_truncated_output(self):
+        parser = CommandStreamParser()
+
+        emitted = parser.feed(
+            '[{"a":"打开","s":"卧室","n":"灯","t":"Light","q":"one"},{"a":"关'
+        )
+        result = parser.close()
+
+        self.assertEqual(len(emitted), 1)
+        self.assertIn("json_decode_error", result.errors)
+
+
 if __name__ == "__main__":
     unittest.main()
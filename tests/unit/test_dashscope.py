@@ -1,12 +1,28 @@
 """dashscope 适配层测试。"""
 
+import asyncio
+import tempfile
+import threading
+import time
 import unittest
 from http import HTTPStatus
 
 import numpy as np
 
+try:
+    from requests import exceptions as requests_exceptions
+except ImportError:  # pragma: no cover - requests 随 dashscope 安装
+    requests_exceptions = None
+
+from context_retrieval.doc_enrichment import CapabilityDoc
 from context_retrieval.ir_compiler import DashScopeLLM
-from context_retrieval.vector_search import DashScopeVectorSearcher
+from context_retrieval.models import Device
+from context_retrieval.vector_search import (
+    DashScopeVectorSearcher,
+    TransientEmbeddingError,
+    _top_k_indices,
+)
+from helpers import profiled_device
 
 
 class MockGeneration:
@@ -26,6 +42,44 @@ class MockGeneration:
         return type("Resp", (), {"status_code": 200, "output": output})
 
 
+class AioMockGeneration(MockGeneration):
+    """模拟 dashscope AioGeneration 客户端（call 为协程）。"""
+
+    async def call(self, model: str, messages: list[dict], **kwargs):
+        return MockGeneration.call(self, model, messages, **kwargs)
+
+
+class StreamMockGeneration(MockGeneration):
+    """模拟 stream=True 时逐段返回增量响应的 Generation 客户端。"""
+
+    def __init__(self, chunks: list[str]):
+        super().__init__(output_text="")
+        self.chunks = chunks
+
+    def call(self, model: str, messages: list[dict], **kwargs):
+        self.calls.append({"model": model, "messages": messages, "kwargs": kwargs})
+        return (self._response(chunk) for chunk in self.chunks)
+
+    def _response(self, content: str):
+        message = type("Message", (), {"content": content})
+        choice = type("Choice", (), {"message": message})
+        output = type("Output", (), {"choices": [choice]})
+        return type("Resp", (), {"status_code": 200, "output": output})
+
+
+class AioStreamMockGeneration(StreamMockGeneration):
+    """模拟 AioGeneration 的流式调用（await call 得到异步生成器）。"""
+
+    async def call(self, model: str, messages: list[dict], **kwargs):
+        responses = StreamMockGeneration.call(self, model, messages, **kwargs)
+
+        async def stream():
+            for response in responses:
+                yield response
+
+        return stream()
+
+
 class MockEmbeddingClient:
     """模拟 dashscope embedding 客户端。"""
 
@@ -48,6 +102,97 @@ class MockEmbeddingClient:
         )
 
 
+class KeywordEmbeddingClient:
+    """按关键词生成确定性向量的 embedding 客户端。"""
+
+    KEYWORDS = ("打开", "关闭", "亮度")
+
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def call(self, model: str, input: list[str], **kwargs):
+        self.calls.append(list(input))
+        embeddings = []
+        for text in input:
+            vector = [1.0 if kw in text else 0.0 for kw in self.KEYWORDS]
+            vector.append(0.1)
+            embeddings.append({"embedding": vector})
+        return type(
+            "Resp",
+            (),
+            {"status_code": 200, "output": {"embeddings": embeddings}, "message": ""},
+        )
+
+
+class AioKeywordEmbeddingClient(KeywordEmbeddingClient):
+    """KeywordEmbeddingClient 的异步版本。"""
+
+    async def call(self, model: str, input: list[str], **kwargs):
+        return KeywordEmbeddingClient.call(self, model, input, **kwargs)
+
+
+class FlakyEmbeddingClient:
+    """按文本编号返回向量，可配置前若干次调用失败，并记录最大并发数。"""
+
+    def __init__(self, failures: int = 0, status: int = 503, delay: float = 0.0):
+        self.failures = failures
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def call(self, model: str, input: list[str], **kwargs):
+        with self._lock:
+            self.calls += 1
+            should_fail = self.failures > 0
+            if should_fail:
+                self.failures -= 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if should_fail:
+                return type("Resp", (), {"status_code": self.status, "output": None, "message": "busy"})
+            embeddings = [{"embedding": [float(text), 1.0]} for text in input]
+            return type(
+                "Resp",
+                (),
+                {"status_code": 200, "output": {"embeddings": embeddings}, "message": ""},
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class NetworkErrorEmbeddingClient(FlakyEmbeddingClient):
+    """前若干次调用抛出指定的网络异常。"""
+
+    def __init__(self, errors: list[BaseException]):
+        super().__init__()
+        self.errors = list(errors)
+
+    def call(self, model: str, input: list[str], **kwargs):
+        if self.errors:
+            self.calls += 1
+            raise self.errors.pop(0)
+        return super().call(model, input, **kwargs)
+
+
+SPEC_INDEX = {
+    "p-light": [
+        CapabilityDoc(id="main-switch-on", description="打开灯"),
+        CapabilityDoc(id="main-switch-off", description="关闭灯"),
+    ],
+    "p-dimmer": [
+        CapabilityDoc(id="main-switch-on", description="打开调光灯"),
+        CapabilityDoc(id="main-level-set", description="设置亮度"),
+    ],
+}
+
+
 class TestDashScopeLLM(unittest.TestCase):
     """测试 DashScopeLLM。"""
 
@@ -76,6 +221,43 @@ class TestDashScopeLLM(unittest.TestCase):
         self.assertEqual(result.get("confidence"), 0)
         self.assertNotIn("action", result)
 
+    def test_agenerate_awaits_aio_client(self):
+        """注入异步客户端时 agenerate_with_prompt 直接 await，不调用同步客户端。"""
+        sync_gen = MockGeneration(output_text="sync")
+        aio_gen = AioMockGeneration(output_text="[]")
+        llm = DashScopeLLM(generation_client=sync_gen, aio_generation_client=aio_gen)
+
+        content = asyncio.run(llm.agenerate_with_prompt("打开灯", "prompt"))
+
+        self.assertEqual(content, "[]")
+        self.assertEqual(sync_gen.calls, [])
+        self.assertEqual(aio_gen.calls[0]["messages"][1]["content"], "打开灯")
+        self.assertEqual(aio_gen.calls[0]["kwargs"]["result_format"], "message")
+
+    def test_stream_yields_incremental_chunks(self):
+        """流式调用请求增量输出，逐段返回非空文本。"""
+        stream_gen = StreamMockGeneration(chunks=['[{"a":', "", '"打开"}]'])
+        llm = DashScopeLLM(generation_client=stream_gen)
+
+        chunks = list(llm.stream_with_prompt("打开灯", "prompt"))
+
+        self.assertEqual(chunks, ['[{"a":', '"打开"}]'])
+        self.assertTrue(stream_gen.calls[0]["kwargs"]["stream"])
+        self.assertTrue(stream_gen.calls[0]["kwargs"]["incremental_output"])
+
+    def test_astream_iterates_aio_client(self):
+        """注入异步客户端时 astream_with_prompt 异步迭代流式响应。"""
+        sync_gen = MockGeneration(output_text="sync")
+        aio_gen = AioStreamMockGeneration(chunks=["[", "]"])
+        llm = DashScopeLLM(generation_client=sync_gen, aio_generation_client=aio_gen)
+
+        async def collect():
+            return [chunk async for chunk in llm.astream_with_prompt("打开灯", "prompt")]
+
+        self.assertEqual(asyncio.run(collect()), ["[", "]"])
+        self.assertEqual(sync_gen.calls, [])
+        self.assertTrue(aio_gen.calls[0]["kwargs"]["stream"])
+
 
 class TestDashScopeVectorSearcher(unittest.TestCase):
     """测试 DashScopeVectorSearcher。"""
@@ -101,6 +283,339 @@ class TestDashScopeVectorSearcher(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             searcher.encode(["a"])
 
+    def test_encode_concurrent_batches_preserve_order(self):
+        """并发批次按输入顺序拼接结果，且并发数受限。"""
+        client = FlakyEmbeddingClient(delay=0.01)
+        searcher = DashScopeVectorSearcher(embedding_client=client, max_workers=4)
+        texts = [str(i) for i in range(95)]
+
+        arr = searcher.encode(texts)
+
+        np.testing.assert_array_equal(arr[:, 0], np.arange(95, dtype=np.float32))
+        self.assertEqual(client.calls, 10)
+        self.assertGreater(client.max_in_flight, 1)
+        self.assertLessEqual(client.max_in_flight, 4)
+
+    def test_encode_retries_transient_errors(self):
+        """瞬时错误按退避重试，成功后返回结果。"""
+        client = FlakyEmbeddingClient(failures=2, status=503)
+        searcher = DashScopeVectorSearcher(
+            embedding_client=client,
+            max_retries=2,
+            retry_backoff=0.0,
+        )
+
+        arr = searcher.encode(["1", "2"])
+
+        self.assertEqual(arr.shape, (2, 2))
+        self.assertEqual(client.calls, 3)
+
+    def test_encode_gives_up_after_max_retries(self):
+        """超过重试次数后抛出瞬时错误；非瞬时错误不重试。"""
+        client = FlakyEmbeddingClient(failures=5, status=429)
+        searcher = DashScopeVectorSearcher(
+            embedding_client=client,
+            max_retries=1,
+            retry_backoff=0.0,
+        )
+        with self.assertRaises(TransientEmbeddingError):
+            searcher.encode(["1"])
+        self.assertEqual(client.calls, 2)
+
+        bad_request = FlakyEmbeddingClient(failures=5, status=400)
+        searcher = DashScopeVectorSearcher(embedding_client=bad_request, retry_backoff=0.0)
+        with self.assertRaises(RuntimeError):
+            searcher.encode(["1"])
+        self.assertEqual(bad_request.calls, 1)
+
+    @unittest.skipIf(requests_exceptions is None, "requests 未安装")
+    def test_encode_retries_requests_network_errors(self):
+        """dashscope 底层 requests 的连接错误与超时按瞬时错误重试。"""
+        client = NetworkErrorEmbeddingClient(
+            [
+                requests_exceptions.ConnectionError("reset"),
+                requests_exceptions.Timeout("timeout"),
+            ]
+        )
+        searcher = DashScopeVectorSearcher(
+            embedding_client=client,
+            max_retries=2,
+            retry_backoff=0.0,
+        )
+
+        arr = searcher.encode(["1"])
+
+        self.assertEqual(arr.shape, (1, 2))
+        self.assertEqual(client.calls, 3)
+
+    def test_index_embeds_each_profile_once(self):
+        """同一 profile 的设备共享向量行，只编码一次。"""
+        client = KeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=client)
+        devices = [profiled_device(f"light-{i}", "p-light") for i in range(40)]
+        devices.append(profiled_device("dimmer-1", "p-dimmer"))
+
+        searcher.index(devices)
+
+        embedded = [text for batch in client.calls for text in batch]
+        self.assertEqual(len(embedded), 4)
+        self.assertEqual(searcher.row_count, 4)
+
+    def test_search_expands_shared_rows_to_devices(self):
+        """共享行命中后展开为各设备候选，并支持设备过滤。"""
+        client = KeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=client)
+        searcher.index(
+            [
+                profiled_device("light-1", "p-light"),
+                profiled_device("light-2", "p-light"),
+                profiled_device("dimmer-1", "p-dimmer"),
+            ]
+        )
+
+        candidates = searcher.search("关闭", top_k=2)
+        self.assertEqual(
+            [(c.entity_id, c.capability_id) for c in candidates],
+            [("light-1", "main-switch-off"), ("light-2", "main-switch-off")],
+        )
+
+        filtered = searcher.search("打开", top_k=5, device_ids={"light-2"})
+        self.assertEqual(filtered[0].entity_id, "light-2")
+        self.assertEqual(filtered[0].capability_id, "main-switch-on")
+        self.assertTrue(all(c.entity_id == "light-2" for c in filtered))
+
+    def test_search_device_filter_uses_inverted_map(self):
+        """过滤集合中未索引的设备被忽略，全部未知时返回空。"""
+        searcher = DashScopeVectorSearcher(
+            spec_index=SPEC_INDEX,
+            embedding_client=KeywordEmbeddingClient(),
+        )
+        searcher.index(
+            [
+                profiled_device("light-1", "p-light"),
+                profiled_device("light-2", "p-light"),
+                profiled_device("dimmer-1", "p-dimmer"),
+            ]
+        )
+
+        self.assertEqual(searcher.search("打开", device_ids={"missing"}), [])
+
+        candidates = searcher.search("打开", top_k=10, device_ids={"dimmer-1", "light-2", "missing"})
+        self.assertEqual({c.entity_id for c in candidates}, {"dimmer-1", "light-2"})
+        self.assertEqual(len(candidates), 4)
+
+    def test_search_many_uses_one_embedding_call(self):
+        """批量检索合并为一次 embedding 请求，结果与逐条检索一致。"""
+        client = KeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(
+            spec_index=SPEC_INDEX,
+            embedding_client=client,
+            query_cache_size=0,
+        )
+        searcher.index(
+            [
+                profiled_device("light-1", "p-light"),
+                profiled_device("light-2", "p-light"),
+                profiled_device("dimmer-1", "p-dimmer"),
+            ]
+        )
+        calls = len(client.calls)
+
+        batch = searcher.search_many(
+            ["关闭", "设置亮度", "关闭", "打开"],
+            top_k=3,
+            device_ids_per_query=[None, {"dimmer-1"}, {"light-2"}, {"missing"}],
+        )
+
+        self.assertEqual(client.calls[calls:], [["关闭", "设置亮度"]])
+        expected = [
+            searcher.search("关闭", top_k=3),
+            searcher.search("设置亮度", top_k=3, device_ids={"dimmer-1"}),
+            searcher.search("关闭", top_k=3, device_ids={"light-2"}),
+            [],
+        ]
+        self.assertEqual(
+            [[(c.entity_id, c.capability_id, c.vector_score) for c in r] for r in batch],
+            [[(c.entity_id, c.capability_id, c.vector_score) for c in r] for r in expected],
+        )
+
+        with self.assertRaises(ValueError):
+            searcher.search_many(["关闭"], device_ids_per_query=[None, None])
+
+    def test_asearch_many_awaits_aio_client(self):
+        """异步批量检索只通过异步客户端编码查询，结果与同步检索一致。"""
+        sync_client = KeywordEmbeddingClient()
+        aio_client = AioKeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(
+            spec_index=SPEC_INDEX,
+            embedding_client=sync_client,
+            aio_embedding_client=aio_client,
+            query_cache_size=0,
+        )
+        searcher.index(
+            [
+                profiled_device("light-1", "p-light"),
+                profiled_device("dimmer-1", "p-dimmer"),
+            ]
+        )
+        calls = len(sync_client.calls)
+        queries = ["关闭", "设置亮度"]
+        filters = [None, {"dimmer-1"}]
+
+        batch = asyncio.run(
+            searcher.asearch_many(queries, top_k=3, device_ids_per_query=filters)
+        )
+
+        self.assertEqual(aio_client.calls, [queries])
+        self.assertEqual(len(sync_client.calls), calls)
+        expected = searcher.search_many(queries, top_k=3, device_ids_per_query=filters)
+        self.assertEqual(
+            [[(c.entity_id, c.capability_id, c.vector_score) for c in r] for r in batch],
+            [[(c.entity_id, c.capability_id, c.vector_score) for c in r] for r in expected],
+        )
+
+    def test_index_diff_only_embeds_new_profiles(self):
+        """再次索引时只为新增 profile 编码，未变化时不发请求。"""
+        client = KeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=client)
+        lights = [profiled_device(f"light-{i}", "p-light") for i in range(30)]
+        searcher.index(lights)
+        calls = len(client.calls)
+
+        searcher.index(list(lights))
+        self.assertEqual(len(client.calls), calls)
+
+        searcher.index(lights + [profiled_device("dimmer-1", "p-dimmer")])
+        embedded = [text for batch in client.calls[calls:] for text in batch]
+        self.assertEqual(len(embedded), 2)
+        self.assertTrue(embedded[0].startswith("打开调光灯"))
+        self.assertTrue(embedded[1].startswith("设置亮度"))
+        self.assertEqual(searcher.row_count, 4)
+
+    def test_remove_devices_compacts_rows(self):
+        """移除最后引用某些行的设备后压缩矩阵。"""
+        client = KeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=client)
+        searcher.index(
+            [
+                profiled_device("light-1", "p-light"),
+                profiled_device("dimmer-1", "p-dimmer"),
+            ]
+        )
+
+        searcher.remove_devices({"dimmer-1"})
+
+        self.assertEqual(searcher.row_count, 2)
+        candidates = searcher.search("设置亮度", top_k=10)
+        self.assertEqual({c.entity_id for c in candidates}, {"light-1"})
+
+    def test_add_and_update_device(self):
+        """新增设备复用已有行；更新设备刷新条目元数据。"""
+        client = KeywordEmbeddingClient()
+        searcher = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=client)
+        searcher.index([profiled_device("light-1", "p-light")])
+        calls = len(client.calls)
+
+        searcher.add_devices([profiled_device("light-2", "p-light", room="卧室")])
+        self.assertEqual(len(client.calls), calls)
+
+        searcher.update_device(profiled_device("light-2", "p-dimmer", room="书房"))
+        candidates = searcher.search("设置亮度", top_k=1)
+        self.assertEqual(candidates[0].entity_id, "light-2")
+        self.assertEqual(candidates[0].capability_id, "main-level-set")
+        self.assertEqual(searcher.row_count, 4)
+
+    def test_changed_spec_text_is_reencoded(self):
+        """同一 profile 与 capability 的描述变化后重新编码，不复用旧向量。"""
+        client = KeywordEmbeddingClient()
+        spec_index = {"p-light": [CapabilityDoc(id="main-switch-on", description="打开灯")]}
+        searcher = DashScopeVectorSearcher(spec_index=spec_index, embedding_client=client)
+        searcher.index([profiled_device("light-1", "p-light")])
+        calls = len(client.calls)
+
+        spec_index["p-light"] = [CapabilityDoc(id="main-switch-on", description="设置亮度")]
+        searcher.update_device(profiled_device("light-1", "p-light", room="卧室"))
+
+        embedded = [text for batch in client.calls[calls:] for text in batch]
+        self.assertEqual(len(embedded), 1)
+        self.assertTrue(embedded[0].startswith("设置亮度"))
+        self.assertEqual(searcher.row_count, 1)
+        candidates = searcher.search("设置亮度", top_k=1)
+        self.assertEqual(candidates[0].entity_id, "light-1")
+        self.assertGreater(candidates[0].vector_score, 0.9)
+
+    def test_save_and_load_memory_mapped_index(self):
+        """保存后以 mmap 加载，检索结果一致且同设备列表无需重新编码。"""
+        client = KeywordEmbeddingClient()
+        devices = [
+            profiled_device("light-1", "p-light"),
+            profiled_device("light-2", "p-light", room="卧室"),
+            profiled_device("dimmer-1", "p-dimmer"),
+            Device(id="plain-1", name="插座", room="书房", category="SmartPlug"),
+        ]
+        searcher = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=client)
+        searcher.index(devices)
+        expected = searcher.search("设置亮度", top_k=10)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            searcher.save(tmp)
+
+            worker_client = KeywordEmbeddingClient()
+            worker = DashScopeVectorSearcher(spec_index=SPEC_INDEX, embedding_client=worker_client)
+            worker.load(tmp)
+            worker.index(devices)
+
+            self.assertIsInstance(worker._embeddings, np.memmap)
+            self.assertEqual(worker_client.calls, [])
+            self.assertEqual(worker.search("设置亮度", top_k=10), expected)
+            self.assertEqual(worker.row_count, searcher.row_count)
+
+    def test_load_rejects_other_model(self):
+        """模型不一致时拒绝加载。"""
+        searcher = DashScopeVectorSearcher(
+            spec_index=SPEC_INDEX,
+            embedding_client=KeywordEmbeddingClient(),
+        )
+        searcher.index([profiled_device("light-1", "p-light")])
+        with tempfile.TemporaryDirectory() as tmp:
+            searcher.save(tmp)
+            other = DashScopeVectorSearcher(
+                embedding_client=KeywordEmbeddingClient(),
+                model="other-model",
+            )
+            with self.assertRaises(ValueError):
+                other.load(tmp)
+
+    def test_index_stores_normalized_float32_rows(self):
+        """索引矩阵为 L2 归一化的 float32 行。"""
+        searcher = DashScopeVectorSearcher(
+            spec_index=SPEC_INDEX,
+            embedding_client=KeywordEmbeddingClient(),
+        )
+        searcher.index([profiled_device("dimmer-1", "p-dimmer")])
+
+        matrix = searcher._embeddings
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+
+
+class TestTopKIndices(unittest.TestCase):
+    """测试部分选择 top-k。"""
+
+    def test_matches_full_stable_sort(self):
+        """结果与完整稳定排序的前 k 个一致（含同分）。"""
+        rng = np.random.default_rng(7)
+        scores = rng.integers(0, 20, size=500).astype(np.float32)
+        expected = np.argsort(-scores, kind="stable")
+
+        for k in (1, 5, 37, 499, 500, 800):
+            np.testing.assert_array_equal(_top_k_indices(scores, k), expected[:k])
+
+    def test_empty_and_zero_k(self):
+        """空输入或 k<=0 返回空数组。"""
+        self.assertEqual(_top_k_indices(np.zeros(0, dtype=np.float32), 3).shape, (0,))
+        self.assertEqual(_top_k_indices(np.ones(3, dtype=np.float32), 0).shape, (0,))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,167 @@
+"""Embedding 缓存测试。"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from context_retrieval.embedding_cache import EmbeddingCache, QueryEmbeddingLRU
+from context_retrieval.models import Device
+from context_retrieval.vector_search import DashScopeVectorSearcher
+
+
+class CountingEmbeddingClient:
+    """按输入文本生成确定性向量并记录调用。"""
+
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def call(self, model: str, input: list[str], **kwargs):
+        self.calls.append(list(input))
+        embeddings = [
+            {"embedding": [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]}
+            for text in input
+        ]
+        return type(
+            "Resp",
+            (),
+            {"status_code": 200, "output": {"embeddings": embeddings}, "message": ""},
+        )
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    """测试 EmbeddingCache。"""
+
+    def test_key_depends_on_model_and_text(self):
+        """不同模型的相同文本使用不同键。"""
+        self.assertNotEqual(
+            EmbeddingCache.make_key("m1", "打开"),
+            EmbeddingCache.make_key("m2", "打开"),
+        )
+        self.assertEqual(
+            EmbeddingCache.make_key("m1", "打开"),
+            EmbeddingCache.make_key("m1", "打开"),
+        )
+
+    def test_save_and_reload(self):
+        """写入文件后新实例可读取。"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.npz")
+            cache = EmbeddingCache(path)
+            cache.put("m", "打开", np.array([0.1, 0.2], dtype=np.float32))
+            cache.put("m", "关闭", np.array([0.3, 0.4, 0.5], dtype=np.float32))
+            cache.save()
+
+            reloaded = EmbeddingCache(path)
+
+            self.assertEqual(len(reloaded), 2)
+            np.testing.assert_allclose(reloaded.get("m", "打开"), [0.1, 0.2])
+            np.testing.assert_allclose(reloaded.get("m", "关闭"), [0.3, 0.4, 0.5])
+            self.assertIsNone(reloaded.get("other", "打开"))
+
+    def test_batches_saves_until_threshold(self):
+        """未落盘条目达到阈值前不重写缓存文件，close 写入剩余条目。"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.npz")
+            cache = EmbeddingCache(path, save_threshold=3)
+            for text in ("打开", "关闭"):
+                cache.put("m", text, np.array([0.1, 0.2], dtype=np.float32))
+                cache.save_if_needed()
+            self.assertFalse(os.path.exists(path))
+
+            cache.put("m", "调亮", np.array([0.3, 0.4], dtype=np.float32))
+            cache.save_if_needed()
+            self.assertEqual(len(EmbeddingCache(path)), 3)
+            self.assertEqual(cache.pending, 0)
+
+            cache.put("m", "调暗", np.array([0.5, 0.6], dtype=np.float32))
+            cache.close()
+            self.assertEqual(len(EmbeddingCache(path)), 4)
+
+
+class TestQueryEmbeddingLRU(unittest.TestCase):
+    """测试查询向量 LRU。"""
+
+    def test_evicts_least_recently_used(self):
+        """超出容量时淘汰最久未使用的条目。"""
+        lru = QueryEmbeddingLRU(maxsize=2, ttl=None)
+        lru.put("m", "打开", np.array([1.0]))
+        lru.put("m", "关闭", np.array([2.0]))
+        self.assertIsNotNone(lru.get("m", "打开"))
+        lru.put("m", "调亮", np.array([3.0]))
+
+        self.assertIsNone(lru.get("m", "关闭"))
+        self.assertIsNotNone(lru.get("m", "打开"))
+        self.assertEqual(lru.stats(), {"hits": 2, "misses": 1, "size": 2})
+
+    def test_expires_after_ttl(self):
+        """超过 TTL 的条目视为未命中。"""
+        now = [100.0]
+        lru = QueryEmbeddingLRU(maxsize=4, ttl=10.0, clock=lambda: now[0])
+        lru.put("m", "打开", np.array([1.0]))
+
+        now[0] = 105.0
+        self.assertIsNotNone(lru.get("m", "打开"))
+        now[0] = 111.0
+        self.assertIsNone(lru.get("m", "打开"))
+        self.assertEqual(len(lru), 0)
+
+
+class TestSearcherWithCache(unittest.TestCase):
+    """测试 DashScopeVectorSearcher 使用缓存。"""
+
+    def test_encode_only_requests_misses(self):
+        """仅未命中且去重后的文本会请求 embedding 服务。"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.npz")
+            client = CountingEmbeddingClient()
+            with EmbeddingCache(path) as cache:
+                searcher = DashScopeVectorSearcher(
+                    embedding_client=client,
+                    embedding_cache=cache,
+                )
+
+                first = searcher.encode(["打开", "关闭", "打开"])
+                self.assertEqual(client.calls, [["打开", "关闭"]])
+                self.assertEqual(first.shape, (3, 3))
+                np.testing.assert_allclose(first[0], first[2])
+
+            restarted = DashScopeVectorSearcher(
+                embedding_client=client,
+                embedding_cache=EmbeddingCache(path),
+            )
+            second = restarted.encode(["关闭", "调亮"])
+
+            self.assertEqual(client.calls[-1], ["调亮"])
+            np.testing.assert_allclose(second[0], first[1])
+
+    def test_repeated_query_skips_embedding_call(self):
+        """重复查询命中 LRU，不再请求 embedding 服务。"""
+        client = CountingEmbeddingClient()
+        searcher = DashScopeVectorSearcher(embedding_client=client)
+        searcher.index([Device(id="lamp-1", name="台灯", room="卧室", category="Light")])
+        calls_after_index = len(client.calls)
+
+        searcher.search("打开")
+        searcher.search("打开")
+        searcher.search("关闭")
+
+        self.assertEqual(client.calls[calls_after_index:], [["打开"], ["关闭"]])
+        self.assertEqual(searcher.query_cache.stats()["hits"], 1)
+
+    def test_query_cache_can_be_disabled(self):
+        """容量为 0 时关闭查询缓存。"""
+        client = CountingEmbeddingClient()
+        searcher = DashScopeVectorSearcher(embedding_client=client, query_cache_size=0)
+        searcher.index([Device(id="lamp-1", name="台灯", room="卧室", category="Light")])
+
+        searcher.search("打开")
+        searcher.search("打开")
+
+        self.assertIsNone(searcher.query_cache)
+        self.assertEqual(client.calls[-2:], [["打开"], ["打开"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""家庭检索上下文测试。"""
+
+import unittest
+from unittest import mock
+
+from context_retrieval.doc_enrichment import CapabilityDoc
+from context_retrieval.home_context import HomeContext, HomeContextCache
+from context_retrieval.ir_compiler import FakeLLM
+from context_retrieval.local_embedding import HashingVectorSearcher
+from context_retrieval.models import CommandSpec, Device, QueryIR
+from context_retrieval.pipeline import retrieve, retrieve_with_context
+from context_retrieval.state import ConversationState
+
+SPEC_INDEX = {
+    "p-light": [
+        CapabilityDoc(id="main-switch-on", description="打开灯"),
+        CapabilityDoc(id="main-switch-off", description="关闭灯"),
+    ],
+}
+
+
+def _devices() -> list[Device]:
+    commands = [CommandSpec(id="main-switch-on", description="打开灯")]
+    return [
+        Device(
+            id="lamp-1",
+            name="吸顶灯",
+            room="客厅",
+            category="Light",
+            commands=commands,
+            profile_id="p-light",
+        ),
+        Device(
+            id="lamp-2",
+            name="床头灯",
+            room="卧室",
+            category="Light",
+            commands=commands,
+            profile_id="p-light",
+        ),
+    ]
+
+
+class TestHomeContext(unittest.TestCase):
+    """测试 HomeContext 与 retrieve_with_context。"""
+
+    def setUp(self):
+        self.devices = _devices()
+        self.llm = FakeLLM(
+            {"打开卧室的灯": [{"a": "打开", "s": "卧室", "n": "灯", "t": "Light", "q": "one"}]}
+        )
+
+    def test_build_precomputes_home_data(self):
+        """构建时完成设备索引、规格查找表与类别键的预计算。"""
+        context = HomeContext.build(
+            self.devices,
+            HashingVectorSearcher(spec_index=SPEC_INDEX, dim=64),
+        )
+
+        self.assertIs(context.device_by_id["lamp-2"], self.devices[1])
+        self.assertIn("main-switch-off", context.spec_lookup["p-light"])
+        self.assertEqual(context.category_keys["lamp-1"], frozenset({"light"}))
+        filtered, _ = context.scope.filter(QueryIR(raw="", scope_include={"卧室"}))
+        self.assertEqual([d.id for d in filtered], ["lamp-2"])
+
+    def test_retrieve_with_context_matches_retrieve(self):
+        """复用上下文的检索结果与逐次构建一致，且不重复索引。"""
+        searcher = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=64)
+        expected = retrieve(
+            text="打开卧室的灯",
+            devices=self.devices,
+            llm=self.llm,
+            state=ConversationState(),
+            vector_searcher=searcher,
+        )
+        context = HomeContext.build(self.devices, searcher)
+
+        with mock.patch.object(searcher, "index", wraps=searcher.index) as index_mock:
+            for _ in range(2):
+                results = retrieve_with_context(
+                    text="打开卧室的灯",
+                    context=context,
+                    llm=self.llm,
+                    state=ConversationState(),
+                )
+                self.assertEqual(results[0].candidates, expected[0].candidates)
+        index_mock.assert_not_called()
+
+    def test_sync_restores_index_after_other_home(self):
+        """共享的向量检索器被其他家庭索引后，检索前恢复本家庭索引。"""
+        searcher = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=64)
+        context = HomeContext.build(self.devices, searcher)
+        other = Device(id="other", name="灯", room="客厅", category="Light", profile_id="p-light")
+        searcher.index([other])
+
+        context.sync_vector_index()
+
+        ids = {c.entity_id for c in searcher.search("打开灯", top_k=10)}
+        self.assertEqual(ids, {"lamp-1", "lamp-2"})
+
+    def test_shared_searcher_reindexes_on_every_home_switch(self):
+        """多个家庭共享检索器时每次切换都重新索引；每个家庭独立的检索器不会。"""
+        other_devices = [
+            Device(id="other", name="灯", room="卧室", category="Light", profile_id="p-light")
+        ]
+
+        def count_reindex(searchers: list[HashingVectorSearcher]) -> int:
+            contexts = [
+                HomeContext.build(devices, searcher)
+                for devices, searcher in zip((self.devices, other_devices), searchers)
+            ]
+            with mock.patch.object(
+                HashingVectorSearcher, "index", autospec=True, side_effect=HashingVectorSearcher.index
+            ) as index_mock:
+                for _ in range(2):
+                    for context in contexts:
+                        retrieve_with_context(
+                            text="打开卧室的灯",
+                            context=context,
+                            llm=self.llm,
+                            state=ConversationState(),
+                        )
+            return index_mock.call_count
+
+        shared = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=64)
+        with self.assertLogs("context_retrieval.home_context", level="WARNING"):
+            self.assertEqual(count_reindex([shared, shared]), 4)
+        separate = [HashingVectorSearcher(spec_index=SPEC_INDEX, dim=64) for _ in range(2)]
+        self.assertEqual(count_reindex(separate), 0)
+
+
+class TestHomeContextCache(unittest.TestCase):
+    """测试 HomeContextCache。"""
+
+    def test_reuses_context_until_devices_change(self):
+        """设备列表不变时复用上下文，设备变化或换用检索器时重建。"""
+        cache = HomeContextCache(maxsize=2)
+        devices = _devices()
+        searcher = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=64)
+
+        context = cache.get(devices, searcher)
+        self.assertIs(cache.get(list(devices), searcher), context)
+        self.assertIsNot(cache.get(devices), context)
+
+        devices[0].room = "书房"
+        self.assertIsNot(cache.get(devices, searcher), context)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
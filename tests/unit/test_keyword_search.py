@@ -1,13 +1,15 @@
 """测试 Keyword 检索模块。"""
 
 import unittest
+from unittest import mock
 
-from context_retrieval.keyword_search import KeywordSearcher
+from context_retrieval.keyword_search import KeywordIndexCache, KeywordSearcher
 from context_retrieval.models import (
     CommandSpec,
     Device,
     QueryIR,
 )
+from context_retrieval.text import fuzzy_match_matrix
 
 
 class TestKeywordSearcher(unittest.TestCase):
@@ -145,5 +147,135 @@ class TestKeywordSearcher(unittest.TestCase):
             )
 
 
+class TestKeywordSearcherIndex(unittest.TestCase):
+    """测试 KeywordSearcher 倒排索引。"""
+
+    def setUp(self):
+        """构造多房间、同型号的设备集合。"""
+        rooms = ["客厅", "主卧", "次卧", "书房", "厨房"]
+        names = ["吸顶灯", "台灯", "空调", "窗帘", "ABC"]
+        self.devices = [
+            Device(
+                id=f"dev-{i}",
+                name=f"{names[i % len(names)]}{i // 10}",
+                room=rooms[i % len(rooms)],
+                category="smartthings:light" if i % 2 else "smartthings:switch",
+                commands=[
+                    CommandSpec(id="main-switch-on", description="打开设备"),
+                    CommandSpec(id="main-switch-off", description="关闭设备"),
+                ],
+            )
+            for i in range(50)
+        ]
+        self.searcher = KeywordSearcher(self.devices)
+
+    def test_matches_single_device_searchers(self):
+        """倒排索引只跳过不可能命中的设备：结果与逐设备单独检索一致。"""
+        queries = [
+            QueryIR(raw="打开台灯", name_hint="台灯", action="打开"),
+            QueryIR(raw="AXC", name_hint="AXC0"),
+            QueryIR(raw="卧室", scope_include={"卧室"}, type_hint="Light"),
+            QueryIR(raw="关", action="关闭", type_hint="Switch"),
+            QueryIR(raw="冰箱", name_hint="冰箱", scope_include={"阳台"}),
+        ]
+        for ir in queries:
+            expected = [
+                (c.entity_id, c.keyword_score, c.reasons)
+                for device in self.devices
+                for c in KeywordSearcher([device]).search(ir, top_k=1)
+            ]
+            expected.sort(key=lambda item: item[1], reverse=True)
+            actual = self.searcher.search(ir, top_k=len(self.devices))
+            self.assertEqual(
+                [(c.entity_id, c.keyword_score, c.reasons) for c in actual],
+                expected,
+                ir.raw,
+            )
+
+    def test_fuzzy_scores_only_plausible_unique_names(self):
+        """只对与查询共享字符的唯一名称做一次批量模糊打分。"""
+        ir = QueryIR(raw="打开窗帘", name_hint="窗帘9")
+        with mock.patch(
+            "context_retrieval.keyword_search.fuzzy_match_matrix",
+            wraps=fuzzy_match_matrix,
+        ) as fuzzy:
+            candidates = self.searcher.search(ir, top_k=len(self.devices))
+
+        # 50 个设备中只有 窗帘0..窗帘4 五个唯一名称与查询共享字符
+        fuzzy.assert_called_once()
+        self.assertEqual(sorted(fuzzy.call_args.args[0]), [f"窗帘{i}" for i in range(5)])
+        self.assertEqual(len(candidates), 10)
+        self.assertTrue(all("name_fuzzy" in c.reasons for c in candidates))
+
+    def test_action_matches_are_memoized(self):
+        """同一动作第二次检索直接命中缓存，不再模糊打分。"""
+        ir = QueryIR(raw="关掉设备", action="关掉设备")
+        with mock.patch(
+            "context_retrieval.keyword_search.fuzzy_match_matrix",
+            wraps=fuzzy_match_matrix,
+        ) as fuzzy:
+            first = self.searcher.search(ir, top_k=len(self.devices))
+            second = self.searcher.search(
+                ir, top_k=len(self.devices), device_ids={"dev-0", "dev-1"}
+            )
+
+        fuzzy.assert_called_once()
+        self.assertEqual(len(first), len(self.devices))
+        self.assertEqual([c.entity_id for c in second], ["dev-0", "dev-1"])
+        self.assertTrue(all(c.reasons == ["action_match"] for c in first + second))
+
+    def test_action_cache_is_bounded(self):
+        """动作缓存超过上限时淘汰最久未使用的条目。"""
+        searcher = KeywordSearcher(self.devices, action_cache_size=2)
+        for action in ("打开", "关闭", "开灯"):
+            searcher.search(QueryIR(raw=action, action=action))
+
+        self.assertEqual(list(searcher._action_cache), ["关闭", "开灯"])
+
+    def test_device_subset_matches_searcher_over_subset(self):
+        """设备子集掩码的结果与只用子集构建的检索器一致。"""
+        subset = [d for d in self.devices if d.room in {"主卧", "书房"}]
+        ir = QueryIR(raw="打开台灯", name_hint="台灯", action="打开", type_hint="Light")
+
+        expected = KeywordSearcher(subset).search(ir, top_k=50)
+        actual = self.searcher.search(ir, top_k=50, device_ids={d.id for d in subset})
+
+        self.assertEqual(
+            [(c.entity_id, c.keyword_score, c.reasons) for c in actual],
+            [(c.entity_id, c.keyword_score, c.reasons) for c in expected],
+        )
+        self.assertEqual(self.searcher.search(ir, device_ids=set()), [])
+
+
+class TestKeywordIndexCache(unittest.TestCase):
+    """测试 KeywordIndexCache。"""
+
+    def _devices(self, name: str = "台灯") -> list[Device]:
+        return [
+            Device(id="lamp-1", name=name, room="卧室", category="smartthings:light"),
+            Device(id="ac-1", name="空调", room="客厅", category="smartthings:airConditioner"),
+        ]
+
+    def test_reuses_index_until_devices_change(self):
+        """设备内容不变时复用索引，变化后重建。"""
+        cache = KeywordIndexCache(maxsize=2)
+
+        first = cache.get(self._devices())
+        self.assertIs(cache.get(self._devices()), first)
+
+        renamed = cache.get(self._devices(name="床头灯"))
+        self.assertIsNot(renamed, first)
+        self.assertEqual(len(cache), 2)
+
+    def test_evicts_least_recently_used(self):
+        """超出容量时淘汰最久未使用的索引。"""
+        cache = KeywordIndexCache(maxsize=1)
+        first = cache.get(self._devices())
+        cache.get(self._devices(name="床头灯"))
+
+        self.assertIsNot(cache.get(self._devices()), first)
+        self.assertEqual(len(cache), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,155 @@
+"""本地哈希 embedding 后端测试。"""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - aiohttp 仅异步 embedding 客户端需要
+    aiohttp = None
+
+from context_retrieval.doc_enrichment import CapabilityDoc
+from context_retrieval.local_embedding import HashingVectorSearcher, hash_embed
+from context_retrieval.models import Device
+from context_retrieval.vector_search import FallbackVectorSearcher, VectorSearcher
+from helpers import profiled_device
+
+SPEC_INDEX = {
+    "p-light": [
+        CapabilityDoc(id="main-switch-on", description="打开灯"),
+        CapabilityDoc(id="main-switch-off", description="关闭灯"),
+    ],
+    "p-curtain": [
+        CapabilityDoc(id="main-curtain-open", description="拉开窗帘"),
+        CapabilityDoc(id="main-curtain-close", description="拉上窗帘"),
+    ],
+}
+
+
+def _devices() -> list[Device]:
+    return [
+        profiled_device("light-1", "p-light"),
+        profiled_device("light-2", "p-light", room="卧室"),
+        profiled_device("curtain-1", "p-curtain"),
+    ]
+
+
+class BrokenVectorSearcher(VectorSearcher):
+    """模拟不可用的远程检索器。"""
+
+    def __init__(self, fail_on_index: bool = False, error: Exception | None = None):
+        self.fail_on_index = fail_on_index
+        self.error = error or RuntimeError("dashscope 调用失败: 503")
+        self.spec_index = SPEC_INDEX
+
+    def index(self, devices):
+        if self.fail_on_index:
+            raise ConnectionError("offline")
+
+    def search(self, query, top_k=10, device_ids=None):
+        raise self.error
+
+
+class TestHashEmbed(unittest.TestCase):
+    """测试 hash_embed。"""
+
+    def test_is_deterministic_and_similarity_aware(self):
+        """相同文本向量一致，字面相近的文本更相似。"""
+        vectors = hash_embed(["拉开窗帘", "拉开窗帘", "打开窗帘", "关闭空调"], dim=256)
+        norms = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        np.testing.assert_array_equal(vectors[0], vectors[1])
+        self.assertGreater(norms[0] @ norms[2], norms[0] @ norms[3])
+
+    def test_empty_text_is_zero_vector(self):
+        """空文本得到全零向量。"""
+        vectors = hash_embed(["", "  "], dim=16)
+        self.assertEqual(vectors.shape, (2, 16))
+        self.assertFalse(vectors.any())
+
+
+class TestHashingVectorSearcher(unittest.TestCase):
+    """测试 HashingVectorSearcher。"""
+
+    def test_search_ranks_matching_capability(self):
+        """完整检索路径可按能力描述命中候选。"""
+        searcher = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=256)
+        searcher.index(_devices())
+
+        top = searcher.search("拉上窗帘", top_k=1)[0]
+        self.assertEqual((top.entity_id, top.capability_id), ("curtain-1", "main-curtain-close"))
+
+        filtered = searcher.search("关闭灯", top_k=1, device_ids={"light-2"})[0]
+        self.assertEqual((filtered.entity_id, filtered.capability_id), ("light-2", "main-switch-off"))
+
+    def test_save_and_load_binds_hash_parameters(self):
+        """索引文件记录哈希参数，维度不同的检索器拒绝加载。"""
+        searcher = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=128)
+        searcher.index(_devices())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            searcher.save(tmp)
+            restored = HashingVectorSearcher(spec_index=SPEC_INDEX, dim=128)
+            restored.load(tmp)
+            self.assertEqual(
+                [c.entity_id for c in restored.search("打开灯", top_k=2)],
+                [c.entity_id for c in searcher.search("打开灯", top_k=2)],
+            )
+            with self.assertRaises(ValueError):
+                HashingVectorSearcher(dim=64).load(tmp)
+
+
+class TestFallbackVectorSearcher(unittest.TestCase):
+    """测试 FallbackVectorSearcher。"""
+
+    def test_search_failure_uses_fallback(self):
+        """主检索器检索失败时降级到本地检索器。"""
+        searcher = FallbackVectorSearcher(
+            BrokenVectorSearcher(),
+            HashingVectorSearcher(spec_index=SPEC_INDEX, dim=256),
+        )
+        searcher.index(_devices())
+
+        with self.assertLogs("context_retrieval.vector_search", level="WARNING"):
+            candidates = searcher.search("拉开窗帘", top_k=1)
+
+        self.assertTrue(searcher.degraded)
+        self.assertEqual(candidates[0].capability_id, "main-curtain-open")
+        self.assertIs(searcher.spec_index, SPEC_INDEX)
+
+    def test_index_failure_skips_primary(self):
+        """主检索器索引失败后直接使用备用检索器。"""
+        searcher = FallbackVectorSearcher(
+            BrokenVectorSearcher(fail_on_index=True),
+            HashingVectorSearcher(spec_index=SPEC_INDEX, dim=256),
+        )
+        with self.assertLogs("context_retrieval.vector_search", level="WARNING"):
+            searcher.index(_devices())
+
+        self.assertEqual(len(searcher.search_many(["打开灯", "拉上窗帘"], top_k=2)), 2)
+        self.assertTrue(searcher.degraded)
+
+
+class TestAsyncFallbackVectorSearcher(unittest.IsolatedAsyncioTestCase):
+    """测试 FallbackVectorSearcher 的异步检索。"""
+
+    @unittest.skipIf(aiohttp is None, "aiohttp 未安装")
+    async def test_client_error_uses_fallback(self):
+        """异步 embedding 客户端重试耗尽后的 aiohttp 异常同样触发降级。"""
+        searcher = FallbackVectorSearcher(
+            BrokenVectorSearcher(error=aiohttp.ClientConnectionError("reset")),
+            HashingVectorSearcher(spec_index=SPEC_INDEX, dim=256),
+        )
+        searcher.index(_devices())
+
+        with self.assertLogs("context_retrieval.vector_search", level="WARNING"):
+            results = await searcher.asearch_many(["拉开窗帘"], top_k=1)
+
+        self.assertTrue(searcher.degraded)
+        self.assertEqual(results[0][0].capability_id, "main-curtain-open")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 """测试核心数据模型。"""
 
+import dataclasses
 import unittest
 
 from context_retrieval.models import (
@@ -41,6 +42,12 @@ class TestCommandSpec(unittest.TestCase):
         self.assertEqual(cmd.description, "打开设备")
         self.assertIsNone(cmd.type)
 
+    def test_command_is_frozen(self):
+        """命令规格创建后不可修改。"""
+        cmd = CommandSpec(id="main-switch-on", description="打开设备")
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            cmd.description = "关闭设备"  # type: ignore[misc]
+
     def test_command_with_range(self):
         """测试带范围的命令。"""
         cmd = CommandSpec(
@@ -92,6 +99,16 @@ class TestDevice(unittest.TestCase):
         device = Device(id="d1", name="test", room="room", category="type")
         self.assertEqual(device.commands, [])
 
+    def test_device_is_slotted(self):
+        """设备无实例 __dict__，profile_id 为显式字段。"""
+        device = Device(id="d1", name="test", room="room", category="type")
+        device.profile_id = "p1"
+
+        self.assertFalse(hasattr(device, "__dict__"))
+        self.assertEqual(device.profile_id, "p1")
+        with self.assertRaises(AttributeError):
+            device.profileId = "p1"  # type: ignore[attr-defined]
+
 
 class TestGroup(unittest.TestCase):
     """测试分组模型。"""
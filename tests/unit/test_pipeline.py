@@ -1,13 +1,32 @@
 """Pipeline 组装测试。"""
 
+import asyncio
+import json
 import logging
+import threading
+import time
 import unittest
 from unittest import mock
-from context_retrieval.pipeline import retrieve, retrieve_single
+from context_retrieval import pipeline as pipeline_module
+from context_retrieval.pipeline import (
+    _PreparedCommand,
+    _SpeculativeSearch,
+    aretrieve,
+    astream_retrieve_with_context,
+    retrieve,
+    retrieve_single,
+    retrieve_with_context,
+    stream_retrieve_with_context,
+)
+from context_retrieval.ann_search import IVFVectorSearcher
+from context_retrieval.home_context import HomeContext
+from context_retrieval.local_embedding import HashingVectorSearcher
+from context_retrieval.models import Candidate
 from context_retrieval.models import Device, CommandSpec, RetrievalResult
 from context_retrieval.doc_enrichment import CapabilityDoc
 from context_retrieval.ir_compiler import FakeLLM
 from context_retrieval.state import ConversationState
+from context_retrieval.scoring import CandidateBatch
 from context_retrieval.vector_search import StubVectorSearcher
 
 
@@ -77,6 +96,72 @@ class TestRetrieve(unittest.TestCase):
         actions = [item.meta["command"]["action"] for item in result]
         self.assertEqual(actions, ["打开", "关闭"])
 
+    def test_retrieve_batches_vector_search_across_commands(self):
+        """多命令的向量检索合并为一次 search_many 调用。"""
+
+        class RecordingVectorSearcher(StubVectorSearcher):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                self.batches: list[list[str]] = []
+
+            def search_many(self, queries, top_k=10, device_ids_per_query=None):
+                self.batches.append(list(queries))
+                return super().search_many(queries, top_k, device_ids_per_query)
+
+        llm = FakeLLM(
+            {
+                "关客厅灯然后打开卧室灯": [
+                    {"a": "关闭", "s": "客厅", "n": "灯", "t": "Light", "q": "one"},
+                    {"a": "打开", "s": "卧室", "n": "灯", "t": "Light", "q": "one"},
+                ]
+            }
+        )
+        recorder = RecordingVectorSearcher(
+            stub_results={"关闭": [("lamp-1", 0.9)], "打开": [("lamp-2", 0.9)]}
+        )
+
+        result = retrieve(
+            text="关客厅灯然后打开卧室灯",
+            devices=self.devices,
+            llm=llm,
+            state=ConversationState(),
+            vector_searcher=recorder,
+        )
+
+        self.assertEqual(recorder.batches, [["关闭", "打开"]])
+        self.assertEqual(result[0].candidates[0].entity_id, "lamp-1")
+        self.assertEqual(result[1].candidates[0].entity_id, "lamp-2")
+
+    def test_rrf_fusion_fetches_fewer_vector_candidates(self):
+        """RRF 融合按名次打分，向量召回数量小于线性融合。"""
+
+        class RecordingVectorSearcher(StubVectorSearcher):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                self.top_ks: list[int] = []
+
+            def search_many(self, queries, top_k=10, device_ids_per_query=None):
+                self.top_ks.append(top_k)
+                return super().search_many(queries, top_k, device_ids_per_query)
+
+        llm = FakeLLM(
+            {"打开客厅的灯": [{"a": "打开", "s": "客厅", "n": "灯", "t": "Light", "q": "one"}]}
+        )
+        recorder = RecordingVectorSearcher(stub_results={"打开": [("lamp-1", 0.9)]})
+
+        for fusion in ("linear", "rrf"):
+            result = retrieve_single(
+                text="打开客厅的灯",
+                devices=self.devices,
+                llm=llm,
+                state=ConversationState(),
+                vector_searcher=recorder,
+                fusion=fusion,
+            )
+            self.assertEqual(result.candidates[0].entity_id, "lamp-1")
+
+        self.assertEqual(recorder.top_ks, [50, 15])
+
     def test_retrieve_finds_device_by_name(self):
         """根据名称找到设备。"""
         result = retrieve_single(
@@ -283,8 +368,8 @@ class TestRetrieve(unittest.TestCase):
         llm = FakeLLM(
             {"turn on device": [{"a": "turn on", "s": "*", "n": "设备", "t": "Unknown", "q": "all"}]}
         )
-        with mock.patch("context_retrieval.pipeline.merge_and_score") as merge_mock:
-            merge_mock.return_value = []
+        with mock.patch("context_retrieval.pipeline.merge_candidates") as merge_mock:
+            merge_mock.return_value = CandidateBatch()
             retrieve_single(
                 text="turn on device",
                 devices=self.devices,
@@ -399,5 +484,399 @@ class TestRetrieve(unittest.TestCase):
         self.assertEqual(result.candidates[0].capability_id, "cap-speed")
 
 
+
+class SyncOnlyLLM:
+    """只实现同步接口的 LLM，记录调用线程。"""
+
+    def __init__(self, llm: FakeLLM):
+        self.llm = llm
+        self.threads: list[str] = []
+
+    def generate_with_prompt(self, text: str, system_prompt: str) -> str:
+        self.threads.append(threading.current_thread().name)
+        return self.llm.generate_with_prompt(text, system_prompt)
+
+
+class TestAsyncRetrieve(unittest.IsolatedAsyncioTestCase):
+    """测试 aretrieve。"""
+
+    def setUp(self):
+        self.devices = [
+            Device(id="lamp-1", name="老伙计", room="客厅", category="light"),
+            Device(id="lamp-2", name="卧室灯", room="卧室", category="light"),
+        ]
+        self.llm = FakeLLM(
+            {
+                "打开老伙计然后关闭卧室灯": [
+                    {"a": "打开", "s": "*", "n": "老伙计", "t": "Light", "q": "one"},
+                    {"a": "关闭", "s": "卧室", "n": "卧室灯", "t": "Light", "q": "one"},
+                ]
+            }
+        )
+        self.vector = StubVectorSearcher(
+            stub_results={"打开": [("lamp-1", 0.9)], "关闭": [("lamp-2", 0.8)]}
+        )
+
+    async def test_aretrieve_matches_retrieve(self):
+        """异步检索结果与同步检索一致，并按命令顺序更新会话状态。"""
+        state = ConversationState()
+        expected = retrieve(
+            text="打开老伙计然后关闭卧室灯",
+            devices=self.devices,
+            llm=self.llm,
+            state=ConversationState(),
+            vector_searcher=self.vector,
+        )
+
+        results = await aretrieve(
+            text="打开老伙计然后关闭卧室灯",
+            devices=self.devices,
+            llm=self.llm,
+            state=state,
+            vector_searcher=self.vector,
+        )
+
+        self.assertEqual(
+            [r.candidates for r in results],
+            [r.candidates for r in expected],
+        )
+        self.assertEqual(
+            [r.meta["command"] for r in results],
+            [r.meta["command"] for r in expected],
+        )
+        self.assertEqual(state.resolve_reference("last-mentioned").id, "lamp-2")
+
+    async def test_sync_only_llm_runs_in_thread(self):
+        """LLM 没有异步接口时在线程中调用同步接口。"""
+        llm = SyncOnlyLLM(self.llm)
+
+        results = await aretrieve(
+            text="打开老伙计然后关闭卧室灯",
+            devices=self.devices,
+            llm=llm,
+            state=ConversationState(),
+        )
+
+        self.assertEqual(len(results), 2)
+        self.assertNotEqual(llm.threads, [threading.main_thread().name])
+
+    async def test_commands_retrieve_concurrently_off_event_loop(self):
+        """非 bulk 命令也在线程中并发检索，不占用事件循环线程。"""
+        original = pipeline_module._retrieve_with_ir
+
+        kwargs = {
+            "text": "打开老伙计然后关闭卧室灯",
+            "devices": self.devices,
+            "llm": self.llm,
+            "vector_searcher": self.vector,
+        }
+
+        for run in (
+            lambda: asyncio.to_thread(retrieve, state=ConversationState(), **kwargs),
+            lambda: aretrieve(state=ConversationState(), **kwargs),
+        ):
+            barrier = threading.Barrier(2, timeout=5)
+            threads: list[threading.Thread] = []
+
+            def retrieve_with_ir(*args, **kwargs):
+                threads.append(threading.current_thread())
+                barrier.wait()
+                return original(*args, **kwargs)
+
+            with mock.patch.object(pipeline_module, "_retrieve_with_ir", retrieve_with_ir):
+                results = await run()
+
+            self.assertEqual(len(results), 2)
+            self.assertNotIn(threading.main_thread(), threads)
+
+
+class TestSpeculativeRetrieve(unittest.IsolatedAsyncioTestCase):
+    """测试推测向量检索。"""
+
+    def setUp(self):
+        self.devices = [
+            Device(id="lamp-1", name="Lamp", room="客厅", category="light"),
+            Device(id="lamp-2", name="Lamp2", room="客厅", category="light"),
+        ]
+        self.vector = StubVectorSearcher(
+            stub_results={
+                "打开客厅的灯": [("lamp-2", 0.9), ("lamp-1", 0.5)],
+                "打开": [("lamp-1", 0.9)],
+            }
+        )
+
+    def _llm(self, action: str) -> FakeLLM:
+        return FakeLLM(
+            {"打开客厅的灯": [{"a": action, "s": "客厅", "n": "灯", "t": "Light", "q": "one"}]}
+        )
+
+    def _retrieve(self, action: str, speculative: bool):
+        with mock.patch.object(
+            self.vector, "search", wraps=self.vector.search
+        ) as search_mock:
+            results = retrieve(
+                text="打开客厅的灯",
+                devices=self.devices,
+                llm=self._llm(action),
+                state=ConversationState(),
+                vector_searcher=self.vector,
+                speculative=speculative,
+            )
+        return results, [call.args[0] for call in search_mock.call_args_list]
+
+    def test_reuses_speculation_when_search_falls_back_to_raw(self):
+        """检索文本回退为原始文本时复用推测结果，不再重复检索。"""
+        expected, _ = self._retrieve("turn on", speculative=False)
+        results, queries = self._retrieve("turn on", speculative=True)
+
+        self.assertEqual(queries, ["打开客厅的灯"])
+        self.assertEqual(results[0].candidates, expected[0].candidates)
+
+    def test_discards_speculation_when_action_differs(self):
+        """检索文本与原始文本不同时丢弃推测结果，按动作文本重新检索。"""
+        expected, _ = self._retrieve("打开", speculative=False)
+        results, queries = self._retrieve("打开", speculative=True)
+
+        self.assertEqual(queries, ["打开客厅的灯", "打开"])
+        self.assertEqual(results[0].candidates, expected[0].candidates)
+
+    async def test_aretrieve_reuses_speculation(self):
+        """异步入口同样复用推测结果。"""
+        with mock.patch.object(
+            self.vector, "search", wraps=self.vector.search
+        ) as search_mock:
+            results = await aretrieve(
+                text="打开客厅的灯",
+                devices=self.devices,
+                llm=self._llm("turn on"),
+                state=ConversationState(),
+                vector_searcher=self.vector,
+                speculative=True,
+            )
+
+        self.assertEqual(search_mock.call_count, 1)
+        self.assertEqual(results[0].candidates[0].entity_id, "lamp-2")
+
+    def test_inexact_searchers_skip_speculation(self):
+        """量化重排与 IVF 检索器的过滤结果依赖过滤条件，不发起推测检索，结果与非推测一致。"""
+        rooms = ("客厅", "卧室", "书房")
+        devices = [
+            Device(
+                id=f"lamp-{i}",
+                name=f"灯{i}",
+                room=rooms[i % len(rooms)],
+                category="light",
+                commands=[CommandSpec(id="on", description=f"打开灯 模式{i % 5}")],
+            )
+            for i in range(60)
+        ]
+        searchers = {
+            "int8_rescore": HashingVectorSearcher(dim=64, storage="int8", rescore=True),
+            "ivf": IVFVectorSearcher(HashingVectorSearcher(dim=64), nprobe=1, exact_threshold=0),
+        }
+        for name, searcher in searchers.items():
+            with self.subTest(searcher=name):
+                self.assertFalse(searcher.exact_filtering)
+                context = HomeContext.build(devices, searcher)
+                runs = []
+                for speculative in (False, True):
+                    with mock.patch.object(
+                        searcher, "search_many", wraps=searcher.search_many
+                    ) as search_mock:
+                        results = retrieve_with_context(
+                            "打开客厅的灯",
+                            context,
+                            self._llm("turn on"),
+                            ConversationState(),
+                            speculative=speculative,
+                        )
+                    filters = [
+                        call.kwargs["device_ids_per_query"]
+                        for call in search_mock.call_args_list
+                    ]
+                    runs.append((results[0].candidates, filters))
+
+                self.assertEqual(runs[1][0], runs[0][0])
+                # 只有带设备过滤的正常检索，没有无过滤的推测检索
+                self.assertEqual(len(runs[1][1]), 1)
+                self.assertTrue(runs[1][1][0][0])
+
+    def test_take_requires_enough_filtered_candidates(self):
+        """过滤后不足 search_k 且推测结果未取尽时不复用。"""
+        speculation = _SpeculativeSearch(
+            query="打开灯",
+            top_k=2,
+            candidates=[Candidate(entity_id="a"), Candidate(entity_id="b")],
+        )
+
+        def prepared(device_ids: set[str], search_k: int) -> _PreparedCommand:
+            return _PreparedCommand(
+                filtered_devices=[],
+                scope_meta={},
+                mapped_category=None,
+                apply_gating=False,
+                gated_devices=[],
+                search_text="打开灯",
+                search_k=search_k,
+                device_ids=device_ids,
+            )
+
+        self.assertIsNone(speculation.take(prepared({"b", "c"}, 2)))
+        self.assertEqual(
+            [c.entity_id for c in speculation.take(prepared({"b", "c"}, 1))],
+            ["b"],
+        )
+        speculation.top_k = 5
+        self.assertEqual(
+            [c.entity_id for c in speculation.take(prepared({"b", "c"}, 2))],
+            ["b"],
+        )
+
+
+
+STREAM_COMMANDS = [
+    {"a": "打开", "s": "*", "n": "老伙计", "t": "Light", "q": "one"},
+    {"a": "关闭", "s": "卧室", "n": "卧室灯", "t": "Light", "q": "one"},
+]
+
+
+class GatedStreamLLM:
+    """流式返回首个命令对象后，等待放行再返回其余输出。"""
+
+    def __init__(self):
+        self.proceed = threading.Event()
+        self.timed_out = False
+        self.first, self.rest = _split_after_first_object(STREAM_COMMANDS)
+
+    def generate_with_prompt(self, text: str, system_prompt: str) -> str:
+        return self.first + self.rest
+
+    def stream_with_prompt(self, text: str, system_prompt: str):
+        yield self.first
+        self.timed_out = not self.proceed.wait(timeout=5)
+        yield self.rest
+
+
+class AsyncGatedStreamLLM(GatedStreamLLM):
+    """GatedStreamLLM 的异步版本。"""
+
+    def __init__(self):
+        super().__init__()
+        self.aproceed = asyncio.Event()
+
+    async def astream_with_prompt(self, text: str, system_prompt: str):
+        yield self.first
+        try:
+            await asyncio.wait_for(self.aproceed.wait(), timeout=5)
+        except TimeoutError:
+            self.timed_out = True
+        yield self.rest
+
+
+def _split_after_first_object(commands: list[dict]) -> tuple[str, str]:
+    output = json.dumps(commands, ensure_ascii=False)
+    end = output.index("}") + 1
+    return output[:end], output[end:]
+
+
+class TestStreamRetrieve(unittest.IsolatedAsyncioTestCase):
+    """测试流式检索。"""
+
+    def setUp(self):
+        self.devices = [
+            Device(id="lamp-1", name="老伙计", room="客厅", category="light"),
+            Device(id="lamp-2", name="卧室灯", room="卧室", category="light"),
+        ]
+        self.vector = StubVectorSearcher(
+            stub_results={"打开": [("lamp-1", 0.9)], "关闭": [("lamp-2", 0.8)]}
+        )
+        self.context = HomeContext.build(self.devices, self.vector)
+        self.text = "打开老伙计然后关闭卧室灯"
+
+    def test_stream_matches_retrieve_with_context(self):
+        """分段接收的流式检索结果与一次性检索一致，并逐条更新会话状态。"""
+        llm = FakeLLM({self.text: STREAM_COMMANDS})
+        llm.stream_chunk_size = 5
+        expected = retrieve_with_context(
+            self.text, self.context, llm, ConversationState()
+        )
+        state = ConversationState()
+
+        results = list(
+            stream_retrieve_with_context(self.text, self.context, llm, state)
+        )
+
+        self.assertEqual(
+            [r.candidates for r in results],
+            [r.candidates for r in expected],
+        )
+        self.assertEqual(
+            [r.meta["command"] for r in results],
+            [r.meta["command"] for r in expected],
+        )
+        self.assertEqual(state.resolve_reference("last-mentioned").id, "lamp-2")
+
+    def test_first_result_before_stream_ends(self):
+        """首个命令的结果在 LLM 输出结束前产出。"""
+        llm = GatedStreamLLM()
+        stream = stream_retrieve_with_context(
+            self.text, self.context, llm, ConversationState()
+        )
+
+        first = next(stream)
+        self.assertFalse(llm.proceed.is_set())
+        self.assertEqual(first.candidates[0].entity_id, "lamp-1")
+        llm.proceed.set()
+        rest = list(stream)
+
+        self.assertEqual([r.candidates[0].entity_id for r in rest], ["lamp-2"])
+        self.assertFalse(llm.timed_out)
+
+    def test_closing_stream_early_does_not_wait_for_llm(self):
+        """取到首条结果后停止迭代，不等待 LLM 输出结束，后续命令不再检索。"""
+        llm = GatedStreamLLM()
+        stream = stream_retrieve_with_context(
+            self.text, self.context, llm, ConversationState()
+        )
+
+        for result in stream:
+            break
+        start = time.perf_counter()
+        stream.close()
+        elapsed = time.perf_counter() - start
+        llm.proceed.set()
+
+        self.assertEqual(result.candidates[0].entity_id, "lamp-1")
+        self.assertLess(elapsed, 1.0)
+
+    async def test_astream_first_result_before_stream_ends(self):
+        """异步流式检索同样在 LLM 输出结束前产出首条结果。"""
+        llm = AsyncGatedStreamLLM()
+        results = []
+
+        async for result in astream_retrieve_with_context(
+            self.text, self.context, llm, ConversationState()
+        ):
+            results.append(result)
+            llm.aproceed.set()
+
+        self.assertEqual(
+            [r.candidates[0].entity_id for r in results],
+            ["lamp-1", "lamp-2"],
+        )
+        self.assertFalse(llm.timed_out)
+
+    def test_non_array_output_falls_back_to_unknown(self):
+        """流式阶段没有产出命令时按完整解析结果（UNKNOWN 兜底）检索。"""
+        llm = FakeLLM({self.text: "无法解析"})
+
+        results = list(
+            stream_retrieve_with_context(self.text, self.context, llm, ConversationState())
+        )
+
+        self.assertEqual(len(results), 1)
+        self.assertIn("fallback_unknown", results[0].meta["parser_errors"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,249 @@
+"""向量量化存储测试。"""
+
+import hashlib
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from context_retrieval.models import Device
+from context_retrieval.quantization import QuantizedMatrix
+from context_retrieval.recall import compare_recall, recall_at_k
+from context_retrieval.vector_search import DashScopeVectorSearcher
+
+
+class RandomEmbeddingClient:
+    """按文本哈希生成确定性随机向量的 embedding 客户端。"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def call(self, model: str, input: list[str], **kwargs):
+        embeddings = []
+        for text in input:
+            seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim)
+            embeddings.append({"embedding": vector.tolist()})
+        return type(
+            "Resp",
+            (),
+            {"status_code": 200, "output": {"embeddings": embeddings}, "message": ""},
+        )
+
+
+ROOMS = ("客厅", "卧室", "书房", "厨房", "阳台")
+QUERIES = ("打开客厅的灯", "关闭卧室空调", "调高书房亮度", "厨房排气扇", "阳台窗帘")
+
+
+def _devices(count: int = 60) -> list[Device]:
+    return [
+        Device(
+            id=f"dev-{i}",
+            name=f"设备{i}",
+            room=ROOMS[i % len(ROOMS)],
+            category="Light" if i % 2 else "Switch",
+        )
+        for i in range(count)
+    ]
+
+
+def _searcher(**kwargs) -> DashScopeVectorSearcher:
+    searcher = DashScopeVectorSearcher(embedding_client=RandomEmbeddingClient(), **kwargs)
+    searcher.index(_devices())
+    return searcher
+
+
+class TestQuantizedMatrix(unittest.TestCase):
+    """测试 QuantizedMatrix。"""
+
+    def test_int8_round_trip_error_is_small(self):
+        """int8 反量化误差不超过每行缩放系数的一半。"""
+        matrix = np.random.default_rng(0).standard_normal((8, 16)).astype(np.float32)
+        quantized = QuantizedMatrix.from_float(matrix, "int8")
+
+        restored = quantized.to_float()
+
+        self.assertEqual(quantized.codes.dtype, np.int8)
+        bound = quantized.scales[:, None] / 2 + 1e-6
+        self.assertTrue(np.all(np.abs(restored - matrix) <= bound))
+
+    def test_dot_matches_dequantized_product(self):
+        """分块内积与反量化后的矩阵乘一致，全零行不产生 NaN。"""
+        matrix = np.random.default_rng(1).standard_normal((5, 4)).astype(np.float32)
+        matrix[2] = 0.0
+        query = np.ones(4, dtype=np.float32)
+
+        for mode in ("float16", "int8"):
+            quantized = QuantizedMatrix.from_float(matrix, mode)
+            np.testing.assert_allclose(
+                quantized.dot(query), quantized.to_float() @ query, rtol=1e-5, atol=1e-5
+            )
+            self.assertEqual(quantized.dot(query)[2], 0.0)
+
+    def test_take_and_concat(self):
+        """按行取子矩阵与拼接保持缩放系数对齐。"""
+        matrix = np.random.default_rng(2).standard_normal((4, 3)).astype(np.float32)
+        quantized = QuantizedMatrix.from_float(matrix, "int8")
+
+        rebuilt = quantized.take([0, 1]).concat(quantized.take([2, 3]))
+
+        np.testing.assert_array_equal(rebuilt.codes, quantized.codes)
+        np.testing.assert_array_equal(rebuilt.scales, quantized.scales)
+
+    def test_int8_requires_scales(self):
+        """int8 矩阵缺少缩放系数时报错。"""
+        with self.assertRaises(ValueError):
+            QuantizedMatrix(np.zeros((1, 2), dtype=np.int8))
+
+
+class TestQuantizedSearcher(unittest.TestCase):
+    """测试量化存储的向量检索。"""
+
+    def test_quantized_storage_is_smaller(self):
+        """float16 / int8 存储占用更少内存，不保留 float32 矩阵。"""
+        exact = _searcher()
+        half = _searcher(storage="float16")
+        compact = _searcher(storage="int8")
+
+        self.assertIsNone(compact._embeddings)
+        self.assertLess(half.matrix_nbytes, exact.matrix_nbytes)
+        self.assertLess(compact.matrix_nbytes, half.matrix_nbytes)
+
+    def test_recall_against_exact_search(self):
+        """量化检索相对精确检索保持较高召回率。"""
+        exact = _searcher()
+
+        self.assertGreaterEqual(
+            compare_recall(exact, _searcher(storage="float16"), QUERIES, top_k=10), 0.99
+        )
+        self.assertGreaterEqual(
+            compare_recall(exact, _searcher(storage="int8"), QUERIES, top_k=10), 0.9
+        )
+
+    def test_rescore_returns_exact_scores(self):
+        """开启重排后，分数与精确检索一致。"""
+        exact = _searcher()
+        rescored = _searcher(storage="int8", rescore=True)
+
+        for query in QUERIES:
+            expected = exact.search(query, top_k=5)
+            actual = rescored.search(query, top_k=5)
+            self.assertEqual(recall_at_k(expected, actual, 5), 1.0)
+            np.testing.assert_allclose(
+                [c.vector_score for c in actual],
+                [c.vector_score for c in expected],
+                rtol=1e-6,
+            )
+
+    def test_rescore_rows_are_not_resident(self):
+        """重排用的 float32 行落盘并以内存映射读取，常驻内存与纯量化存储相同。"""
+        exact = _searcher()
+        compact = _searcher(storage="int8")
+        rescored = _searcher(storage="int8", rescore=True)
+
+        self.assertIsInstance(rescored._embeddings, np.memmap)
+        self.assertEqual(rescored.resident_nbytes, compact.resident_nbytes)
+        self.assertLess(rescored.resident_nbytes * 3, exact.resident_nbytes)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            rescored.save(tmp)
+            restored = DashScopeVectorSearcher(
+                embedding_client=RandomEmbeddingClient(), storage="int8", rescore=True
+            )
+            restored.load(tmp, mmap=False)
+        self.assertIsInstance(restored._embeddings, np.memmap)
+        self.assertEqual(restored.resident_nbytes, compact.resident_nbytes)
+
+    def test_rescore_rows_follow_incremental_updates(self):
+        """增量增删设备只追加落盘文件、记录行映射，不重写已有行。"""
+        with tempfile.TemporaryDirectory() as tmp:
+            exact = _searcher()
+            rescored = _searcher(storage="int8", rescore=True, rescore_dir=tmp)
+            spill_path = rescored._spill_path
+            extra = Device(id="dev-new", name="新设备", room="客厅", category="Light")
+            for searcher in (exact, rescored):
+                searcher.remove_devices(["dev-0", "dev-1"])
+                searcher.add_devices([extra])
+
+            self.assertEqual(rescored._spill_path, spill_path)
+            self.assertEqual(len(rescored._embeddings), rescored.row_count + 2)
+            self.assertEqual(rescored.resident_nbytes, rescored._quantized.nbytes)
+            for query in QUERIES:
+                np.testing.assert_allclose(
+                    [c.vector_score for c in rescored.search(query, top_k=5)],
+                    [c.vector_score for c in exact.search(query, top_k=5)],
+                    rtol=1e-6,
+                )
+            (spill_dir,) = os.listdir(tmp)
+            self.assertEqual(len(os.listdir(os.path.join(tmp, spill_dir))), 1)
+
+    def test_rescore_rows_compact_when_mostly_stale(self):
+        """失效行多于存活行时整理为新文件；保存时写出与行键对齐的矩阵。"""
+        exact = _searcher()
+        rescored = _searcher(storage="int8", rescore=True)
+        spill_path = rescored._spill_path
+        removed = [f"dev-{i}" for i in range(20)]
+        for searcher in (exact, rescored):
+            searcher.remove_devices(removed[:10])
+        self.assertEqual(rescored._spill_path, spill_path)
+
+        for searcher in (exact, rescored):
+            searcher.remove_devices(removed[10:])
+        self.assertEqual(rescored._spill_path, spill_path)
+        for searcher in (exact, rescored):
+            searcher.remove_devices([f"dev-{i}" for i in range(20, 35)])
+        self.assertNotEqual(rescored._spill_path, spill_path)
+        self.assertEqual(len(rescored._embeddings), rescored.row_count)
+
+        rescored.remove_devices(["dev-35"])
+        exact.remove_devices(["dev-35"])
+        with tempfile.TemporaryDirectory() as tmp:
+            rescored.save(tmp)
+            restored = DashScopeVectorSearcher(
+                embedding_client=RandomEmbeddingClient(), storage="int8", rescore=True
+            )
+            restored.load(tmp)
+        for query in QUERIES:
+            np.testing.assert_allclose(
+                [c.vector_score for c in restored.search(query, top_k=5)],
+                [c.vector_score for c in exact.search(query, top_k=5)],
+                rtol=1e-6,
+            )
+
+    def test_incremental_updates_keep_codes_aligned(self):
+        """增量删除设备后，量化行与行键保持对齐。"""
+        searcher = _searcher(storage="int8")
+        searcher.remove_devices(["dev-0", "dev-1"])
+
+        self.assertEqual(len(searcher._quantized), searcher.row_count)
+        ids = {c.entity_id for c in searcher.search(QUERIES[0], top_k=100)}
+        self.assertNotIn("dev-0", ids)
+
+    def test_save_and_load_quantized_index(self):
+        """量化索引可保存并以内存映射方式加载。"""
+        searcher = _searcher(storage="int8")
+        expected = searcher.search(QUERIES[1], top_k=5)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            searcher.save(tmp)
+            restored = DashScopeVectorSearcher(
+                embedding_client=RandomEmbeddingClient(), storage="int8"
+            )
+            restored.load(tmp)
+            actual = restored.search(QUERIES[1], top_k=5)
+
+        self.assertIsNone(restored._embeddings)
+        self.assertEqual(
+            [(c.entity_id, c.vector_score) for c in actual],
+            [(c.entity_id, c.vector_score) for c in expected],
+        )
+
+    def test_rejects_unknown_storage(self):
+        """不支持的存储格式报错。"""
+        with self.assertRaises(ValueError):
+            DashScopeVectorSearcher(embedding_client=RandomEmbeddingClient(), storage="int4")
+
+
+if __name__ == "__main__":
+    unittest.main()
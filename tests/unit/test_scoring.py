@@ -4,10 +4,13 @@ import unittest
 
 from context_retrieval.models import Candidate, Device
 from context_retrieval.scoring import (
+    CandidateBatch,
     apply_room_bonus,
     filter_by_threshold,
     merge_and_score,
+    merge_candidates,
     normalize_scores,
+    top_k_by,
 )
 
 
@@ -151,6 +154,135 @@ class TestMergeAndScore(unittest.TestCase):
         self.assertEqual(merged[0].entity_id, "lamp-2")
 
 
+class TestTopKBy(unittest.TestCase):
+    """测试 top_k_by。"""
+
+    def test_matches_stable_sort(self):
+        """结果与稳定排序后截断一致，同分保持原有顺序。"""
+        items = [(i, (i * 7) % 5) for i in range(40)]
+
+        for k in (None, 0, 1, 3, 40, 100):
+            expected = sorted(items, key=lambda item: item[1], reverse=True)
+            if k is not None:
+                expected = expected[:k]
+            self.assertEqual(top_k_by(items, k, key=lambda item: item[1]), expected)
+
+    def test_merge_and_score_top_k(self):
+        """merge_and_score 截断结果等于完整排序结果的前缀。"""
+        keyword = [Candidate(entity_id=f"kw-{i}", keyword_score=i / 10) for i in range(10)]
+        vector = [Candidate(entity_id=f"vec-{i}", vector_score=i / 5) for i in range(10)]
+
+        full = merge_and_score(keyword, vector)
+        top = merge_and_score(keyword, vector, top_k=3)
+
+        self.assertEqual(top, full[:3])
+        self.assertEqual(len(merge_candidates(keyword, vector)), len(full))
+
+
+class TestRRFFusion(unittest.TestCase):
+    """测试倒数排名融合。"""
+
+    def test_scores_depend_on_ranks(self):
+        """各来源按名次贡献 w * (k + 1) / (k + rank)，与原始分数量纲无关。"""
+        keyword = [
+            Candidate(entity_id="a", keyword_score=0.5),
+            Candidate(entity_id="b", keyword_score=0.9),
+        ]
+        vector = [
+            Candidate(entity_id="a", capability_id="on", vector_score=0.8),
+            Candidate(entity_id="c", capability_id="on", vector_score=0.99),
+        ]
+
+        merged = merge_and_score(keyword, vector, w_keyword=1.0, w_vector=0.5, fusion="rrf", rrf_k=60)
+        scores = {c.entity_id: c.total_score for c in merged}
+
+        self.assertEqual([c.entity_id for c in merged], ["a", "b", "c"])
+        self.assertAlmostEqual(scores["a"], 61 / 62 + 0.5 * 61 / 62)
+        self.assertAlmostEqual(scores["b"], 1.0)
+        self.assertAlmostEqual(scores["c"], 0.5)
+        self.assertEqual(merged[0].keyword_score, 0.5)
+
+    def test_rejects_unknown_fusion(self):
+        """不支持的融合方式报错。"""
+        with self.assertRaises(ValueError):
+            merge_and_score([], [], fusion="max")
+
+
+class TestCandidateBatch(unittest.TestCase):
+    """测试列式候选批次。"""
+
+    def setUp(self):
+        self.keyword = [
+            Candidate(entity_id="lamp-1", keyword_score=0.8, reasons=["name_exact", "type_hit"]),
+            Candidate(entity_id="lamp-3", keyword_score=0.5, reasons=["room_exact"]),
+        ]
+        self.vector = [
+            Candidate(entity_id="lamp-1", capability_id="on", vector_score=0.6, reasons=["semantic_match"]),
+            Candidate(entity_id="lamp-1", capability_id="off", vector_score=0.9, reasons=["semantic_match"]),
+            Candidate(entity_id="lamp-2", capability_id="on", vector_score=0.7, reasons=["semantic_match"]),
+        ]
+        self.devices = {
+            "lamp-1": Device(id="lamp-1", name="灯1", room="卧室", category="Light"),
+            "lamp-2": Device(id="lamp-2", name="灯2", room="客厅", category="Light"),
+            "lamp-3": Device(id="lamp-3", name="灯3", room="客厅", category="Light"),
+        }
+
+    def test_matches_object_fusion(self):
+        """融合与房间加分结果与逐对象实现一致。"""
+        expected = apply_room_bonus(
+            merge_and_score(self.keyword, self.vector, w_vector=0.3),
+            self.devices,
+            {"客厅"},
+        )
+        batch = CandidateBatch.merge(self.keyword, self.vector, w_vector=0.3)
+        batch.add_room_bonus(self.devices, {"客厅"})
+
+        self.assertEqual(
+            batch.to_candidates(),
+            sorted(expected, key=lambda c: c.total_score, reverse=True),
+        )
+
+    def test_select_devices_dedupes_and_filters(self):
+        """每个设备只保留最高分行，被拒绝的行让位于同设备的次优行。"""
+        batch = CandidateBatch.merge(self.keyword, self.vector)
+
+        selected = batch.select_devices(10)
+        self.assertEqual(
+            [(c.entity_id, c.capability_id) for c in selected],
+            [("lamp-1", "off"), ("lamp-3", None), ("lamp-2", "on")],
+        )
+
+        rejected = batch.select_devices(
+            2, accept=lambda c: None if c.capability_id == "off" else c
+        )
+        self.assertEqual(
+            [(c.entity_id, c.capability_id) for c in rejected],
+            [("lamp-1", "on"), ("lamp-3", None)],
+        )
+
+    def test_reasons_keep_insertion_order(self):
+        """reasons 按关键词、向量、房间加分的插入顺序输出，与逐对象实现一致。"""
+        keyword = [
+            Candidate(entity_id="lamp-2", keyword_score=1.0, reasons=["type_hit", "name_exact"])
+        ]
+        vector = [
+            Candidate(
+                entity_id="lamp-2",
+                capability_id="on",
+                vector_score=0.5,
+                reasons=["semantic_match", "name_exact"],
+            )
+        ]
+
+        batch = CandidateBatch.merge(keyword, vector)
+        batch.add_room_bonus(self.devices, {"客厅"})
+
+        self.assertEqual(
+            batch.to_candidates()[0].reasons,
+            ["type_hit", "name_exact", "semantic_match", "room_bonus"],
+        )
+
+
 class TestNormalizeScores(unittest.TestCase):
     """测试分数归一化。"""
 
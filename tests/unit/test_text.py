@@ -5,6 +5,7 @@ import unittest
 from context_retrieval.text import (
     contains_substring,
     exact_match,
+    fuzzy_match_matrix,
     fuzzy_match_score,
     partial_match_score,
 )
@@ -38,6 +39,27 @@ class TestFuzzyMatchScore(unittest.TestCase):
         self.assertGreater(score, 0.5)
 
 
+class TestFuzzyMatchMatrix(unittest.TestCase):
+    """测试批量模糊匹配。"""
+
+    def test_matches_pairwise_scores(self):
+        """批量结果与逐对 fuzzy_match_score 完全一致。"""
+        texts = ["老伙计", "客厅灯", "", "大白 空调", "ABC"]
+        queries = ["客厅的灯", "大白", "AXC", ""]
+
+        matrix = fuzzy_match_matrix(texts, queries, workers=2)
+
+        self.assertEqual(matrix.shape, (5, 4))
+        for i, text in enumerate(texts):
+            for j, query in enumerate(queries):
+                self.assertEqual(matrix[i, j], fuzzy_match_score(text, query))
+
+    def test_empty_inputs(self):
+        """空输入返回对应形状的空矩阵。"""
+        self.assertEqual(fuzzy_match_matrix([], ["灯"]).shape, (0, 1))
+        self.assertEqual(fuzzy_match_matrix(["灯"], []).shape, (1, 0))
+
+
 class TestPartialMatchScore(unittest.TestCase):
     """测试部分匹配分数。"""
 